@@ -1,9 +1,13 @@
 import dash
-from dash import Dash, dcc, html
+from dash import Dash, dcc, html, DiskcacheManager
 import dash_bootstrap_components as dbc
+import diskcache
+import flask
 import logging
+import metrics
 from auth import enable_dash_auth
-import os
+from settings import settings
+import warmup
 
 # ************** Init **************
 
@@ -22,12 +26,28 @@ else:
 
 logging.getLogger('werkzeug').setLevel(logging.WARNING)
 
+# *** background jobs
+# фоновые задачи (массовая установка планов) выполняются в отдельных процессах, состояние хранится на диске
+background_callback_manager = DiskcacheManager(diskcache.Cache(settings.background_cache_dir))
+
 # *** app
 
 app = Dash(__name__, title='Планы продаж', external_stylesheets=[dbc.themes.MINTY],
            meta_tags=[{"name": "viewport", 'content': 'width=device-width, initial-scale=1.0'}],
-           url_base_pathname='/sales_program/', use_pages=True)
+           url_base_pathname='/sales_program/', use_pages=True,
+           background_callback_manager=background_callback_manager)
 enable_dash_auth(app)
+metrics.init_app(app.server, '/sales_program/metrics', trace=settings.metrics_trace)
+
+
+@app.server.route('/sales_program/ready')
+def ready():
+    """
+    Проверка готовности: 200 - кэши прогреты и приложение готово принимать запросы, 503 - идет прогрев.
+    В dbs - ход прогрева каждой базы версий прогноза, в том числе после публикации нового прогноза.
+    """
+    state = warmup.progress()
+    return flask.jsonify(state), 200 if state['ready'] else 503
 
 
 # ************** Layout **************
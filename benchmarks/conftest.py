@@ -0,0 +1,38 @@
+"""
+Окружение бенчмарков: Redis - fakeredis с синтетическим прогнозом, 1С - локальная заглушка Stub1C.
+Общие redis_worker[0] и program_worker из data_methods подменяются, поэтому страницы работают без изменений.
+"""
+from benchmarks.seed import scale_from_env, first_period, local_environment
+import pytest
+
+
+@pytest.fixture(scope='session')
+def scale():
+    return scale_from_env()
+
+
+@pytest.fixture(scope='session')
+def period():
+    return first_period()
+
+
+@pytest.fixture(scope='session')
+def environment(scale):
+    with local_environment(scale) as (worker, stub):
+        yield worker, stub
+
+
+@pytest.fixture(scope='session')
+def worker(environment):
+    return environment[0]
+
+
+@pytest.fixture(scope='session')
+def pages(environment):
+    """
+    Модули страниц регистрируются в dash.page_registry, поэтому импортируются после создания приложения Dash
+    """
+    import dash
+    dash.Dash('app', use_pages=True)
+    from pages import programs, admin
+    return programs, admin
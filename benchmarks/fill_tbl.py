@@ -0,0 +1,42 @@
+"""
+Сравнение построения таблицы планов построчно (как было в fill_tbl) и векторно (tables.py).
+Запуск из корня проекта: python -m benchmarks.fill_tbl
+"""
+from tables import forecast_table, merge_program
+from tests.legacy_tables import legacy_fill
+import numpy as np
+import pandas as pd
+import timeit
+
+
+def synthetic_tables(groups: int, seed: int = 0) -> (pd.DataFrame, pd.DataFrame):
+    rng = np.random.default_rng(seed)
+    gfd = pd.DataFrame({
+        'Группа': [f'Группа {i}' for i in range(groups)],
+        'Прогноз': rng.gamma(2, 50, groups),
+        'RMSE': rng.gamma(2, 10, groups),
+        'Ед': 'м3',
+    })
+    df_program = pd.DataFrame({
+        'Группа': gfd['Группа'].sample(frac=0.8, random_state=seed).tolist(),
+        'План': rng.gamma(2, 50, int(groups * 0.8)),
+        'Отклонение': rng.gamma(2, 10, int(groups * 0.8)),
+    })
+    return gfd, df_program
+
+
+def main():
+    for groups in [50, 500, 5000]:
+        gfd, df_program = synthetic_tables(groups)
+        pd.testing.assert_frame_equal(merge_program(forecast_table(gfd), df_program), legacy_fill(gfd, df_program),
+                                      check_dtype=False, check_exact=True)
+        number = 3 if groups >= 5000 else 20
+        legacy = min(timeit.repeat(lambda: legacy_fill(gfd, df_program), number=number, repeat=3)) / number
+        vectorized = min(timeit.repeat(lambda: merge_program(forecast_table(gfd), df_program),
+                                       number=number, repeat=3)) / number
+        print(f'{groups:>5} групп: построчно {legacy * 1000:9.2f} мс, векторно {vectorized * 1000:7.2f} мс, '
+              f'ускорение x{legacy / vectorized:.0f}')
+
+
+if __name__ == '__main__':
+    main()
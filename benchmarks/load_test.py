@@ -0,0 +1,282 @@
+"""
+Нагрузочный тест колбэков Dash: N планировщиков одновременно меняют период, разрез и значение разреза,
+выбирают группы и устанавливают планы через _dash-update-component. Отчет - p50 / p95 / p99 и пропускная
+способность по колбэкам.
+
+Локальный режим (без --url): приложение запускается в этом процессе на fakeredis с синтетическим прогнозом
+и заглушкой 1С. Подходит для поиска регрессий, но клиенты и сервер делят один GIL.
+    python -m benchmarks.load_test --users 20 --duration 60
+
+Подбор числа worker'ов gunicorn: заполнить локальный Redis, запустить заглушку 1С, приложение и тест
+    python -m benchmarks.load_test --seed-redis redis://localhost:6379/0 --stub-1c 8090
+    LK_REDIS_HOST=localhost LK_SERVER=127.0.0.1:8090 LK_BASE=base LK_GET_QUERY_ROUTE=/hs/storehouse/free_query \\
+        LK_SET_PROGRAM_ROUTE=/hs/sales_program/set_program gunicorn -c gunicorn.conf.py wsgi:server
+    python -m benchmarks.load_test --url http://127.0.0.1:8002/sales_program/ --auth user:password --submit
+"""
+from benchmarks.seed import SCALES, first_period, seed_redis, plan_query_handler, local_environment
+from collections import defaultdict
+from dateutil.relativedelta import relativedelta
+from threading import Thread, Lock
+from upgraded_redis import UpgradedRedis
+import argparse
+import json
+import numpy as np
+import requests
+import time
+
+LAYERS = ['В целом по компании', 'Подразделение', 'Регион', 'Менеджер']
+CALLBACKS = {
+    'update_table': '..tbl.data...',
+    'send_plan': '..send_modal.is_open...',
+    'prefetch_graphs': 'graphs_store.data',
+    'fetch_graph': 'graph_single.data',
+    'update_forecast_layers': '..layer.options...',
+}
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.duration = 0.
+        self._lock = Lock()
+
+    def add(self, name: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies[name].append(seconds)
+            if not ok:
+                self.errors[name] += 1
+
+    def report(self) -> str:
+        duration = self.duration
+        lines = [f'{"колбэк":<24}{"запросов":>10}{"ошибок":>8}{"p50, мс":>10}{"p95, мс":>10}{"p99, мс":>10}'
+                 f'{"запр/с":>10}']
+        total = 0
+        for name, latencies in sorted(self.latencies.items()):
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+            lines.append(f'{name:<24}{len(latencies):>10}{self.errors[name]:>8}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}'
+                         f'{len(latencies) / duration:>10.1f}')
+            total += len(latencies)
+        lines.append(f'всего: {total} запросов за {duration:.1f} с, {total / duration:.1f} запр/с')
+        return '\n'.join(lines)
+
+
+class Planner:
+    """
+    Планировщик: повторяет случайные действия пользователя страницы установки планов
+    """
+
+    def __init__(self, url: str, callbacks: dict, periods: list, stats: Stats, rng: np.random.Generator,
+                 auth: tuple = None, submit: bool = False, think: float = 0.5):
+        self.url = url
+        self.callbacks = callbacks
+        self.periods = periods
+        self.stats = stats
+        self.rng = rng
+        self.submit = submit
+        self.think = think
+        self.session = requests.Session()
+        self.session.auth = auth
+        self.values = {
+            ('prediction_date', 'value'): periods[0],
+            ('forecast_layer', 'value'): LAYERS[0],
+            ('db', 'value'): 0,
+        }
+        self.layer_options = []
+
+    def call(self, name: str, changed: list, label: str = None) -> dict:
+        """
+        Вызывает колбэк name, changed - список (id, свойство) изменившихся входов
+        :return: ответ колбэка {id: {свойство: значение}}, пустой словарь - если обновление отменено
+        """
+        callback = self.callbacks[name]
+        payload = {
+            'output': callback['output'],
+            'outputs': callback['outputs'],
+            'inputs': [{**dep, 'value': self.values.get((dep['id'], dep['property']))} for dep in callback['inputs']],
+            'state': [{**dep, 'value': self.values.get((dep['id'], dep['property']))} for dep in callback['state']],
+            'changedPropIds': [f'{_id}.{_property}' for _id, _property in changed],
+        }
+        start = time.perf_counter()
+        try:
+            response = self.session.post(self.url + '_dash-update-component', json=payload, timeout=120)
+            ok = response.status_code in (200, 204)
+            result = response.json().get('response', {}) if response.status_code == 200 else {}
+        except (requests.exceptions.RequestException, ValueError):
+            ok, result = False, {}
+        self.stats.add(label or name, time.perf_counter() - start, ok)
+        for _id, props in result.items():
+            for _property, value in props.items():
+                self.values[(_id, _property)] = value
+        return result
+
+    def select_layer(self) -> None:
+        layer = LAYERS[self.rng.integers(len(LAYERS))]
+        self.values[('forecast_layer', 'value')] = layer
+        self.values[('layer', 'value')] = None
+        self.call('update_forecast_layers', [('forecast_layer', 'value')])
+        self.layer_options = self.values.get(('layer', 'options')) or []
+        self.update_table([('forecast_layer', 'value')])
+        if self.layer_options:
+            self.select_value()
+
+    def select_value(self) -> None:
+        if not self.layer_options:
+            return self.select_layer()
+        self.values[('layer', 'value')] = self.layer_options[self.rng.integers(len(self.layer_options))]
+        self.update_table([('layer', 'value')])
+
+    def select_period(self) -> None:
+        self.values[('prediction_date', 'value')] = self.periods[self.rng.integers(len(self.periods))]
+        self.update_table([('prediction_date', 'value')])
+
+    def click_group(self) -> None:
+        rows = self.values.get(('tbl', 'data')) or []
+        if not rows:
+            return self.select_period()
+        row = int(self.rng.integers(len(rows)))
+        self.values[('tbl', 'active_cell')] = {'row': row, 'column': 0, 'column_id': 'Группа'}
+        # график переключается в браузере, к серверу обращаются только за графиками сверх загруженных заранее
+        store = self.values.get(('graphs_store', 'data')) or {}
+        if rows[row]['Группа'] not in store.get('figures', {}):
+            self.values[('graph_request', 'data')] = {'group': rows[row]['Группа'], 'slice': store.get('slice')}
+            self.call('fetch_graph', [('graph_request', 'data')])
+
+    def submit_plan(self) -> None:
+        if not self.values.get(('tbl', 'data')):
+            return self.select_period()
+        key = ('send_confirmation_dialog', 'submit_n_clicks')
+        self.values[key] = (self.values.get(key) or 0) + 1
+        self.call('send_plan', [key])
+
+    def update_table(self, changed: list, label: str = None) -> None:
+        """
+        Обновляет таблицу и повторяет клиентский колбэк graphs_slice: при смене среза или групп таблицы
+        графики среза загружаются заранее
+        """
+        self.call('update_table', changed, label)
+        groups = [row['Группа'] for row in self.values.get(('tbl', 'data')) or []]
+        layer, value, db = (self.values.get(('forecast_layer', 'value')), self.values.get(('layer', 'value')),
+                            self.values.get(('db', 'value')))
+        key = json.dumps([layer, value, db, groups], ensure_ascii=False)
+        current = self.values.get(('graphs_slice', 'data'))
+        if current and current['key'] == key:
+            return
+        self.values[('graphs_slice', 'data')] = {'key': key, 'layer': layer, 'value': value, 'db': db, 'groups': groups}
+        self.call('prefetch_graphs', [('graphs_slice', 'data')])
+
+    def run(self, deadline: float) -> None:
+        actions = [self.select_period, self.select_layer, self.select_value, self.click_group, self.submit_plan]
+        weights = np.array([0.15, 0.15, 0.3, 0.3, 0.1 if self.submit else 0])
+        self.select_period()
+        while time.monotonic() < deadline:
+            actions[self.rng.choice(len(actions), p=weights / weights.sum())]()
+            time.sleep(self.rng.uniform(0, 2 * self.think))
+
+
+def load_callbacks(url: str, auth: tuple = None) -> dict:
+    """
+    Описания колбэков из _dash-dependencies: {имя: {output, outputs, inputs, state}}
+    """
+    dependencies = requests.get(url + '_dash-dependencies', auth=auth, timeout=30).json()
+    callbacks = {}
+    for name, output in CALLBACKS.items():
+        callback = next(dep for dep in dependencies if dep['output'].startswith(output))
+        outputs = [dict(zip(['id', 'property'], part.rsplit('.', 1)))
+                   for part in callback['output'].strip('.').split('...')]
+        callbacks[name] = {
+            'output': callback['output'],
+            'outputs': outputs if callback['output'].startswith('..') else outputs[0],
+            'inputs': callback['inputs'],
+            'state': callback['state'],
+        }
+    return callbacks
+
+
+def run_load(url: str, users: int, duration: float, periods: list, auth: tuple = None, submit: bool = False,
+             think: float = 0.5, seed: int = 0) -> Stats:
+    callbacks = load_callbacks(url, auth)
+    # первые запросы импортируют модули и заполняют кэши, они не входят в замер
+    warmup = Planner(url, callbacks, periods, Stats(), np.random.default_rng(seed), auth)
+    warmup.select_period()
+    warmup.click_group()
+    warmup.select_layer()
+
+    stats = Stats()
+    start = time.monotonic()
+    deadline = start + duration
+    planners = [Planner(url, callbacks, periods, stats, np.random.default_rng(seed + i), auth, submit, think)
+                for i in range(users)]
+    threads = [Thread(target=planner.run, args=(deadline,), daemon=True) for planner in planners]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats.duration = time.monotonic() - start
+    return stats
+
+
+def serve_local_app() -> str:
+    """
+    Запускает приложение Dash со страницами в фоновом потоке
+    :return: адрес приложения
+    """
+    from dash import Dash, DiskcacheManager
+    from werkzeug.serving import make_server
+    import diskcache
+    import tempfile
+    import logging
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    app = Dash('app', use_pages=True, url_base_pathname='/sales_program/',
+               background_callback_manager=DiskcacheManager(diskcache.Cache(tempfile.mkdtemp())))
+    server = make_server('127.0.0.1', 0, app.server, threaded=True)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}/sales_program/'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест колбэков Dash')
+    parser.add_argument('--url', help='адрес приложения, например http://127.0.0.1:8002/sales_program/; '
+                                      'без него приложение запускается локально на fakeredis и заглушке 1С')
+    parser.add_argument('--auth', help='логин:пароль для входа в приложение')
+    parser.add_argument('--users', type=int, default=10, help='количество одновременных планировщиков')
+    parser.add_argument('--duration', type=float, default=30, help='длительность теста в секундах')
+    parser.add_argument('--think', type=float, default=0.5, help='средняя пауза между действиями в секундах')
+    parser.add_argument('--submit', action='store_true', help='устанавливать планы (в локальном режиме всегда)')
+    parser.add_argument('--scale', choices=SCALES, default='medium', help='масштаб синтетического прогноза')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--seed-redis', metavar='REDIS_URL', help='заполнить базу Redis синтетическим прогнозом')
+    parser.add_argument('--stub-1c', type=int, metavar='PORT', help='запустить заглушку 1С на порту и ждать Ctrl+C')
+    args = parser.parse_args()
+
+    scale = SCALES[args.scale]
+    periods = [(first_period() + relativedelta(months=i)).isoformat() for i in range(scale.periods)]
+    if args.seed_redis or args.stub_1c:
+        if args.seed_redis:
+            seed_redis(UpgradedRedis.from_url(args.seed_redis, binary_format=True), scale, args.seed)
+            print(f'{args.seed_redis}: прогноз масштаба {args.scale} записан')
+        if args.stub_1c:
+            from tests.stub_1c import Stub1C
+            with Stub1C(plan_query_handler(scale, args.seed), port=args.stub_1c) as stub:
+                print(f'Заглушка 1С: {stub.address}, Ctrl+C - остановить')
+                try:
+                    while True:
+                        time.sleep(1)
+                except KeyboardInterrupt:
+                    pass
+        return
+
+    auth = tuple(args.auth.split(':', 1)) if args.auth else None
+    if args.url:
+        stats = run_load(args.url, args.users, args.duration, periods, auth, args.submit, args.think, args.seed)
+    else:
+        with local_environment(scale):
+            url = serve_local_app()
+            stats = run_load(url, args.users, args.duration, periods, submit=True, think=args.think, seed=args.seed)
+    print(stats.report())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""
+Синтетические данные для бенчмарков: таблицы прогноза, графики и списки значений разрезов в Redis,
+планы для заглушки 1С. Объем данных задается масштабом small / medium / large (переменная LK_BENCH_SCALE).
+"""
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from client_1c import Client1C
+from data_methods import RedisWorker, end_of_month, redis_worker, program_worker
+from settings import settings
+from tests.stub_1c import Stub1C, BASE, QUERY_ROUTE, SET_PROGRAM_ROUTE
+from dateutil.relativedelta import relativedelta
+from upgraded_redis import UpgradedRedis, dumps
+import numpy as np
+import pandas as pd
+import fakeredis
+import json
+import os
+import re
+import redis
+
+ACTUAL_DATE = datetime(2022, 6, 30)
+
+
+@dataclass(frozen=True)
+class Scale:
+    groups: int  # групп номенклатуры в таблице "В целом по компании"
+    subdivisions: int
+    regions: int
+    managers: int
+    slice_groups: int  # групп номенклатуры в таблице одного подразделения, региона или менеджера
+    graph_points: int  # точек истории на графике
+    periods: int = 1  # периодов прогноза, начиная с первого после ACTUAL_DATE
+
+
+SCALES = {
+    'small': Scale(groups=50, subdivisions=3, regions=5, managers=10, slice_groups=20, graph_points=300),
+    'medium': Scale(groups=300, subdivisions=15, regions=40, managers=150, slice_groups=80, graph_points=1500),
+    'large': Scale(groups=1000, subdivisions=30, regions=100, managers=400, slice_groups=200, graph_points=3000),
+}
+
+
+def scale_from_env() -> Scale:
+    return SCALES[os.environ.get('LK_BENCH_SCALE', 'medium')]
+
+
+def first_period() -> datetime:
+    return end_of_month(ACTUAL_DATE + relativedelta(months=1))
+
+
+def group_names(count: int) -> list:
+    return [f'О-{i // 100:02}.{i % 100:02}. Группа номенклатуры {i}' for i in range(count)]
+
+
+def layer_values(scale: Scale) -> dict:
+    """
+    :return: {ключ разреза в Redis: список значений}
+    """
+    return {
+        'subdivision': [f'Подразделение {i}, Тополиная, {i}/1' for i in range(scale.subdivisions)],
+        'region': [f'Направление {i} - район {i}' for i in range(scale.regions)],
+        'manager': [f'Менеджеров{i} Менеджер Иванович' for i in range(scale.managers)],
+    }
+
+
+def forecast_table(groups: list, rng: np.random.Generator) -> dict:
+    return pd.DataFrame({
+        'Группа': groups,
+        'Прогноз': rng.gamma(2, 50, len(groups)),
+        'RMSE': rng.gamma(2, 10, len(groups)),
+        'Ед': rng.choice(['м3', 'руб'], len(groups)),
+    }).to_dict()
+
+
+def figure_json(points: int, rng: np.random.Generator) -> str:
+    """
+    JSON графика модели в том виде, в каком его сохраняет plotly: история, прогноз и границы прогноза
+    """
+    x = pd.date_range('2016-08-31', periods=points, freq='D').strftime('%Y-%m-%d').tolist()
+    y = rng.gamma(2, 50, points).round(6)
+    return json.dumps({
+        'data': [
+            {'type': 'scatter', 'mode': 'markers', 'name': 'История', 'x': x, 'y': y.tolist(),
+             'marker': {'color': 'black', 'size': 4}},
+            {'type': 'scatter', 'mode': 'lines', 'name': 'Прогноз', 'x': x, 'y': (y * 1.1).tolist()},
+            {'type': 'scatter', 'mode': 'lines', 'name': 'Верхняя граница', 'x': x, 'y': (y * 1.3).tolist(),
+             'fill': 'tonexty', 'line': {'width': 0}},
+            {'type': 'scatter', 'mode': 'lines', 'name': 'Нижняя граница', 'x': x, 'y': (y * 0.7).tolist(),
+             'fill': 'tonexty', 'line': {'width': 0}},
+        ],
+        'layout': {'template': {'layout': {'font': {'color': '#2a3f5f'}}}, 'showlegend': False},
+    })
+
+
+def seed_redis(r: UpgradedRedis, scale: Scale, seed: int = 0) -> None:
+    """
+    Записывает в базу прогноз масштаба scale: actual_date, списки значений разрезов, таблицы прогноза
+    всех срезов за scale.periods периодов и графики моделей "В целом по компании" по каждой группе
+    """
+    rng = np.random.default_rng(seed)
+    groups = group_names(scale.groups)
+    values = layer_values(scale)
+
+    pipe = r.pipeline(transaction=False)
+    pipe.set('actual_date', ACTUAL_DATE.strftime('%Y-%m-%d'))
+    for key, options in values.items():
+        pipe.set(key, dumps({'data': options}, r.binary_format))
+
+    for i in range(scale.periods):
+        period = end_of_month(first_period() + relativedelta(months=i)).strftime('%d.%m.%Y')
+        pipe.set(f'{period},None,None,None', dumps(forecast_table(groups, rng), r.binary_format))
+        for key, options in values.items():
+            for option in options:
+                layer_kwargs = {'subdivision': None, 'region': None, 'manager': None, key: option}
+                slice_groups = sorted(rng.choice(groups, min(scale.slice_groups, len(groups)), replace=False))
+                pipe.set(f'{period},{",".join(map(str, layer_kwargs.values()))}',
+                         dumps(forecast_table(slice_groups, rng), r.binary_format))
+        pipe.execute()
+
+    for group in groups:
+        figure = {'data': figure_json(scale.graph_points, rng)}
+        pipe.set(f'prophet,{group},None,None,None,graph', dumps(figure, r.binary_format))
+    pipe.execute()
+
+
+def plan_query_handler(scale: Scale, seed: int = 0):
+    """
+    :return: обработчик запросов для Stub1C, возвращающий планы по всем значениям разреза запроса
+    """
+    rng = np.random.default_rng(seed)
+    groups = group_names(scale.groups)
+    registers = dict(zip(['ПоПодразделениям', 'ПоРегионам', 'ПоМенеджерам'], layer_values(scale).values()))
+
+    def rows(options: list) -> list:
+        result = []
+        for option in options:
+            slice_groups = groups if option is None else groups[:scale.slice_groups]
+            plans = rng.gamma(2, 50, len(slice_groups)).round(1)
+            for group, plan in zip(slice_groups, plans.tolist()):
+                row = {'Группа': group, 'План': plan, 'Отклонение': round(plan * 0.1, 1)}
+                result.append(row if option is None else {'Значение': option, **row})
+        return result
+
+    answers = {register: rows(options) for register, options in registers.items()}
+    general = rows([None])
+
+    def query_handler(query: str) -> list:
+        for register, answer in answers.items():
+            if register in query:
+                if 'КАК Значение' in query:
+                    return answer
+                # запрос одного значения разреза: значение - в строковом литерале условия, без колонки Значение
+                value = re.search(r'Наименование = "((?:[^"]|"")*)"', query).group(1).replace('""', '"')
+                return [{key: row[key] for key in row if key != 'Значение'}
+                        for row in answer if row['Значение'] == value]
+        return general
+
+    return query_handler
+
+
+@contextmanager
+def local_environment(scale: Scale):
+    """
+    Подменяет redis_worker[0] на RedisWorker с fakeredis, заполненным прогнозом масштаба scale,
+    а клиент program_worker - на клиент заглушки 1С
+    :return: (RedisWorker, Stub1C)
+    """
+    pool = redis.ConnectionPool(connection_class=fakeredis.FakeConnection, server=fakeredis.FakeServer())
+    seed_redis(UpgradedRedis(connection_pool=pool, binary_format=True), scale)
+    worker = RedisWorker(connection_pool=pool, cache_ttl=settings.cache_ttl,
+                         graph_cache_bytes=settings.graph_cache_bytes)
+    client = program_worker.client
+    with Stub1C(plan_query_handler(scale)) as stub:
+        redis_worker._workers[0] = worker
+        program_worker.client = Client1C(stub.address, BASE, 'user', 'password', 'key', QUERY_ROUTE,
+                                         SET_PROGRAM_ROUTE, max_connections=program_worker.max_workers)
+        try:
+            yield worker, stub
+        finally:
+            redis_worker._workers[0] = None
+            program_worker.client = client
@@ -0,0 +1,37 @@
+"""
+Время холодного старта приложения при недоступных Redis и 1С.
+Импорт app не должен обращаться к сети, поэтому время старта не зависит от их доступности.
+Запуск из корня проекта: python -m benchmarks.startup
+"""
+from tests.stub_env import stub_env_environ
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+UNREACHABLE_HOST = '10.255.255.1'  # немаршрутизируемый адрес: соединение с ним зависает до таймаута
+RUNS = 5
+BUDGET_SECONDS = 10
+
+
+def cold_start(environ: dict) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-c', 'import app'], check=True, env=environ,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main():
+    # env.py не хранится в репозитории: без него подставляется заглушка
+    with tempfile.TemporaryDirectory() as directory:
+        environ = stub_env_environ(directory, dict(os.environ, LK_REDIS_HOST=UNREACHABLE_HOST,
+                                                   LK_SERVER=UNREACHABLE_HOST))
+        timings = sorted(cold_start(environ) for _ in range(RUNS))
+    print(f'Холодный старт: мин {timings[0]:.2f} с, медиана {timings[RUNS // 2]:.2f} с, макс {timings[-1]:.2f} с')
+    if timings[RUNS // 2] > BUDGET_SECONDS:
+        sys.exit(f'Медиана холодного старта больше {BUDGET_SECONDS} с')
+
+
+if __name__ == '__main__':
+    main()
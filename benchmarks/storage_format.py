@@ -0,0 +1,51 @@
+"""
+Сравнение размера и времени разбора таблиц прогноза и графиков в JSON и в двоичном формате (msgpack + zstd).
+Запуск из корня проекта: python -m benchmarks.storage_format
+"""
+from upgraded_redis import dumps, loads
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import timeit
+
+
+def synthetic_table(groups: int = 500, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Группа': [f'О-{i // 100:02}.{i % 100:02}. Группа номенклатуры {i}' for i in range(groups)],
+        'Прогноз': rng.gamma(2, 50, groups),
+        'RMSE': rng.gamma(2, 10, groups),
+        'Ед': rng.choice(['м3', 'руб'], groups),
+    }).to_dict()
+
+
+def synthetic_figure(points: int = 2000, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    x = pd.date_range('2016-08-31', periods=points, freq='D')
+    y = rng.gamma(2, 50, points)
+    fig = go.Figure([
+        go.Scatter(x=x, y=y, mode='markers', name='История'),
+        go.Scatter(x=x, y=y * 1.1, mode='lines', name='Прогноз'),
+        go.Scatter(x=x, y=y * 1.3, mode='lines', fill='tonexty', name='Верхняя граница'),
+    ])
+    return {'data': fig.to_json()}
+
+
+def measure(name: str, value: dict, number: int = 50):
+    json_raw = dumps(value, binary=False)
+    binary_raw = dumps(value)
+    json_time = min(timeit.repeat(lambda: loads(json_raw), number=number, repeat=3)) / number
+    binary_time = min(timeit.repeat(lambda: loads(binary_raw), number=number, repeat=3)) / number
+    print(f'{name}: JSON {len(json_raw) / 1024:8.1f} КБ, {json_time * 1000:6.2f} мс; '
+          f'msgpack+zstd {len(binary_raw) / 1024:8.1f} КБ, {binary_time * 1000:6.2f} мс')
+
+
+def main():
+    measure('Таблица, 500 групп ', synthetic_table())
+    measure('График, 2000 точек ', synthetic_figure())
+    figure = synthetic_figure()
+    measure('График словарем    ', {'data': loads(figure['data'].encode('utf-8'))})
+
+
+if __name__ == '__main__':
+    main()
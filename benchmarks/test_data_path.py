@@ -0,0 +1,83 @@
+"""
+Бенчмарки пути данных прогноза и планов: Redis -> таблица и график, 1С -> планы -> таблица, таблица -> 1С.
+Холодный вариант сбрасывает кэши перед каждым замером, теплый замеряет повторное обращение.
+
+Запуск из корня проекта:
+    pytest benchmarks --benchmark-save=baseline
+    pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:20%
+Масштаб данных: LK_BENCH_SCALE=small|medium|large, по умолчанию medium.
+"""
+from benchmarks.seed import group_names, layer_values
+from data_methods import program_worker
+import pytest
+
+
+def manager(scale) -> str:
+    return layer_values(scale)['manager'][0]
+
+
+@pytest.mark.parametrize('cache', ['cold', 'warm'])
+def test_forecast_rollup(benchmark, worker, scale, period, cache):
+    setup = worker.clear_caches if cache == 'cold' else None
+    rollup = benchmark.pedantic(worker.forecast_rollup, args=(period,), setup=setup, rounds=5, warmup_rounds=1)
+    assert len(rollup.index.unique()) == 1 + sum(len(values) for values in layer_values(scale).values())
+
+
+def test_forecast_slice(benchmark, worker, scale, period):
+    worker.forecast_rollup(period)
+    _df = benchmark.pedantic(worker.forecast_slice, args=(period, 'Менеджер', manager(scale)), rounds=50,
+                             warmup_rounds=1)
+    assert not _df.empty
+
+
+@pytest.mark.parametrize('as_dict', [True, False], ids=['dict', 'figure'])
+@pytest.mark.parametrize('cache', ['cold', 'warm'])
+def test_get_graph(benchmark, worker, scale, cache, as_dict):
+    group = group_names(scale.groups)[0]
+    setup = worker.clear_caches if cache == 'cold' else None
+    figure = benchmark.pedantic(worker.main_graph, args=(group, as_dict), setup=setup, rounds=20, warmup_rounds=1)
+    assert figure['data']
+
+
+@pytest.mark.parametrize('cache', ['cold', 'warm'])
+def test_graphs(benchmark, worker, scale, cache):
+    groups = group_names(scale.groups)[:scale.slice_groups]
+    setup = worker.clear_caches if cache == 'cold' else None
+    figures = benchmark.pedantic(worker.graphs, args=(groups,), setup=setup, rounds=10, warmup_rounds=1)
+    assert len(figures) == len(groups)
+
+
+@pytest.mark.parametrize('cache', ['cold', 'warm'])
+def test_options(benchmark, worker, scale, cache):
+    setup = worker.clear_caches if cache == 'cold' else None
+    options = benchmark.pedantic(worker.options, args=('Менеджер',), setup=setup, rounds=50, warmup_rounds=1)
+    assert len(options) == scale.managers
+
+
+@pytest.mark.parametrize('cache', ['cold', 'warm'])
+def test_fill_tbl(benchmark, pages, worker, scale, period, cache):
+    programs, admin = pages
+
+    def setup():
+        if cache == 'cold':
+            worker.clear_caches()
+            program_worker.invalidate_snapshot(period, 'Менеджер')
+
+    data, columns = benchmark.pedantic(programs.fill_tbl, kwargs={'period': period, 'manager': manager(scale)},
+                                       setup=setup, rounds=20, warmup_rounds=1)
+    assert data and columns
+
+
+def test_send_program_to_1c(benchmark, pages, scale, period):
+    programs, admin = pages
+    data, columns = programs.fill_tbl(period=period, manager=manager(scale))
+    error = benchmark.pedantic(programs.send_program_to_1c, args=(data, period, 'Менеджер'),
+                               kwargs={'manager': manager(scale)}, rounds=20, warmup_rounds=1)
+    assert error is None
+
+
+def test_send_all_programs_to_1c(benchmark, pages, worker, period):
+    programs, admin = pages
+    summary = benchmark.pedantic(admin.send_all_programs_to_1c, args=(period,),
+                                 setup=worker.clear_caches, rounds=3, warmup_rounds=0)
+    assert not summary['failed']
@@ -0,0 +1,92 @@
+from collections import OrderedDict
+from threading import Lock
+import time
+
+
+class LRUCache:
+    """
+    Потокобезопасный LRU кэш с ограничением по количеству записей, суммарному размеру записей
+    и временем жизни записи
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float | None = None, maxbytes: int | None = None):
+        """
+        :param maxsize: максимальное количество записей
+        :param ttl: время жизни записи в секундах, None - без ограничения
+        :param maxbytes: максимальный суммарный размер записей в байтах, None - без ограничения
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.hits = 0
+        self.misses = 0
+        self.currbytes = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                expires, size, value = item
+                if expires is None or expires > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._pop(key)
+            self.misses += 1
+            return default
+
+    def set(self, key, value, size: int = 0) -> None:
+        """
+        :param size: размер записи в байтах, учитывается при ограничении maxbytes
+        """
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+            self._data[key] = (expires, size, value)
+            self.currbytes += size
+            while len(self._data) > self.maxsize or (
+                    self.maxbytes is not None and self.currbytes > self.maxbytes and len(self._data) > 1):
+                self._pop(next(iter(self._data)))
+
+    def replace(self, key, value) -> bool:
+        """
+        Заменяет значение записи, сохраняя ее время жизни и размер
+        :return: False - записи нет или она устарела
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or (item[0] is not None and item[0] <= time.monotonic()):
+                return False
+            self._data[key] = (item[0], item[1], value)
+            return True
+
+    def sizeof(self, key) -> int:
+        """
+        :return: размер записи в байтах, 0 - если записи нет
+        """
+        with self._lock:
+            item = self._data.get(key)
+            return item[1] if item is not None else 0
+
+    def pop(self, key) -> None:
+        with self._lock:
+            if key in self._data:
+                self._pop(key)
+
+    def _pop(self, key) -> None:
+        self.currbytes -= self._data.pop(key)[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.currbytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def info(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data), 'maxsize': self.maxsize,
+                'bytes': self.currbytes, 'maxbytes': self.maxbytes}
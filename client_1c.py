@@ -0,0 +1,139 @@
+import gzip
+import json
+import requests
+from requests.adapters import HTTPAdapter
+from threading import Lock
+import time
+from metrics import timer, REQUEST_1C_SECONDS, REQUEST_1C_BYTES
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Запрос не отправлен: 1С считается недоступной после серии ошибок
+    """
+
+
+class CircuitBreaker:
+    """
+    После failure_threshold ошибок подряд размыкается и recovery_timeout секунд отклоняет запросы,
+    затем пропускает один пробный запрос: при успехе замыкается, при ошибке снова размыкается
+    """
+    # коды ответов шлюза перед 1С, означающие недоступность сервера; остальные ответы означают, что 1С работает
+    outage_statuses = (502, 503, 504)
+
+    def __init__(self, failure_threshold: int = 3, recovery_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = Lock()
+
+    @property
+    def closed(self) -> bool:
+        return self.opened_at is None
+
+    def retry_in(self) -> float:
+        """
+        :return: секунд до следующего пробного запроса, 0 - если запросы разрешены
+        """
+        if self.opened_at is None:
+            return 0
+        return max(0., self.opened_at + self.recovery_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if not self._trial and time.monotonic() >= self.opened_at + self.recovery_timeout:
+                self._trial = True
+                return True
+            return False
+
+    def success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+class Client1C:
+    """
+    HTTP клиент сервисов 1С free_query и set_program: пул keep-alive соединений, таймауты на соединение и чтение,
+    компактный JSON и необязательное сжатие тела запроса gzip
+    """
+
+    def __init__(self, server: str, base: str, user: str, password: str, api_key: str, query_route: str,
+                 set_program_route: str, connect_timeout: float = 3, read_timeout: float = 60,
+                 max_connections: int = 8, compress: bool = False, compress_min_size: int = 1024,
+                 breaker: CircuitBreaker = None):
+        """
+        :param connect_timeout: таймаут установки соединения в секундах
+        :param read_timeout: таймаут ожидания ответа в секундах
+        :param max_connections: размер пула соединений, при исчерпании запросы ждут свободное соединение
+        :param compress: сжимать тело запроса gzip (Content-Encoding: gzip)
+        :param compress_min_size: сжимать только тела не меньше этого размера в байтах
+        :param breaker: автомат отключения запросов при недоступности 1С
+        """
+        self.base_url = f'http://{server}/{base}'
+        self.api_key = api_key
+        self.query_route = query_route
+        self.set_program_route = set_program_route
+        self.timeout = (connect_timeout, read_timeout)
+        self.compress = compress
+        self.compress_min_size = compress_min_size
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        self.session.auth = (user, password)
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=max_connections, pool_block=True))
+        self.headers = {'Content-type': 'application/json; charset=UTF-8',
+                        'Accept': 'text/plain'}
+
+    def post_json(self, route: str, payload: dict) -> requests.Response:
+        """
+        :raises CircuitOpenError: если 1С недоступна и автомат разомкнут
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(f'1С недоступна, повтор через {self.breaker.retry_in():.0f} с')
+        try:
+            with timer(REQUEST_1C_SECONDS, route):
+                response = self._post_json(route, payload)
+        except requests.exceptions.RequestException:
+            self.breaker.failure()
+            raise
+        # ошибка 500 при записи одного плана - ошибка приложения 1С, а не ее недоступность
+        if response.status_code in self.breaker.outage_statuses:
+            self.breaker.failure()
+        else:
+            self.breaker.success()
+        REQUEST_1C_BYTES.labels(route, 'response').observe(len(response.content))
+        return response
+
+    def _post_json(self, route: str, payload: dict) -> requests.Response:
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        headers = self.headers
+        if self.compress and len(body) >= self.compress_min_size:
+            body = gzip.compress(body)
+            headers = {**headers, 'Content-Encoding': 'gzip'}
+        REQUEST_1C_BYTES.labels(route, 'request').observe(len(body))
+        return self.session.post(self.base_url + route, data=body, headers=headers, timeout=self.timeout)
+
+    def query(self, query: str) -> requests.Response:
+        """
+        Выполняет запрос на языке запросов 1С через сервис free_query
+        """
+        return self.post_json(self.query_route, {'api_key': self.api_key, 'query': query})
+
+    def set_program(self, payload: dict) -> requests.Response:
+        return self.post_json(self.set_program_route, payload)
+
+    def close(self) -> None:
+        self.session.close()
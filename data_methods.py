@@ -1,20 +1,28 @@
 import requests
-from env import SERVER, BASE, SET_PROGRAM_ROUTE, USER, PASSWORD, API_KEY, GET_QUERY_ROUTE
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from client_1c import Client1C, CircuitBreaker, CircuitOpenError
+from settings import settings
 from queries import GET_GENERAL_PROGRAM_QUERY, GET_SUBDIVISION_PROGRAM_QUERY, GET_REGION_PROGRAM_QUERY, \
-    GET_MANAGER_PROGRAM_QUERY
+    GET_MANAGER_PROGRAM_QUERY, GET_ALL_SUBDIVISION_PROGRAM_QUERY, GET_ALL_REGION_PROGRAM_QUERY, \
+    GET_ALL_MANAGER_PROGRAM_QUERY, GET_SALES_QUERY
 from datetime import datetime
 import logging
 import json
 import pandas as pd
-import pdb
-from plotly import io
-from upgraded_redis import UpgradedRedis
-from redis.exceptions import ConnectionError as RedisConnectionError, DataError
-import plotly.express as px
+from upgraded_redis import UpgradedRedis, InstrumentedConnectionPool, PoolExhaustedError, loads
+from cache import LRUCache
+from tables import forecast_rollup, rollup_slice, program_checksums
+from metrics import timed, timer, REDIS_SECONDS, REDIS_BYTES, PARSE_SECONDS, FIGURE_BYTES
+from figures import slim_figure, json_bytes, SlimOptions
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError, DataError
 from dateutil.relativedelta import relativedelta
 from calendar import monthrange
-import argparse
-import sys
+from threading import Lock, Thread
+import time
+from bisect import bisect_left
+
+
+LAYERS = ['В целом по компании', 'Подразделение', 'Регион', 'Менеджер']
 
 
 def keys(key):
@@ -56,38 +64,281 @@ def date_options() -> list:
     return _options
 
 
+def datetime_1c(_date: datetime) -> str:
+    """
+    :return: литерал даты языка запросов 1С
+    """
+    return f'ДАТАВРЕМЯ({_date.year}, {_date.month}, {_date.day}, {_date.hour}, {_date.minute}, {_date.second})'
+
+
+class OptionIndex:
+    """
+    Отсортированный список значений разреза без повторов и пустых строк с поиском по началу слова
+    """
+
+    def __init__(self, values: list):
+        self.values = sorted({value for value in values if isinstance(value, str) and value != ''})
+        # (слово или вся строка в нижнем регистре, значение), отсортировано для бинарного поиска
+        self._keys = sorted({(token, value) for value in self.values
+                             for token in [value.casefold(), *value.casefold().split()]})
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __contains__(self, value) -> bool:
+        i = bisect_left(self.values, value)
+        return i < len(self.values) and self.values[i] == value
+
+    def search(self, prefix: str, limit: int | None = None) -> list:
+        """
+        :param prefix: начало любого слова значения или всей строки, без учета регистра
+        :param limit: максимальное количество результатов
+        :return: отсортированный список найденных значений
+        """
+        prefix = prefix.casefold().strip()
+        found = set()
+        i = bisect_left(self._keys, (prefix,))
+        while i < len(self._keys) and self._keys[i][0].startswith(prefix):
+            found.add(self._keys[i][1])
+            i += 1
+        return sorted(found)[:limit]
+
+
 class RedisWorker(UpgradedRedis):
     logger = logging.getLogger('MyRedis')
+    actual_date_check_interval = 5  # секунд между проверками ключа actual_date
+    retry_after = 5  # секунд без обращений к Redis после ошибки соединения
+
+    def __init__(self, *args, cache_ttl: float | None = 3600, graph_cache_bytes: int = 64 * 1024 * 1024,
+                 slim_options: SlimOptions = None, **kwargs):
+        """
+        :param cache_ttl: время жизни записей кэшей в секундах
+        :param graph_cache_bytes: максимальный объем JSON графиков в кэше в байтах
+        :param slim_options: параметры облегчения графиков, по умолчанию - из настроек
+        """
+        super().__init__(*args, **kwargs)
+        if slim_options is None:
+            slim_options = SlimOptions(settings.figure_digits, settings.figure_strip_template,
+                                       settings.figure_max_points, settings.figure_max_bytes)
+        self.slim_options = slim_options
+        self.graph_cache = LRUCache(4096, cache_ttl, maxbytes=graph_cache_bytes)
+        self.options_cache = LRUCache(16, cache_ttl)
+        self.rollup_cache = LRUCache(8, cache_ttl)
+        self._actual_date = None
+        self._actual_date_checked = 0.
+        self._unavailable_until = 0.
+
+    def _check_actual_date(self, force: bool = False) -> None:
+        """
+        Сбрасывает кэши, если в базе опубликован новый прогноз (изменился ключ actual_date).
+        Ключ перечитывается не чаще, чем раз в actual_date_check_interval секунд.
+        :param force: перечитать ключ без ожидания интервала
+        """
+        now = time.monotonic()
+        if not force and now - self._actual_date_checked < self.actual_date_check_interval:
+            return
+        self._actual_date_checked = now
+        actual_date = self.get('actual_date')
+        if actual_date is not None and actual_date != self._actual_date:
+            self._actual_date = actual_date
+            self.clear_caches()
+
+    def clear_caches(self) -> None:
+        self.graph_cache.clear()
+        self.options_cache.clear()
+        self.rollup_cache.clear()
+
+    def cache_info(self) -> dict:
+        return {'graph': self.graph_cache.info(), 'options': self.options_cache.info(),
+                'rollup': self.rollup_cache.info()}
+
+    def pool_info(self) -> dict:
+        if isinstance(self.connection_pool, InstrumentedConnectionPool):
+            return self.connection_pool.info()
+        return {}
 
     def get(self, *args, **kwargs):
+        raw = self._fail_fast(super().get, *args, **kwargs)
+        if raw is not None:
+            REDIS_BYTES.labels('get').observe(len(raw))
+        return raw
+
+    def mget(self, *args, **kwargs):
+        raws = self._fail_fast(super().mget, *args, **kwargs)
+        if raws is not None:
+            REDIS_BYTES.labels('mget').observe(sum(len(raw) for raw in raws if raw is not None))
+        return raws
+
+    def _fail_fast(self, command, *args, **kwargs):
+        """
+        Выполняет команду Redis. После ошибки соединения или таймаута команды retry_after секунд
+        не выполняются и сразу возвращают None, чтобы запросы не ждали недоступный Redis.
+        Исчерпание пула соединений под нагрузкой не означает недоступность Redis: не выполняется только эта команда.
+        """
+        if time.monotonic() < self._unavailable_until:
+            return None
         try:
-            return super().get(*args, **kwargs)
-        except (RedisConnectionError, DataError) as ex:
+            return command(*args, **kwargs)
+        except PoolExhaustedError as ex:
+            self.logger.warning(ex)
+        except (RedisConnectionError, RedisTimeoutError) as ex:
+            self._unavailable_until = time.monotonic() + self.retry_after
             self.logger.error(ex)
-            return None
+        except DataError as ex:
+            self.logger.error(ex)
+        return None
+
+    @timed(REDIS_SECONDS, '_get_graph')
+    def _get_graph(self, graph, group: str = '', as_dict: bool = False, **kwargs):
+        """
+        Возвращает график модели из кэша или из Redis.
+        Закэшированные объекты общие для всех вызывающих и не должны изменяться.
+        :param as_dict: вернуть словарь с JSON графика без построения объекта Figure (для отдачи прямо в Dash)
+        """
+        key = self._graph_key(graph, group, **kwargs)
+        self._check_actual_date()
 
-    def _get_graph(self, graph, group: str = '', **kwargs):
-        key = f'prophet,{group},{kwargs.get("subdivision")},{kwargs.get("region")},{kwargs.get("manager")},{graph}'
+        cache_key = (key, as_dict)
+        figure = self.graph_cache.get(cache_key)
+        if figure is not None:
+            return figure
         try:
-            model = json.loads(self.get(key))
-            return io.from_json(model['data'], skip_invalid=True)
+            figure, size = self._parse_graph(self.get(key), as_dict, graph)
+            self.graph_cache.set(cache_key, figure, size=size)
+            return figure
         except (json.JSONDecodeError, ValueError, TypeError, KeyError) as ex:
-            return px.scatter()
+            return self._empty_graph(as_dict)
+
+    @timed(REDIS_SECONDS, 'graphs')
+    def graphs(self, groups: list, graph: str = 'graph', max_bytes: int | None = None, **kwargs) -> dict:
+        """
+        Загружает словари JSON графиков нескольких групп среза: закэшированные берутся из памяти,
+        остальные - из Redis одним запросом MGET. Для групп без графика в Redis возвращается пустой график.
+        :param groups: группы в порядке важности
+        :param graph: 'graph', 'graph_component' или 'boxplot'
+        :param max_bytes: ограничение суммарного размера JSON графиков, группы сверх него пропускаются
+        :param kwargs: значение разреза subdivision, region или manager
+        :return: {группа: словарь JSON графика}, None - графиков нет в кэше, а Redis недоступен
+        """
+        self._check_actual_date()
+        cache_keys = {group: (self._graph_key(graph, group, **kwargs), True) for group in groups}
+        cached = {group: self.graph_cache.get(cache_key) for group, cache_key in cache_keys.items()}
+        missing = [group for group, figure in cached.items() if figure is None]
+        raws = self.mget([cache_keys[group][0] for group in missing]) if missing else []
+        if raws is None:
+            # пустые графики вместо незагруженных остались бы в браузере до смены среза
+            return None
+        raws = dict(zip(missing, raws))
+
+        figures = {}
+        total = 0
+        for group in groups:
+            if max_bytes is not None and total >= max_bytes:
+                break
+            figure = cached[group]
+            if figure is not None:
+                size = self.graph_cache.sizeof(cache_keys[group])
+            elif raws.get(group) is None:
+                figures[group] = self._empty_graph(as_dict=True)
+                continue
+            else:
+                try:
+                    figure, size = self._parse_graph(raws[group], True, graph)
+                except (json.JSONDecodeError, ValueError, TypeError, KeyError) as ex:
+                    figures[group] = self._empty_graph(as_dict=True)
+                    continue
+                self.graph_cache.set(cache_keys[group], figure, size=size)
+            if max_bytes is not None and total + size > max_bytes:
+                continue
+            figures[group] = figure
+            total += size
+        return figures
+
+    @staticmethod
+    def _graph_key(graph: str, group: str = '', **kwargs) -> str:
+        return f'prophet,{group},{kwargs.get("subdivision")},{kwargs.get("region")},{kwargs.get("manager")},{graph}'
+
+    def _parse_graph(self, raw, as_dict: bool, graph: str = 'graph') -> tuple:
+        """
+        Разбирает и облегчает график (figures.slim_figure), размеры JSON до и после облегчения пишутся в метрику
+        :return: (словарь JSON или объект Figure, размер облегченного JSON в байтах)
+        """
+        with timer(PARSE_SECONDS, 'graph'):
+            figure_data = loads(raw)['data']
+            # в двоичном формате график может храниться словарем, а не строкой JSON
+            figure = json.loads(figure_data) if isinstance(figure_data, str) else figure_data
+        # оба размера считаются одной сериализацией: строка из Redis хранится без ensure_ascii, а Dash отправляет с ним
+        original_size = json_bytes(figure)
+        with timer(PARSE_SECONDS, 'slim_graph'):
+            figure, size = slim_figure(figure, self.slim_options)
+        FIGURE_BYTES.labels(graph, 'original').observe(original_size)
+        FIGURE_BYTES.labels(graph, 'slim').observe(size)
+        if not as_dict:
+            # plotly долго импортируется, поэтому загружается только при построении объекта Figure
+            from plotly import graph_objects as go
+            figure = go.Figure(figure, skip_invalid=True)
+        return figure, size
 
-    def main_graph(self, group: str = '', **kwargs):
-        return self._get_graph('graph', group, **kwargs)
+    @staticmethod
+    def _empty_graph(as_dict: bool):
+        if as_dict:
+            return {'data': [], 'layout': {}}
+        from plotly import graph_objects as go
+        return go.Figure()
 
-    def graph_components(self, group: str = '', **kwargs):
-        return self._get_graph('graph_component', group, **kwargs)
+    def main_graph(self, group: str = '', as_dict: bool = False, **kwargs):
+        return self._get_graph('graph', group, as_dict, **kwargs)
 
-    def boxplot(self, group: str = '', **kwargs):
-        return self._get_graph('boxplot', group, **kwargs)
+    def graph_components(self, group: str = '', as_dict: bool = False, **kwargs):
+        return self._get_graph('graph_component', group, as_dict, **kwargs)
 
-    def main_table(self, period: datetime = None, subdivision=None, region=None, manager=None) -> pd.DataFrame:
-        period = end_of_month(period)
+    def boxplot(self, group: str = '', as_dict: bool = False, **kwargs):
+        return self._get_graph('boxplot', group, as_dict, **kwargs)
 
+    @timed(REDIS_SECONDS, 'forecast_rollup')
+    def forecast_rollup(self, period: datetime) -> pd.DataFrame:
+        """
+        Таблицы прогноза всех срезов периода, свернутые и округленные за один проход (tables.forecast_rollup).
+        Все таблицы загружаются одним запросом MGET, результат хранится в памяти до публикации нового прогноза.
+        Закэшированный dataframe общий для всех вызывающих и не должен изменяться.
+        :param period: datetime период прогноза
+        :return: dataframe с индексом (Разрез, Значение), значение "В целом по компании" - пустая строка
+        """
+        period = end_of_month(period).strftime("%d.%m.%Y")
+        self._check_actual_date()
+
+        rollup = self.rollup_cache.get(period)
+        if rollup is not None:
+            return rollup
+        indexes = {layer: self.option_index(layer) for layer in LAYERS}
+        slices = [(layer, option) for layer, index in indexes.items()
+                  for option in ([None] if keys(layer) is None else index.values if index is not None else [])]
+        redis_keys = []
+        for layer, option in slices:
+            layer_kwargs = {'subdivision': None, 'region': None, 'manager': None}
+            if option is not None:
+                layer_kwargs[keys(layer)] = option
+            redis_keys.append(','.join(map(str, (period, *layer_kwargs.values()))))
+        raws = self.mget(redis_keys) or [None] * len(redis_keys)
+        rollup = forecast_rollup({_slice: self._parse_table(raw) for _slice, raw in zip(slices, raws)})
+        # свертка без разреза, значения которого не загрузились, не кэшируется: иначе его срезы остались бы пустыми
+        if not rollup.empty and all(index is not None for index in indexes.values()):
+            self.rollup_cache.set(period, rollup)
+        return rollup
+
+    def forecast_slice(self, period: datetime, layer: str, value=None) -> pd.DataFrame:
+        """
+        Свернутая таблица прогноза среза из forecast_rollup
+        :param layer: имя разреза "В целом по компании", "Подразделение", "Регион", "Менеджер"
+        :param value: значение разреза, для "В целом по компании" - None
+        :return: копия таблицы среза, как после tables.forecast_table; пустой dataframe - если среза нет
+        """
+        return rollup_slice(self.forecast_rollup(period), layer, value)
+
+    @timed(PARSE_SECONDS, 'table')
+    def _parse_table(self, raw) -> pd.DataFrame:
         try:
-            data_dict = json.loads(self.get(f'{period.strftime("%d.%m.%Y")},{subdivision},{region},{manager}'))
+            data_dict = loads(raw)
             _df = pd.DataFrame(data_dict).reset_index(drop=True)
             _df['Прогноз'] = _df['Прогноз'].fillna(0)
             _df['RMSE'] = _df['RMSE'].fillna(0)
@@ -110,94 +361,551 @@ class RedisWorker(UpgradedRedis):
             return None
 
     def options(self, layer: str) -> list:
-        def options_iterator(_actual_data):
-            for k in _actual_data.sort_values(by='data')['data'].unique():
-                if k != '':
-                    yield k
+        index = self.option_index(layer)
+        return [] if index is None else list(index.values)
 
+    @timed(REDIS_SECONDS, 'option_index')
+    def option_index(self, layer: str) -> OptionIndex | None:
+        """
+        Индекс значений разреза, хранится в памяти до публикации нового прогноза
+        :param layer: имя разреза "Подразделение", "Регион", "Менеджер"
+        :return: индекс, для "В целом по компании" - пустой; None - значения не загружены (Redis недоступен,
+            пул соединений исчерпан или ключа нет)
+        """
+        if keys(layer) is None:
+            return OptionIndex([])
+        self._check_actual_date()
+        index = self.options_cache.get(layer)
+        if index is not None:
+            return index
         try:
-            options = pd.DataFrame(json.loads(self.get(keys(layer)))['data'], columns=['data'])
-            return [k for k in options_iterator(options)]
+            index = OptionIndex(loads(self.get(keys(layer)))['data'])
         except (json.JSONDecodeError, ValueError, TypeError, KeyError) as ex:
-            return []
+            return None
+        self.options_cache.set(layer, index)
+        return index
 
 
 class ProgramWorker:
     logger = logging.getLogger('ProgramWorker')
     logger.level = logging.INFO
 
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.auth = (USER, PASSWORD)
-        self.headers = {'Content-type': 'application/json; charset=UTF-8',
-                        'Accept': 'text/plain'}
+    snapshot_queries = {
+        'В целом по компании': GET_GENERAL_PROGRAM_QUERY,
+        'Подразделение': GET_ALL_SUBDIVISION_PROGRAM_QUERY,
+        'Регион': GET_ALL_REGION_PROGRAM_QUERY,
+        'Менеджер': GET_ALL_MANAGER_PROGRAM_QUERY,
+    }
+    # планы одного значения разреза, значение подставляется вместо &Подразделение, &Регион, &Менеджер
+    slice_queries = {
+        'В целом по компании': GET_GENERAL_PROGRAM_QUERY,
+        'Подразделение': GET_SUBDIVISION_PROGRAM_QUERY,
+        'Регион': GET_REGION_PROGRAM_QUERY,
+        'Менеджер': GET_MANAGER_PROGRAM_QUERY,
+    }
+
+    version_ttl = 100 * 24 * 3600  # секунд хранения версии снимков периода в Redis
+    refresh_backoff = 5  # секунд между фоновыми попытками загрузить снимок, удваивается с каждой попыткой
+    refresh_backoff_max = 300
 
-    @staticmethod
-    def plane(group, _df: pd.DataFrame) -> float:
+    def __init__(self, max_workers: int = 8, retries: int = 3, backoff: float = 0.5, snapshot_ttl: float = 60,
+                 client: Client1C = None, versions=None):
         """
-        Возврщает план числом
-        :param group: группа номенклатуры ЛК
-        :param _df: dataframe в котором есть колонки Группа и План
-        :return:
+        :param max_workers: количество параллельных запросов к 1С при массовой установке планов
+        :param retries: количество повторов запроса установки плана при ошибке
+        :param backoff: начальная задержка между повторами в секундах, удваивается с каждым повтором
+        :param snapshot_ttl: время жизни снимка планов периода в секундах
+        :param client: клиент 1С, по умолчанию создается по настройкам
+        :param versions: функция, возвращающая RedisWorker с общими для всех процессов версиями снимков;
+            None - снимки сбрасываются только в этом процессе
         """
-        try:
-            return _df.at[_df[_df['Группа'] == group].index[0], 'План']
-        except (IndexError, KeyError):
-            return 0
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.versions = versions
+        self.snapshots = LRUCache(maxsize=64, ttl=snapshot_ttl)
+        # последние успешно загруженные снимки, отдаются пока свежий снимок загружается в фоне или 1С недоступна
+        self._last_snapshots = {}
+        # версии снимков в Redis, с которыми загружены снимки этого процесса
+        self._snapshot_versions = {}
+        # контрольные суммы прогноза и RMSE установленных строк, если нет Redis с версиями снимков
+        self._forecasts = LRUCache(maxsize=4096)
+        self._stale = set()
+        self._refreshing = set()
+        self._refresh_lock = Lock()
+        self.client = self._create_client() if client is None else client
+
+    def _create_client(self) -> Client1C:
+        """
+        Клиент 1С по настройкам: пул соединений на max_workers параллельных запросов и свой автомат отключения
+        """
+        return Client1C(settings.server, settings.base, settings.user, settings.password, settings.api_key,
+                        settings.get_query_route, settings.set_program_route,
+                        connect_timeout=settings.connect_timeout_1c, read_timeout=settings.read_timeout_1c,
+                        max_connections=self.max_workers, compress=settings.compress_1c,
+                        breaker=CircuitBreaker(settings.breaker_failures, settings.breaker_recovery))
 
-    @staticmethod
-    def dev(group, _df: pd.DataFrame) -> float:
+    def after_fork(self) -> None:
         """
-        Возврщает отклонение числом
-        :param group: группа номенклатуры ЛК
-        :param _df: dataframe в котором есть колонки Группа и План
-        :return:
+        Вызывается в новом процессе после fork. Keep-alive соединения клиента 1С общие с родительским процессом,
+        и ответы могли бы попасть не в тот процесс, поэтому создается новый клиент со своим автоматом отключения.
+        Фоновые загрузки снимков родителя в новом процессе не выполняются, их блокировка пересоздается.
+        Загруженные снимки сохраняются.
         """
-        try:
-            return _df.at[_df[_df['Группа'] == group].index[0], 'Отклонение']
-        except (IndexError, KeyError):
-            return 0
+        self.client = self._create_client()
+        self._refresh_lock = Lock()
+        self._refreshing = set()
 
-    def set_program(self, layer: str, period: datetime, program: list) -> str | None:
+    def set_program(self, layer: str, period: datetime, program: list, only_changed: bool = True) -> str | None:
         """
         :param period: datetime период прогноза
         :param layer: имя разреза установки плана "В целом по компании", "Подразделение", "Регион", "Менеджер"
         :param program: список словарей с данными
+        :param only_changed: отправить только строки, отличающиеся от планов в 1С (program_delta),
+            если изменений нет - запрос не выполняется
         :return: None if return code 200, str - if some error got
         """
-        json_dict = {'layer': layer, 'period': period.strftime("%d.%m.%Y"), 'program': program}
-        _route = f'http://{SERVER}/{BASE}{SET_PROGRAM_ROUTE}'
-        response = self.session.post(_route, data=json.dumps(json_dict, indent=4, ensure_ascii=False).encode('utf-8'),
-                                     headers=self.headers)
+        plans = None
+        if only_changed and program:
+            plans = self._fresh_plans(period, layer, program)
+            changed = self._delta(layer, program, plans, self._posted_forecasts(period, layer, program))
+            if not changed:
+                self.logger.info(f'{layer} {period:%m.%Y}: планы не изменились')
+                return None
+            program = changed
+        try:
+            response = self._post_program(layer, period, program)
+        except requests.exceptions.RequestException as ex:
+            # 1С недоступна или автомат разомкнут: ошибка показывается пользователю, а не прерывает колбэк
+            self.logger.error(f'{layer} {period:%m.%Y}: {type(ex).__name__}: {ex}')
+            return f'{type(ex).__name__}: {ex}'
         if response.status_code == 200:
+            self._update_snapshot(period, layer, program, plans)
+            self._record_forecasts(period, layer, program)
             return None
         else:
             return response.text
 
+    def _post_program(self, layer: str, period: datetime, program: list) -> requests.Response:
+        json_dict = {'layer': layer, 'period': period.strftime("%d.%m.%Y"), 'program': program}
+        return self.client.set_program(json_dict)
+
+    def _set_program_with_retries(self, layer: str, period: datetime, program: list) -> str | None:
+        """
+        Устанавливает план, повторяя запрос при сетевых ошибках и ошибках сервера 1С (5xx)
+        :return: None if return code 200, str - if some error got
+        """
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            try:
+                response = self._post_program(layer, period, program)
+            except CircuitOpenError as ex:
+                # повторы в паузе автомата не дойдут до 1С, в сводке остается ошибка, полученная от 1С
+                error = error or f'{type(ex).__name__}: {ex}'
+                break
+            except requests.exceptions.RequestException as ex:
+                error = f'{type(ex).__name__}: {ex}'
+                continue
+            if response.status_code == 200:
+                return None
+            error = response.text
+            if response.status_code < 500:
+                break
+        return error
+
+    def set_programs(self, period: datetime, slices: list, progress=None, only_changed: bool = True) -> dict:
+        """
+        Параллельно устанавливает планы по нескольким срезам. Ошибка по одному срезу не прерывает отправку остальных.
+        :param period: datetime период прогноза
+        :param slices: список кортежей (разрез, значение разреза, список словарей с данными)
+        :param progress: функция progress(отправлено, всего), вызывается после обработки каждого среза
+        :param only_changed: отправить только измененные строки, срезы без изменений пропускаются
+        :return: {'sent': [(разрез, значение)], 'failed': {(разрез, значение): текст ошибки},
+            'skipped': [(разрез, значение)] - срезы без изменений}
+        """
+        summary = {'sent': [], 'failed': {}, 'skipped': []}
+        if only_changed:
+            changed_slices = []
+            snapshots = {}
+            for layer, option, program in slices:
+                if program and layer not in snapshots:
+                    snapshots[layer] = self._fresh_snapshot(period, layer)
+                changed = self._delta(layer, program, snapshots.get(layer),
+                                      self._posted_forecasts(period, layer, program))
+                if program and not changed:
+                    summary['skipped'].append((layer, option))
+                else:
+                    changed_slices.append((layer, option, changed))
+            slices = changed_slices
+        total = len(slices)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._set_program_with_retries, layer, period, program):
+                       (layer, option, program) for layer, option, program in slices}
+            for done, future in enumerate(as_completed(futures), start=1):
+                layer, option, program = futures[future]
+                try:
+                    error = future.result()
+                except Exception as ex:
+                    error = f'{type(ex).__name__}: {ex}'
+                if error is None:
+                    summary['sent'].append((layer, option))
+                    self._record_forecasts(period, layer, program)
+                else:
+                    self.logger.error(f'{(layer, option)}: {error}')
+                    summary['failed'][(layer, option)] = error
+                if progress is not None:
+                    progress(done, total)
+        for layer in {layer for layer, option in summary['sent']}:
+            self.invalidate_snapshot(period, layer)
+        return summary
+
+    def program_delta(self, layer: str, period: datetime, program: list) -> list:
+        """
+        Оставляет в списке планов только строки, которые отличаются от снимка планов 1С. Строки сравниваются
+        по контрольным суммам плана и отклонения для (разрез, значение разреза, группа), группа без плана в 1С
+        равна строке с нулевыми планом и отклонением. Планы загружаются из 1С заново (_fresh_plans),
+        если 1С недоступна, список не изменяется. Прогноз и RMSE в 1С не читаются: строка отправляется,
+        если они отличаются от последних установленных (_posted_forecasts) или неизвестны.
+        :param program: список словарей с данными, значение разреза - в ключе subdivision, region или manager
+        :return: список измененных строк
+        """
+        if not program:
+            return program
+        return self._delta(layer, program, self._fresh_plans(period, layer, program),
+                           self._posted_forecasts(period, layer, program))
+
+    def _fresh_plans(self, period: datetime, layer: str, program: list) -> dict | None:
+        """
+        Планы 1С для сравнения со строками program: строки одного значения разреза (обычно - таблица страницы)
+        сравниваются с планами этого значения (_load_slice), остальные - со снимком всего разреза (_fresh_snapshot)
+        :return: {значение разреза: dataframe с колонками Группа, План, Отклонение}, None - если 1С недоступна
+        """
+        value_key = keys(layer)
+        values = {row.get(value_key) for row in program} if value_key is not None else {None}
+        if len(values) == 1 and (value_key is None or None not in values):
+            value = values.pop()
+            _df = self._load_slice(period, layer, value)
+            return None if _df is None else {value: _df}
+        return self._fresh_snapshot(period, layer)
+
+    def _load_slice(self, period: datetime, layer: str, value: str | None) -> pd.DataFrame | None:
+        """
+        Загружает из 1С планы одного значения разреза, без кэша
+        :param value: значение разреза, для "В целом по компании" - None
+        :return: dataframe с колонками Группа, План, Отклонение; None - если 1С недоступна
+        """
+        query = self.slice_queries[layer].replace('&Период', f'ДАТАВРЕМЯ({period.year}, {period.month}, 1, 0, 0, 0)')
+        if value is not None:
+            # значение подставляется в строковый литерал 1С, кавычки в нем удваиваются
+            query = query.replace(f'&{layer}', str(value).replace('"', '""'))
+        return self._query(query)
+
+    def _fresh_snapshot(self, period: datetime, layer: str) -> dict | None:
+        """
+        Снимок планов для записи загружается из 1С синхронно, без кэша: кэшированный снимок мог устареть
+        (план изменен в 1С напрямую или другим процессом, пока Redis с версиями снимков недоступен),
+        и строка, совпавшая с ним, не была бы отправлена
+        :return: снимок program_snapshot, None - если 1С недоступна
+        """
+        return self._load_snapshot(period, layer, self._shared_version(period, layer))
+
+    @staticmethod
+    def _delta(layer: str, program: list, snapshot: dict | None, forecasts: dict) -> list:
+        """
+        :param snapshot: снимок планов разреза, None - без снимка отправляются все строки
+        :param forecasts: контрольные суммы прогноза и RMSE последней установки планов (_posted_forecasts)
+        """
+        if not program or snapshot is None:
+            return program
+
+        _df = pd.DataFrame(program)
+        value_key = keys(layer)
+        if value_key is not None and value_key in _df.columns:
+            values = _df[value_key]
+        else:
+            values = pd.Series(None, _df.index, dtype=object)
+        checksums = program_checksums(_df['program'], _df['deviation'])
+        zero = program_checksums(pd.Series([0.]), pd.Series([0.])).iloc[0]
+        posted = [forecasts.get(row.get(value_key) if value_key is not None else None, {}).get(row['group'])
+                  for row in program]
+        forecast_checksums = program_checksums(_df['forecast'], _df['rmse']).astype(str)
+        changed = pd.Series([checksum != known for checksum, known in zip(forecast_checksums, posted)], _df.index)
+        for value, rows in _df.groupby(values.fillna(''), sort=False):
+            df_program = snapshot.get(value if value != '' else None, pd.DataFrame())
+            if 'Группа' in df_program.columns:
+                df_program = df_program.drop_duplicates(subset='Группа')
+                known = program_checksums(df_program['План'], df_program['Отклонение'])
+                known = known.set_axis(df_program['Группа']).reindex(rows['group'], fill_value=zero).to_numpy()
+            else:
+                known = zero
+            changed[rows.index] |= checksums[rows.index].to_numpy() != known
+        return [row for row, is_changed in zip(program, changed) if is_changed]
+
+    def _posted_forecasts(self, period: datetime, layer: str, program: list) -> dict:
+        """
+        Контрольные суммы прогноза и RMSE, последними установленные по значениям разреза из program. В регистрах
+        планов 1С прогноза и RMSE нет, поэтому суммы хранятся в Redis с версиями снимков и общие для всех процессов,
+        без Redis - в памяти процесса
+        :return: {значение разреза: {группа: контрольная сумма}}, значений без сумм нет, если Redis недоступен
+        """
+        value_key = keys(layer)
+        values = {row.get(value_key) if value_key is not None else None for row in program}
+        if self.versions is None:
+            return {value: self._forecasts.get((period.year, period.month, layer, value), {}) for value in values}
+        forecasts = {}
+        try:
+            redis_version = self.versions()
+            for value in values:
+                posted = redis_version.hgetall(self._forecasts_key(period, layer, value))
+                forecasts[value] = {group.decode(): checksum.decode() for group, checksum in posted.items()}
+        except (RedisConnectionError, RedisTimeoutError) as ex:
+            self.logger.error(f'прогнозы {layer} {period:%m.%Y} не загружены: {ex}')
+        return forecasts
+
+    def _record_forecasts(self, period: datetime, layer: str, program: list) -> None:
+        """
+        Запоминает контрольные суммы прогноза и RMSE установленных строк для _posted_forecasts
+        """
+        if not program:
+            return
+        _df = pd.DataFrame(program)
+        value_key = keys(layer)
+        recorded = {}
+        for row, checksum in zip(program, program_checksums(_df['forecast'], _df['rmse']).astype(str)):
+            recorded.setdefault(row.get(value_key) if value_key is not None else None, {})[row['group']] = checksum
+        for value, checksums in recorded.items():
+            if self.versions is None:
+                forecasts_key = (period.year, period.month, layer, value)
+                self._forecasts.set(forecasts_key, {**self._forecasts.get(forecasts_key, {}), **checksums})
+                continue
+            try:
+                redis_version = self.versions()
+                forecasts_key = self._forecasts_key(period, layer, value)
+                redis_version.hset(forecasts_key, mapping=checksums)
+                redis_version.expire(forecasts_key, self.version_ttl)
+            except (RedisConnectionError, RedisTimeoutError) as ex:
+                self.logger.error(f'прогнозы {layer} {value} {period:%m.%Y} не записаны: {ex}')
+
     def get_program(self, period: datetime, subdivision=None, region=None, manager=None) -> pd.DataFrame:
+        """
+        Возвращает планы среза из снимка планов периода
+        :return: dataframe с колонками Группа, План, Отклонение,
+            attrs['stale'] - True, если 1С недоступна и планы взяты из последнего загруженного снимка
+        """
         if period is None:
             return pd.DataFrame()
 
-        _route = f'http://{SERVER}/{BASE}{GET_QUERY_ROUTE}'
-        _period = f'ДАТАВРЕМЯ({period.year}, {period.month}, 1, 0, 0, 0)'
-
         if subdivision is not None:
-            _query = GET_SUBDIVISION_PROGRAM_QUERY.replace('&Период', _period).replace('&Подразделение', subdivision)
+            layer, value = 'Подразделение', subdivision
         elif region is not None:
-            _query = GET_REGION_PROGRAM_QUERY.replace('&Период', _period).replace('&Регион', region)
+            layer, value = 'Регион', region
         elif manager is not None:
-            _query = GET_MANAGER_PROGRAM_QUERY.replace('&Период', _period).replace('&Менеджер', manager)
+            layer, value = 'Менеджер', manager
         else:
-            _query = GET_GENERAL_PROGRAM_QUERY.replace('&Период', _period)
-        json_dict = {'api_key': API_KEY, 'query': _query}
+            layer, value = 'В целом по компании', None
+
+        snapshot = self.program_snapshot(period, layer)
+        _df = pd.DataFrame() if snapshot is None else snapshot.get(value, pd.DataFrame()).copy()
+        _df.attrs['stale'] = self.is_stale(period, layer)
+        return _df
+
+    def program_snapshot(self, period: datetime, layer: str) -> dict | None:
+        """
+        Загружает все планы периода по разрезу одним запросом к 1С. Снимок хранится в памяти snapshot_ttl секунд
+        и сбрасывается после успешной установки планов этого разреза любым процессом (версия снимков в Redis).
+        Когда снимок устарел по времени, сразу возвращается последний загруженный, а новый загружается в фоне,
+        поэтому медленная или недоступная 1С не задерживает страницу.
+        :param layer: имя разреза "В целом по компании", "Подразделение", "Регион", "Менеджер"
+        :return: {значение разреза: dataframe с колонками Группа, План, Отклонение},
+            для "В целом по компании" ключ None; None - если 1С недоступна и снимка еще нет
+        """
+        snapshot_key = (period.year, period.month, layer)
+        version = self._shared_version(period, layer)
+        if version is not None and version != self._snapshot_versions.get(snapshot_key):
+            # планы разреза установлены другим процессом: снимки этого процесса устарели
+            self.snapshots.pop(snapshot_key)
+            self._last_snapshots.pop(snapshot_key, None)
+            return self._load_snapshot(period, layer, version)
+
+        snapshot = self.snapshots.get(snapshot_key)
+        if snapshot is not None:
+            return snapshot
+
+        snapshot = self._last_snapshots.get(snapshot_key)
+        if snapshot is not None:
+            self._refresh_in_background(period, layer)
+            return snapshot
+        return self._load_snapshot(period, layer, version)
+
+    def is_stale(self, period: datetime, layer: str) -> bool:
+        """
+        :return: True - последняя загрузка снимка планов разреза из 1С не удалась
+        """
+        return (period.year, period.month, layer) in self._stale
 
+    def _load_snapshot(self, period: datetime, layer: str, version: bytes = None) -> dict | None:
+        """
+        :param version: версия снимков в Redis, прочитанная до запроса к 1С
+        """
+        snapshot_key = (period.year, period.month, layer)
+        _period = f'ДАТАВРЕМЯ({period.year}, {period.month}, 1, 0, 0, 0)'
+        _df = self._query(self.snapshot_queries[layer].replace('&Период', _period))
+        if _df is None:
+            self._stale.add(snapshot_key)
+            return None
+
+        if 'Значение' in _df.columns:
+            snapshot = {value: group_df.drop(columns='Значение').reset_index(drop=True)
+                        for value, group_df in _df.groupby('Значение', sort=False)}
+        elif keys(layer) is None:
+            snapshot = {None: _df}
+        else:
+            snapshot = {}
+        self.snapshots.set(snapshot_key, snapshot)
+        self._last_snapshots[snapshot_key] = snapshot
+        self._snapshot_versions[snapshot_key] = version
+        self._stale.discard(snapshot_key)
+        return snapshot
+
+    def _refresh_in_background(self, period: datetime, layer: str, attempts: int = 10) -> None:
+        """
+        Загружает снимок в фоновом потоке, если он еще не загружается. Пока 1С недоступна, попытки
+        выполняются по мере того, как автомат отключения пропускает пробный запрос.
+        """
+        snapshot_key = (period.year, period.month, layer)
+        with self._refresh_lock:
+            if snapshot_key in self._refreshing:
+                return
+            self._refreshing.add(snapshot_key)
+
+        def refresh():
+            try:
+                for attempt in range(attempts):
+                    delay = self.client.breaker.retry_in()
+                    if attempt:
+                        # ошибка без размыкания автомата (например, ответ не JSON) не должна превращаться
+                        # в серию запросов подряд к общему серверу 1С
+                        delay = max(delay, min(self.refresh_backoff * 2 ** (attempt - 1), self.refresh_backoff_max))
+                    time.sleep(delay)
+                    if self._load_snapshot(period, layer, self._shared_version(period, layer)) is not None:
+                        return
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(snapshot_key)
+
+        Thread(target=refresh, name=f'refresh-{layer}-{period:%Y-%m}', daemon=True).start()
+
+    def invalidate_snapshot(self, period: datetime, layer: str) -> None:
+        """
+        Сбрасывает снимок вместе с последним загруженным: после установки планов старые значения не показываются.
+        Версия снимков в Redis увеличивается, и остальные процессы загружают снимок заново при следующем обращении.
+        """
+        snapshot_key = (period.year, period.month, layer)
+        self.snapshots.pop(snapshot_key)
+        self._last_snapshots.pop(snapshot_key, None)
+        self._increment_version(period, layer)
+
+    def _update_snapshot(self, period: datetime, layer: str, program: list, plans: dict | None) -> None:
+        """
+        Обновляет снимок разреза после установки планов без повторной загрузки всего разреза из 1С: для значений
+        разреза из program берутся планы plans, загруженные перед отправкой, с отправленными строками.
+        Версия снимков в Redis увеличивается, как в invalidate_snapshot. Снимок сбрасывается, если планов нет,
+        снимок устарел по времени или после его загрузки планы разреза устанавливал другой процесс.
+        :param plans: планы _fresh_plans, None - снимок сбрасывается
+        """
+        snapshot_key = (period.year, period.month, layer)
+        snapshot = self.snapshots.get(snapshot_key)
+        loaded_version = self._snapshot_versions.get(snapshot_key)
+        version = self._increment_version(period, layer)
+        if plans is None or snapshot is None or (
+                self.versions is not None and (version is None or version != int(loaded_version or 0) + 1)):
+            self.snapshots.pop(snapshot_key)
+            self._last_snapshots.pop(snapshot_key, None)
+            return
+
+        snapshot = {**snapshot, **plans}
+        value_key = keys(layer)
+        sent = {}
+        for row in program:
+            value = row.get(value_key) if value_key is not None else None
+            sent.setdefault(value, {})[row['group']] = {'Группа': row['group'], 'План': row['program'],
+                                                        'Отклонение': row['deviation']}
+        for value, records in sent.items():
+            df_program = snapshot.get(value, pd.DataFrame())
+            if 'Группа' in df_program.columns:
+                # строки отправленных групп заменяются на месте, новые группы добавляются в конец
+                records = {**{record['Группа']: record for record in df_program.to_dict('records')}, **records}
+            snapshot[value] = pd.DataFrame(list(records.values()))
+        if not self.snapshots.replace(snapshot_key, snapshot):
+            self.snapshots.pop(snapshot_key)
+            self._last_snapshots.pop(snapshot_key, None)
+            return
+        self._last_snapshots[snapshot_key] = snapshot
+        self._snapshot_versions[snapshot_key] = None if version is None else str(version).encode()
+
+    def _increment_version(self, period: datetime, layer: str) -> int | None:
+        """
+        :return: новая версия снимков разреза в Redis, None - версий нет или Redis недоступен
+        """
+        if self.versions is None:
+            return None
+        try:
+            redis_version = self.versions()
+            version_key = self._version_key(period, layer)
+            version = redis_version.incr(version_key)
+            redis_version.expire(version_key, self.version_ttl)
+            return version
+        except (RedisConnectionError, RedisTimeoutError) as ex:
+            self.logger.error(f'версия снимка {layer} {period:%m.%Y} не обновлена: {ex}')
+            return None
+
+    def _shared_version(self, period: datetime, layer: str) -> bytes | None:
+        """
+        :return: версия снимков разреза в Redis, None - версии нет или Redis недоступен
+        """
+        if self.versions is None:
+            return None
+        return self.versions().get(self._version_key(period, layer))
+
+    @staticmethod
+    def _version_key(period: datetime, layer: str) -> str:
+        return f'program_version,{period:%Y-%m},{layer}'
+
+    @staticmethod
+    def _forecasts_key(period: datetime, layer: str, value: str | None) -> str:
+        return f'program_forecasts,{period:%Y-%m},{layer},{value}'
+
+    def sales(self, start: datetime, end: datetime) -> pd.DataFrame | None:
+        """
+        Фактические продажи за интервал (start, end] по группам, менеджерам, подразделениям и регионам
+        :return: dataframe с колонками Группа, Менеджер, Подразделение, Регион, Факт,
+            ПоследняяПродажа - время последнего движения строки; None - если 1С недоступна
+        """
+        query = GET_SALES_QUERY.replace('&НачалоПериода', datetime_1c(start)).replace('&КонецПериода', datetime_1c(end))
+        _df = self._query(query)
+        if _df is None:
+            return None
+        columns = ['Группа', 'Менеджер', 'Подразделение', 'Регион', 'Факт', 'ПоследняяПродажа']
+        if _df.empty:
+            return pd.DataFrame(columns=columns)
+        _df['Факт'] = pd.to_numeric(_df['Факт'], errors='coerce').fillna(0.)
+        _df['ПоследняяПродажа'] = pd.to_datetime(_df['ПоследняяПродажа'], format='%d.%m.%Y %H:%M:%S')
+        return _df[columns]
+
+    def _query(self, query: str) -> pd.DataFrame | None:
+        """
+        Выполняет запрос к 1С через сервис free_query
+        :return: dataframe с результатом запроса, None - если получена ошибка
+        """
         response_text = ""
         try:
-            response_text = self.session.post(_route, json=json_dict, headers=self.headers).text
+            response_text = self.client.query(query).text
             response_dict: dict = json.loads(response_text)
             return pd.json_normalize(response_dict['data'])
-        except requests.exceptions.ConnectTimeout as ex:
-            self.logger.error(f'{requests.exceptions.ConnectTimeout}: {ex}')
+        except requests.exceptions.Timeout as ex:
+            self.logger.error(f'{requests.exceptions.Timeout}: {ex}')
         except requests.exceptions.ConnectionError as ex:
             self.logger.error(f'{requests.exceptions.ConnectionError}: {ex}')
         except json.decoder.JSONDecodeError as ex:
@@ -205,27 +913,67 @@ class ProgramWorker:
         except KeyError as ex:
             self.logger.error(f'{KeyError}: {ex}')
 
-        return pd.DataFrame()
-
-
-def create_parser():
-    _parser = argparse.ArgumentParser()
-    _parser.add_argument('-rh', '--redis_host', default='192.168.19.18')
-    _parser.add_argument('-rdb', '--redis_db', default='2')
-    return _parser
+        return None
+
+
+def create_redis_worker(db: int) -> RedisWorker:
+    """
+    Создает RedisWorker с собственным ограниченным пулом соединений к базе db
+    """
+    pool = InstrumentedConnectionPool(
+        host=settings.redis_host,
+        db=db,
+        max_connections=settings.redis_max_connections,
+        timeout=settings.redis_pool_timeout,
+        socket_connect_timeout=settings.redis_connect_timeout,
+        socket_timeout=settings.redis_socket_timeout,
+        health_check_interval=settings.redis_health_check_interval,
+    )
+    return RedisWorker(connection_pool=pool, cache_ttl=settings.cache_ttl, graph_cache_bytes=settings.graph_cache_bytes)
+
+
+class RedisWorkers:
+    """
+    Список RedisWorker по базам версий прогноза. Worker создается при первом обращении к своей базе.
+    """
+
+    def __init__(self, count: int):
+        self._workers = [None] * count
+        self._lock = Lock()
+
+    def __getitem__(self, db: int) -> RedisWorker:
+        worker = self._workers[db]
+        if worker is None:
+            with self._lock:
+                worker = self._workers[db]
+                if worker is None:
+                    worker = self._workers[db] = create_redis_worker(db)
+        return worker
+
+    def __len__(self) -> int:
+        return len(self._workers)
+
+    def __iter__(self):
+        return (self[db] for db in range(len(self)))
+
+    def created(self) -> list:
+        """
+        :return: [(база, RedisWorker)] только для уже созданных worker'ов
+        """
+        return [(db, worker) for db, worker in enumerate(self._workers) if worker is not None]
 
 
-parser = create_parser()
-params = parser.parse_args(sys.argv[1:])
+def create_program_worker(versions=None) -> ProgramWorker:
+    """
+    Создает ProgramWorker с собственным клиентом 1С по настройкам
+    :param versions: функция, возвращающая RedisWorker с версиями снимков, по умолчанию - redis_worker[0]
+    """
+    return ProgramWorker(settings.max_workers, settings.retries, settings.backoff, settings.snapshot_ttl,
+                         versions=versions or (lambda: redis_worker[0]))
 
-redis_worker = [
-    RedisWorker(host=params.redis_host, db=0),
-    RedisWorker(host=params.redis_host, db=1),
-    RedisWorker(host=params.redis_host, db=2),
-]
 
-# redis_worker = RedisWorker(host=params.redis_host, db=params.redis_db)
-program_worker = ProgramWorker()
+redis_worker = RedisWorkers(3)
+program_worker = create_program_worker()
 
 if __name__ == '__main__':
     pw = ProgramWorker()
@@ -1,7 +1,8 @@
 #!/bin/bash
 
-python wsgi.py
-#gunicorn --workers 5 \
-#--bind 127.0.0.1:8002 \
-#--threads 4 \
-#wsgi:server
\ No newline at end of file
+# LK_APP_MODE=dev - однопроцессный сервер разработки Flask
+if [ "$LK_APP_MODE" = "dev" ]; then
+  python wsgi.py
+else
+  exec gunicorn -c gunicorn.conf.py wsgi:server
+fi
@@ -0,0 +1,149 @@
+"""
+Облегчение JSON графиков plotly перед отправкой в браузер: округление чисел, удаление шаблона оформления
+и прореживание плотных линий алгоритмом LTTB (Largest-Triangle-Three-Buckets), который сохраняет форму линии.
+"""
+from dataclasses import dataclass
+import json
+import numpy as np
+
+# поля трассы, в которых хранится по значению на точку
+POINT_FIELDS = ['x', 'y', 'text', 'hovertext', 'customdata']
+MIN_POINTS = 100  # меньше стольких точек линия не прореживается
+
+
+@dataclass(frozen=True)
+class SlimOptions:
+    """
+    :param digits: значащих цифр в числах, 0 - без округления
+    :param strip_template: удалить layout.template, оформление берется из plotly.js по умолчанию
+    :param max_points: прореживать линии длиннее max_points точек, 0 - без прореживания
+    :param max_bytes: допустимый размер JSON графика, при превышении линии прореживаются до его достижения,
+        0 - без ограничения
+    """
+    digits: int = 6
+    strip_template: bool = True
+    max_points: int = 0
+    max_bytes: int = 0
+
+
+def slim_figure(figure: dict, options: SlimOptions = SlimOptions()) -> tuple:
+    """
+    Облегчает словарь JSON графика, исходный словарь не изменяется
+    :return: (облегченный словарь, размер JSON в байтах)
+    """
+    figure = {**figure, 'data': [dict(trace) for trace in figure.get('data', [])]}
+    if options.strip_template and isinstance(figure.get('layout'), dict) and 'template' in figure['layout']:
+        figure['layout'] = {key: value for key, value in figure['layout'].items() if key != 'template'}
+    if options.digits:
+        for trace in figure['data']:
+            for field in POINT_FIELDS:
+                if isinstance(trace.get(field), list):
+                    trace[field] = round_significant(trace[field], options.digits)
+
+    sources = figure['data']
+    if options.max_points:
+        figure['data'] = downsample_lines(sources, options.max_points)
+    size = json_bytes(figure)
+    if options.max_bytes:
+        max_points = options.max_points or max((_line_length(trace) for trace in sources), default=0)
+        while size > options.max_bytes and max_points > MIN_POINTS:
+            max_points = max(max_points // 2, MIN_POINTS)
+            figure['data'] = downsample_lines(sources, max_points)
+            size = json_bytes(figure)
+    return figure, size
+
+
+def json_bytes(value) -> int:
+    """
+    :return: размер JSON значения в байтах, как его сериализует Dash (json.dumps с ensure_ascii)
+    """
+    return len(json.dumps(value).encode('utf-8'))
+
+
+def round_significant(values: list, digits: int) -> list:
+    """
+    Округляет список чисел до digits значащих цифр. Списки с пропусками, строками и датами не изменяются.
+    """
+    x = np.asarray(values)
+    if x.ndim != 1 or x.dtype.kind != 'f':
+        return values
+    result = x.copy()
+    nonzero = np.isfinite(x) & (x != 0)
+    decimals = np.zeros(len(x), dtype=int)
+    decimals[nonzero] = digits - 1 - np.floor(np.log10(np.abs(x[nonzero]))).astype(int)
+    # деление и умножение на точную степень десяти дают ближайшее к округленному десятичному числу значение,
+    # поэтому в JSON оно записывается коротко
+    scale = 10.0 ** np.abs(decimals)
+    positive = decimals >= 0
+    result[positive] = np.round(x[positive] * scale[positive]) / scale[positive]
+    result[~positive] = np.round(x[~positive] / scale[~positive]) * scale[~positive]
+    return result.tolist()
+
+
+def lttb(y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Индексы n_out точек ряда y, выбранных алгоритмом LTTB по равномерной оси x (номер точки).
+    Первая и последняя точки сохраняются, из каждой корзины берется точка, образующая наибольший треугольник
+    с выбранной точкой предыдущей корзины и средней точкой следующей.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    every = (n - 2) / (n_out - 2)
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    for i in range(n_out - 2):
+        start, end = int(i * every) + 1, int((i + 1) * every) + 1
+        next_start, next_end = end, min(int((i + 2) * every) + 1, n)
+        next_x = (next_start + next_end - 1) / 2
+        next_y = y[next_start:next_end].mean()
+        x = np.arange(start, end)
+        areas = np.abs((selected - next_x) * (y[start:end] - y[selected]) - (selected - x) * (next_y - y[selected]))
+        selected = start + int(np.argmax(areas))
+        indices[i + 1] = selected
+    return indices
+
+
+def downsample_lines(traces: list, max_points: int) -> list:
+    """
+    Прореживает линии длиннее max_points точек. Точки выбираются общими для трасс с одинаковой осью x, чтобы
+    границы прогноза с заливкой tonexty оставались согласованными. Трассы с маркерами не прореживаются:
+    каждая точка на них видна.
+    """
+    groups = {}
+    for i, trace in enumerate(traces):
+        if _line_length(trace) > max_points:
+            groups.setdefault(json.dumps(trace['x']), []).append(i)
+
+    traces = list(traces)
+    for members in groups.values():
+        keep = set()
+        for i in members:
+            y = np.asarray(traces[i]['y'], dtype=float)
+            keep.update(lttb(np.nan_to_num(y), max_points).tolist())
+        keep = sorted(keep)
+        for i in members:
+            trace = dict(traces[i])
+            length = len(trace['x'])
+            for field in POINT_FIELDS:
+                if isinstance(trace.get(field), list) and len(trace[field]) == length:
+                    trace[field] = [trace[field][j] for j in keep]
+            traces[i] = trace
+    return traces
+
+
+def _line_length(trace: dict) -> int:
+    """
+    :return: количество точек линии, которую можно проредить; 0 - трасса не линия
+    """
+    if trace.get('type', 'scatter') not in ('scatter', 'scattergl') or 'markers' in trace.get('mode', 'lines'):
+        return 0
+    x, y = trace.get('x'), trace.get('y')
+    if not isinstance(x, list) or not isinstance(y, list) or len(x) != len(y):
+        return 0
+    try:
+        np.asarray(y, dtype=float)
+    except (TypeError, ValueError):
+        return 0
+    return len(y)
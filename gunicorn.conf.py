@@ -0,0 +1,46 @@
+"""
+Конфигурация gunicorn для production: python wsgi.py запускает однопоточный сервер разработки.
+Приложение загружается в master-процессе (preload_app), там же прогреваются кэши до запуска worker'ов,
+поэтому worker'ы получают прогретые кэши через fork (copy-on-write).
+Запуск: gunicorn -c gunicorn.conf.py wsgi:server
+"""
+from settings import settings
+import os
+import shutil
+
+# метрики worker'ов пишутся в общий каталог, переменная должна быть задана до импорта prometheus_client
+os.environ['PROMETHEUS_MULTIPROC_DIR'] = settings.metrics_dir
+shutil.rmtree(settings.metrics_dir, ignore_errors=True)
+os.makedirs(settings.metrics_dir)
+
+bind = settings.bind
+workers = settings.workers
+threads = settings.threads
+timeout = settings.worker_timeout
+graceful_timeout = settings.graceful_timeout
+max_requests = settings.max_requests
+max_requests_jitter = settings.max_requests_jitter
+preload_app = True
+
+
+def when_ready(server):
+    # вызывается в master-процессе после загрузки приложения и до создания worker'ов
+    import warmup
+    from data_methods import program_worker
+    warmup.warm_caches(None if settings.warmup_on_start else [])
+    # соединения с 1С, открытые при прогреве снимков планов, не должны достаться worker'ам
+    program_worker.client.close()
+
+
+def post_fork(server, worker):
+    # каждый worker работает с 1С через свои соединения
+    from data_methods import program_worker
+    program_worker.after_fork()
+    # потоки не переживают fork: каждый worker сам следит за публикацией нового прогноза и прогревает свои кэши
+    import warmup
+    warmup.start_watcher()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,146 @@
+"""
+Метрики производительности в формате Prometheus: время колбэков Dash и запросов _dash-update-component,
+методов RedisWorker, разбора значений из Redis и HTTP запросов к 1С, размеры передаваемых данных.
+Под gunicorn метрики всех процессов собираются через каталог PROMETHEUS_MULTIPROC_DIR (gunicorn.conf.py).
+Журнал трассировки (LK_METRICS_TRACE=1) пишет по каждому запросу Dash время замеренных участков.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from prometheus_client import Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, \
+    multiprocess
+from prometheus_client.core import GaugeMetricFamily
+import flask
+import logging
+import os
+import time
+
+SECONDS_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+CALLBACK_SECONDS = Histogram('lk_callback_seconds', 'Время выполнения колбэка Dash', ['callback'],
+                             buckets=SECONDS_BUCKETS)
+DASH_REQUEST_SECONDS = Histogram('lk_dash_request_seconds',
+                                 'Время запроса _dash-update-component вместе с сериализацией ответа', ['output'],
+                                 buckets=SECONDS_BUCKETS)
+DASH_RESPONSE_BYTES = Histogram('lk_dash_response_bytes', 'Размер ответа _dash-update-component', ['output'],
+                                buckets=BYTES_BUCKETS)
+REDIS_SECONDS = Histogram('lk_redis_seconds', 'Время метода RedisWorker', ['method'], buckets=SECONDS_BUCKETS)
+REDIS_BYTES = Histogram('lk_redis_bytes', 'Размер значений, прочитанных из Redis одной командой', ['command'],
+                        buckets=BYTES_BUCKETS)
+PARSE_SECONDS = Histogram('lk_parse_seconds', 'Время разбора значений из Redis', ['kind'], buckets=SECONDS_BUCKETS)
+FIGURE_BYTES = Histogram('lk_figure_bytes', 'Размер JSON графика до (original) и после (slim) облегчения',
+                         ['graph', 'stage'], buckets=BYTES_BUCKETS)
+REQUEST_1C_SECONDS = Histogram('lk_1c_seconds', 'Время HTTP запроса к 1С', ['route'], buckets=SECONDS_BUCKETS)
+REQUEST_1C_BYTES = Histogram('lk_1c_bytes', 'Размер тела запроса и ответа 1С', ['route', 'direction'],
+                             buckets=BYTES_BUCKETS)
+
+trace_logger = logging.getLogger('trace')
+_trace = ContextVar('trace', default=None)  # список (участок, секунды) текущего запроса, если трассировка включена
+
+
+@contextmanager
+def timer(histogram: Histogram, label: str):
+    """
+    Замеряет время блока в histogram с меткой label и добавляет участок в трассировку запроса
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        histogram.labels(label).observe(seconds)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((label, seconds))
+
+
+def timed(histogram: Histogram, label: str):
+    """
+    Декоратор: замеряет время вызова функции, см. timer
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(histogram, label):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class RuntimeCollector:
+    """
+    Состояние кэшей и пулов соединений RedisWorker процесса, ответившего на запрос метрик
+    """
+
+    def describe(self):
+        # имена не описываются заранее, чтобы регистрация не импортировала data_methods
+        return []
+
+    def collect(self):
+        from data_methods import redis_worker
+        import warmup
+        pid = str(os.getpid())
+        labels = ['pid', 'db', 'cache']
+        cache_entries = GaugeMetricFamily('lk_cache_entries', 'Записей в кэше RedisWorker', labels=labels)
+        cache_hits = GaugeMetricFamily('lk_cache_hits', 'Попаданий в кэш RedisWorker', labels=labels)
+        cache_misses = GaugeMetricFamily('lk_cache_misses', 'Промахов кэша RedisWorker', labels=labels)
+        pool = GaugeMetricFamily('lk_redis_pool', 'Пул соединений Redis', labels=['pid', 'db', 'stat'])
+        warmup_progress = GaugeMetricFamily('lk_warmup', 'Прогрев кэшей: загружено, всего, 1 - база прогрета',
+                                            labels=['pid', 'db', 'stat'])
+        for db, progress in warmup.progress()['dbs'].items():
+            for stat in ['done', 'total', 'hot']:
+                warmup_progress.add_metric([pid, str(db), stat], float(progress[stat]))
+        for db, worker in redis_worker.created():
+            for cache, info in worker.cache_info().items():
+                cache_entries.add_metric([pid, str(db), cache], info['size'])
+                cache_hits.add_metric([pid, str(db), cache], info['hits'])
+                cache_misses.add_metric([pid, str(db), cache], info['misses'])
+            for stat, value in worker.pool_info().items():
+                pool.add_metric([pid, str(db), stat], value)
+        yield from [cache_entries, cache_hits, cache_misses, pool, warmup_progress]
+
+
+if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    REGISTRY.register(RuntimeCollector())
+
+
+def render() -> bytes:
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(RuntimeCollector())
+    else:
+        registry = REGISTRY
+    return generate_latest(registry)
+
+
+def init_app(server: flask.Flask, route: str, trace: bool = False) -> None:
+    """
+    Подключает к Flask серверу маршрут метрик route и замер запросов _dash-update-component
+    :param trace: писать в журнал trace время замеренных участков каждого запроса Dash
+    """
+    @server.before_request
+    def start_request():
+        flask.g.metrics_start = time.perf_counter()
+        if trace:
+            flask.g.metrics_trace = _trace.set([])
+
+    @server.after_request
+    def finish_request(response: flask.Response) -> flask.Response:
+        if flask.request.path.endswith('_dash-update-component') and 'metrics_start' in flask.g:
+            seconds = time.perf_counter() - flask.g.metrics_start
+            output = (flask.request.get_json(silent=True) or {}).get('output', '')
+            size = response.calculate_content_length() or 0
+            DASH_REQUEST_SECONDS.labels(output).observe(seconds)
+            DASH_RESPONSE_BYTES.labels(output).observe(size)
+            if trace:
+                spans = ', '.join(f'{label} {span * 1000:.1f}' for label, span in _trace.get() or [])
+                trace_logger.info(f'{output}: {seconds * 1000:.1f} мс, {size} байт; {spans}')
+        if 'metrics_trace' in flask.g:
+            _trace.reset(flask.g.pop('metrics_trace'))
+        return response
+
+    @server.route(route)
+    def metrics():
+        return flask.Response(render(), mimetype=CONTENT_TYPE_LATEST)
@@ -3,179 +3,145 @@ from dash import html, dcc, callback, Input, Output, State, ctx
 import dash_bootstrap_components as dbc
 from dash.exceptions import PreventUpdate
 import pandas as pd
-from data_methods import date_options, redis_worker, program_worker, keys
+from data_methods import date_options, redis_worker, program_worker, keys, LAYERS, RedisWorker, ProgramWorker, \
+    create_redis_worker, create_program_worker
+from metrics import timed, CALLBACK_SECONDS
+from tables import forecast_programs, ROLLUP_INDEX
 from datetime import datetime
 
 dash.register_page(__name__, title='Администрирование')
 
 
-def send_all_programs_to_1c(period: datetime) -> str | None:
+def send_all_programs_to_1c(period: datetime, db: int = 0, progress=None, worker: RedisWorker = None,
+                            programs: ProgramWorker = None) -> dict:
+    """
+    Перезаписывает планы всех срезов прогнозами
+    :param progress: функция progress(отправлено, всего) для отображения хода отправки
+    :param worker: RedisWorker базы db, по умолчанию - общий redis_worker[db]
+    :param programs: ProgramWorker для отправки планов, по умолчанию - общий program_worker
+    :return: сводка отправки {'sent': [(разрез, значение)], 'failed': {(разрез, значение): текст ошибки}}
+    """
+    worker = redis_worker[db] if worker is None else worker
+    programs = program_worker if programs is None else programs
     if period is None:
-        period = redis_worker.first_forecast_period()
+        period = worker.first_forecast_period()
 
-    def round_forecast(x):
-        if x < 0:
-            return 0
-        elif 5 > x > 0:
-            return round(x, 3)
-        elif 10 > x >= 5:
-            return round(x, 2)
-        elif 100 > x >= 10:
-            return round(x, 1)
-        elif x >= 100:
-            return round(x, 0)
-        else:
-            return x
+    # таблицы всех срезов уже свернуты и округлены, срезы выбираются за один просмотр свертки
+    rollup = worker.forecast_rollup(period)
+    slices = []
+    for (layer, value), gfd in rollup.groupby(level=ROLLUP_INDEX, sort=False):
+        option = value if keys(layer) is not None else None
+        layer_kwargs = {keys(layer): option} if option is not None else {}
+        slices.append((layer, option, forecast_programs(gfd, **layer_kwargs)))
+    # срезы отправляются по разрезам: в целом по компании, подразделения, регионы, менеджеры
+    slices.sort(key=lambda _slice: LAYERS.index(_slice[0]))
+    return programs.set_programs(period, slices, progress)
 
-    layers = ['В целом по компании', 'Подразделение', 'Регион', 'Менеджер']
-    for layer in layers:
-        if layer == 'В целом по компании':
-            programs = []
-            gfd = redis_worker.main_table(period, None, None, None)
-            gfd = gfd.groupby(by=['Группа', 'Прогноз', 'RMSE'], as_index=False).max()
-            gfd['Прогноз'] = gfd['Прогноз'].apply(round_forecast)
-            gfd['RMSE'] = gfd['RMSE'].apply(round_forecast)
-            for i in range(len(gfd)):
-                program = {
-                    'group': gfd.at[i, 'Группа'],
-                    'forecast': gfd.at[i, 'Прогноз'],
-                    'rmse': gfd.at[i, 'RMSE'],
-                    'program': gfd.at[i, 'Прогноз'],
-                    'deviation': gfd.at[i, 'RMSE']
-                }
-                programs.append(program)
-            result = program_worker.set_program(layer, period, programs)
-            if result is not None:
-                return result
-        else:
-            options = redis_worker.options(layer)
-            for option in options:
-                kwargs = {
-                    'subdivision': None,
-                    'region': None,
-                    'manager': None
-                }
-                kwargs[keys(layer)] = option
-                programs = []
-                gfd = redis_worker.main_table(period, **kwargs)
-                gfd = gfd.groupby(by=['Группа', 'Прогноз', 'RMSE'], as_index=False).max()
-                gfd['Прогноз'] = gfd['Прогноз'].apply(round_forecast)
-                gfd['RMSE'] = gfd['RMSE'].apply(round_forecast)
-                for i in range(len(gfd)):
-                    program = {
-                        'group': gfd.at[i, 'Группа'],
-                        'forecast': gfd.at[i, 'Прогноз'],
-                        'rmse': gfd.at[i, 'RMSE'],
-                        'program': gfd.at[i, 'Прогноз'],
-                        'deviation': gfd.at[i, 'RMSE']
-                    }
-                    program[keys(layer)] = option
-                    programs.append(program)
-                result = program_worker.set_program(layer, period, programs)
-                if result is not None:
-                    return result
-        # elif layer == 'Регион':
-        #     options = redis_worker.options(layer)
-        #     for option in options:
-        #         programs = []
-        #         gfd = redis_worker.main_table(period, None, option, None)
-        #         gfd = gfd.groupby(by=['Группа', 'Прогноз', 'RMSE'], as_index=False).max()
-        #         gfd['Прогноз'] = gfd['Прогноз'].apply(round_forecast)
-        #         gfd['RMSE'] = gfd['RMSE'].apply(round_forecast)
-        #         for i in range(len(gfd)):
-        #             program = {
-        #                 'group': gfd.at[i, 'Группа'],
-        #                 'forecast': gfd.at[i, 'Прогноз'],
-        #                 'rmse': gfd.at[i, 'RMSE'],
-        #                 'program': gfd.at[i, 'Прогноз'],
-        #                 'deviation': gfd.at[i, 'RMSE']
-        #             }
-        #             program['region'] = option
-        #             programs.append(program)
-        #         result = program_worker.set_program(layer, period, programs)
-        #         if result is not None:
-        #             return result
-        # elif layer == 'Менеджер':
-        #     options = redis_worker.options(layer)
-        #     for option in options:
-        #         programs = []
-        #         gfd = redis_worker.main_table(period, None, None, option)
-        #         gfd = gfd.groupby(by=['Группа', 'Прогноз', 'RMSE'], as_index=False).max()
-        #         gfd['Прогноз'] = gfd['Прогноз'].apply(round_forecast)
-        #         gfd['RMSE'] = gfd['RMSE'].apply(round_forecast)
-        #         for i in range(len(gfd)):
-        #             program = {
-        #                 'group': gfd.at[i, 'Группа'],
-        #                 'forecast': gfd.at[i, 'Прогноз'],
-        #                 'rmse': gfd.at[i, 'RMSE'],
-        #                 'program': gfd.at[i, 'Прогноз'],
-        #                 'deviation': gfd.at[i, 'RMSE']
-        #             }
-        #             program['manager'] = option
-        #             programs.append(program)
-        #         result = program_worker.set_program(layer, period, programs)
-        #         if result is not None:
-        #             return result
-    return None
 
+def summary_message(summary: dict) -> list:
+    skipped = f', без изменений: {len(summary["skipped"])}' if summary.get('skipped') else ''
+    if not summary['failed']:
+        return [f'Планы успешно установлены ({len(summary["sent"])} срезов{skipped})']
+    message = [html.Div(f'Установлено срезов: {len(summary["sent"])}{skipped}, с ошибками: {len(summary["failed"])}')]
+    for (layer, option), error in summary['failed'].items():
+        message.append(html.Div(f'{layer} {option or ""}: {error}'))
+    return message
 
-layout = dbc.Container([
-    dbc.Row([
-        dbc.Col(
-            html.Div([
-                "План на",
-                dcc.Dropdown(id="plan_date",
-                             options=date_options(), value=date_options()[0]['value'],
-                             clearable=False, persistence=True, persistence_type='session'),
-            ]),
-            width={'size': 2, 'offset': 0}
-        ),
 
-        dbc.Col(
-            dcc.ConfirmDialogProvider(
-                children=html.Button('Перезаписать все планы прогнозами', id='send-btn-admin', n_clicks=0,
-                                     className='btn btn-outline-primary mx-2'),
-                id='send_plans_admin',
-                message='Перенести все прогнозы в план? Это перезатрет уже установленные прогнозы на выбранный период!'
-            ), align='end'
-        ),
-    ]),
+def layout(**kwargs):
+    """
+    Макет строится при каждом открытии страницы, чтобы список периодов был актуальным
+    """
+    _date_options = date_options()
+    return dbc.Container([
+        dbc.Row([
+            dbc.Col(
+                html.Div([
+                    "План на",
+                    dcc.Dropdown(id="plan_date",
+                                 options=_date_options, value=_date_options[0]['value'],
+                                 clearable=False, persistence=True, persistence_type='session'),
+                ]),
+                width={'size': 2, 'offset': 0}
+            ),
+
+            dbc.Col(
+                dcc.ConfirmDialogProvider(
+                    children=html.Button('Перезаписать все планы прогнозами', id='send-btn-admin', n_clicks=0,
+                                         className='btn btn-outline-primary mx-2'),
+                    id='send_plans_admin',
+                    message='Перенести все прогнозы в план? Это перезатрет уже установленные прогнозы на выбранный период!'
+                ), align='end'
+            ),
+        ]),
 
-    dbc.Spinner(
         dbc.Modal(
             [
                 dbc.ModalHeader("Установка плана в 1С"),
-                dbc.ModalBody(
-                    id='send_modal_body_admin'
-                ),
-                dbc.ModalFooter(
-                    dbc.Button("Закрыть", id="close_send_modal_admin", className="ml-auto")
-                ),
-            ], id="send_modal_admin",
+                dbc.ModalBody([
+                    dbc.Progress(id='send_progress_admin', value=0, max=1, striped=True, animated=True,
+                                 style={'display': 'none'}),
+                    html.Div(id='send_modal_body_admin'),
+                ]),
+                dbc.ModalFooter([
+                    dbc.Button("Отменить", id="cancel_send_admin", className="ml-auto", color='danger', disabled=True),
+                    dbc.Button("Закрыть", id="close_send_modal_admin", className="ml-auto"),
+                ]),
+            ], id="send_modal_admin", backdrop='static',
         ),
-    )
-])
+    ])
 
 
 @callback(
     Output("send_modal_admin", "is_open"),
-    Output("send_modal_body_admin", 'children'),
     Input("send_plans_admin", "submit_n_clicks"),
     Input("close_send_modal_admin", "n_clicks"),
+    prevent_initial_call=True,
+)
+def toggle_send_modal(send_plans_clicks, close_modal_btn):
+    return ctx.triggered_id == 'send_plans_admin' and bool(send_plans_clicks)
+
+
+@callback(
+    Output("send_modal_body_admin", 'children'),
+    Input("send_plans_admin", "submit_n_clicks"),
     State('plan_date', 'value'),
+    State('db', 'value'),
+    background=True,
+    running=[
+        (Output('send_progress_admin', 'style'), {'display': 'flex'}, {'display': 'none'}),
+        (Output('cancel_send_admin', 'disabled'), False, True),
+        (Output('close_send_modal_admin', 'disabled'), True, False),
+    ],
+    cancel=[Input('cancel_send_admin', 'n_clicks')],
+    progress=[
+        Output('send_progress_admin', 'value'),
+        Output('send_progress_admin', 'max'),
+        Output('send_progress_admin', 'label'),
+    ],
+    prevent_initial_call=True,
 )
-def send_plans(send_plans_clicks, close_modal_btn, plans_date):
-    if plans_date is None:
+@timed(CALLBACK_SECONDS, 'send_plans')
+def send_plans(set_progress, send_plans_clicks, plans_date, db):
+    """
+    Массовая установка планов выполняется фоновой задачей, ход отправки (срезов отправлено / всего)
+    отображается в модальном окне. Отмена останавливает задачу, уже отправленные срезы остаются установленными.
+    Задача выполняется в процессе, порожденном fork из многопоточного worker'а: соединения общих redis_worker
+    и program_worker и блокировки их кэшей могли быть заняты другими потоками, поэтому задача создает свои.
+    Снимки планов worker'ов сбрасываются через версию снимков в Redis.
+    """
+    if plans_date is None or not send_plans_clicks:
         raise PreventUpdate
-    open_send_modal = False
-    modal_body = ''
-    if ctx.triggered_id == 'send_plans_admin':
-        if send_plans_clicks:
-            # подтвердили отправку планов в 1С
-            error = send_all_programs_to_1c(pd.to_datetime(plans_date))
-            if error is None:
-                modal_body = 'Планы успешно установлены'
-            else:
-                modal_body = f'Ошибка: {error}'
-            open_send_modal = True
-    return open_send_modal, modal_body
+    # подтвердили отправку планов в 1С
+    set_progress((0, 1, 'Загрузка прогнозов'))
+    worker = create_redis_worker(db)
+    versions = worker if db == 0 else create_redis_worker(0)
+    programs = create_program_worker(versions=lambda: versions)
+    try:
+        summary = send_all_programs_to_1c(pd.to_datetime(plans_date), db, worker=worker, programs=programs,
+                                          progress=lambda done, total: set_progress((done, total, f'{done} / {total}')))
+    finally:
+        programs.client.close()
+        worker.connection_pool.disconnect()
+        versions.connection_pool.disconnect()
+    return summary_message(summary)
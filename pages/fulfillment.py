@@ -1,63 +1,144 @@
 import dash
-from dash import html, dcc, callback, Input, Output
+from dash import html, dcc, dash_table, callback, Input, Output
 import dash_bootstrap_components as dbc
+from dash.exceptions import PreventUpdate
+from dateutil.relativedelta import relativedelta
+from datetime import datetime
 import pandas as pd
-from data_methods import redis_worker
+from data_methods import rus_month
+from metrics import timed, CALLBACK_SECONDS
+from sales import fulfillment_cube
 
 dash.register_page(__name__, title='Выполнение плана')
 
+COLUMNS = [
+    {'name': 'Группа', 'id': 'Группа'},
+    {'name': 'Факт', 'id': 'Факт', 'type': 'numeric'},
+    {'name': 'План', 'id': 'План', 'type': 'numeric'},
+    {'name': 'Отклонение', 'id': 'Отклонение', 'type': 'numeric'},
+    {'name': 'Выполнение, %', 'id': 'Выполнение', 'type': 'numeric'},
+]
 
-def fill_tbl(period=None, subdivision=None, region=None, manager=None):
-    if period is None:
-        period = redis_worker.first_forecast_period()
 
-    gfd = redis_worker.main_table(period, subdivision, region, manager)
+def period_options() -> list:
+    """
+    Текущий месяц и 5 предыдущих
+    """
+    first_day = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return [{'label': rus_month(_date), 'value': _date}
+            for _date in (first_day - relativedelta(months=i) for i in range(0, 6))]
 
-    def columns_iterator(df):
-        for col in gfd.columns:
-            if col != 'Ед':
-                yield {"title": col, "field": col}
 
-    tbl_columns = [record for record in columns_iterator(gfd)]
-    return gfd.to_dict(), tbl_columns
+def layout(**kwargs):
+    """
+    Макет строится при каждом открытии страницы, таблица заполняется колбэком update_fulfillment
+    """
+    _period_options = period_options()
+    return dbc.Container([
+        dbc.Row([
+            dbc.Col(
+                html.Div([
+                    'Выполнение плана за',
+                    dcc.Dropdown(id='fulfillment_period', options=_period_options,
+                                 value=_period_options[0]['value'], clearable=False, persistence=True,
+                                 persistence_type='session'),
+                ]), width={'size': 2, 'offset': 0}
+            ),
 
+            dbc.Col(
+                html.Div([
+                    html.Div('Разрез'),
+                    dcc.Dropdown(id="forecast_layer2", options=['В целом по компании', 'Подразделение', 'Регион',
+                                                               'Менеджер'], value='В целом по компании',
+                                 clearable=False, persistence=True, persistence_type='session'),
+                ]), width={'size': 2, 'offset': 0}
+            ),
 
-layout = dbc.Container([
-    dbc.Row([
-        dbc.Col(
-            html.Div([
-                html.Div('Выполнение плана'),
-                dcc.Dropdown(id="forecast_layer2", options=['В целом по компании', 'Подразделение', 'Регион',
-                                                           'Менеджер'], value='В целом по компании', clearable=False,
-                             persistence=True,
-                             persistence_type='session'),
-            ]), width={'size': 2, 'offset': 0}
-        ),
+            dbc.Col(
+                html.Div([
+                    html.Div(id='forecast_layer_label2'),
+                    dcc.Dropdown(id="layer2", style={'display': 'none'}, searchable=True, clearable=False,
+                                 persistence=True, persistence_type='session'),
+                ]), width={'size': 4, 'offset': 0}
+            ),
+        ]),
 
-        dbc.Col(
-            html.Div([
-                html.Div(id='forecast_layer_label2'),
-                dcc.Dropdown(id="layer2", style={'display': 'none'}, searchable=True, clearable=False,
-                             persistence=True, persistence_type='session'),
-            ]), width={'size': 4, 'offset': 0}
-        ),
-    ]),
-    dbc.Row([
+        dbc.Row(dbc.Col(html.Br())),
 
-    ]),
-])
+        # предупреждение: продажи не загрузились из 1С, и время загрузки показанных данных
+        html.Div(id='fulfillment_stale_marker'),
+        html.Div(id='fulfillment_loaded_at'),
+
+        dbc.Row(
+            dbc.Col(
+                dash_table.DataTable(
+                    data=[],
+                    columns=COLUMNS,
+                    id='fulfillment_tbl',
+                    sort_action='native',
+                    style_cell_conditional=[
+                        {
+                            'if': {'column_id': 'Группа'},
+                            'textAlign': 'left',
+                        }
+                    ],
+                    style_data_conditional=[
+                        {
+                            'if': {'column_id': 'Выполнение', 'filter_query': '{Выполнение} < 100'},
+                            'color': 'firebrick',
+                        }
+                    ],
+                    style_header={
+                        'backgroundColor': 'white',
+                        'fontWeight': 'bold',
+                        'textAlign': 'center'
+                    },
+                    style_cell={
+                        'font_size': '14px',
+                    },
+                    fill_width=False,
+                ),
+            ), justify='center'
+        ),
+    ], fluid=True)
 
 
 @callback(
     Output('layer2', 'options'),
     Output('layer2', 'style'),
     Output('forecast_layer_label2', 'children'),
+    Input('fulfillment_period', 'value'),
     Input('forecast_layer2', 'value'),
 )
-def update_forecast_layers(forecast_layer):
-    layer_label = forecast_layer
-    style = {'display': 'block'}
+@timed(CALLBACK_SECONDS, 'update_fulfillment_layers')
+def update_forecast_layers(period, forecast_layer):
+    if period is None:
+        raise PreventUpdate
     if forecast_layer == 'В целом по компании':
-        layer_label = ''
-        style = {'display': 'none'}
-    return redis_worker.options(forecast_layer), style, layer_label
+        return [], {'display': 'none'}, ''
+    return fulfillment_cube.values(pd.to_datetime(period), forecast_layer), {'display': 'block'}, forecast_layer
+
+
+@callback(
+    Output('fulfillment_tbl', 'data'),
+    Output('fulfillment_stale_marker', 'children'),
+    Output('fulfillment_loaded_at', 'children'),
+    Input('fulfillment_period', 'value'),
+    Input('forecast_layer2', 'value'),
+    Input('layer2', 'value'),
+)
+@timed(CALLBACK_SECONDS, 'update_fulfillment')
+def update_fulfillment(period, forecast_layer, layer):
+    if period is None or forecast_layer is None:
+        raise PreventUpdate
+    value = None if forecast_layer == 'В целом по компании' else layer
+    if forecast_layer != 'В целом по компании' and value is None:
+        return [], None, ''
+
+    _df = fulfillment_cube.table(pd.to_datetime(period), forecast_layer, value)
+    stale_marker = None
+    if _df.attrs.get('stale'):
+        stale_marker = dbc.Alert('1С недоступна: показаны продажи последней успешной загрузки', color='warning')
+    loaded_at = _df.attrs.get('loaded_at')
+    loaded_at = f'Продажи загружены {loaded_at:%d.%m.%Y %H:%M}' if loaded_at is not None else ''
+    return _df.to_dict('records'), stale_marker, loaded_at
@@ -1,61 +1,68 @@
 import dash
-from dash import dcc, html, dash_table, ctx, callback, Input, Output, State
+from dash import dcc, html, dash_table, ctx, callback, clientside_callback, Input, Output, State
 import dash_bootstrap_components as dbc
 from dash.exceptions import PreventUpdate
 import pandas as pd
-from data_methods import redis_worker, program_worker, date_options
+from data_methods import redis_worker, program_worker, date_options, keys
+from metrics import timed, CALLBACK_SECONDS
+from settings import settings
+from tables import merge_program, rollup_slice
+from cache import LRUCache
+from functools import lru_cache
 
 
 dash.register_page(__name__, path='/', title='Установка планов продаж')
 
+OPTIONS_LIMIT = 100  # максимальное количество значений разреза в выпадающем списке
 
-def fill_tbl(period=None, subdivision=None, region=None, manager=None, replace_program=False, **kwargs) -> (dict, list):
+# объединенные таблицы планов срезов: {(db, год, месяц, разрез, значение): строки и колонки с их сверткой и снимком}
+slice_tables = LRUCache(maxsize=256)
+
+
+def fill_tbl(period=None, subdivision=None, region=None, manager=None, replace_program=False, **kwargs) -> (list, list):
+    """
+    Таблица планов среза строится по этапам: прогноз (свертка RedisWorker.forecast_rollup), планы (снимок
+    ProgramWorker.program_snapshot), объединение и колонки. Прогноз и планы кэшируют их worker'ы, объединенная
+    таблица среза хранится в slice_tables, пока worker'ы возвращают те же свертку и снимок, поэтому повторный
+    выбор среза и замена плана прогнозом не обращаются к Redis и 1С и не строят таблицу заново.
+    Возвращаемые списки общие для всех вызывающих и не должны изменяться.
+    :return: (строки таблицы, колонки таблицы)
+    """
     db = kwargs.get('db', 0)
     if period is None:
         period = redis_worker[db].first_forecast_period()
 
-    gfd = redis_worker[db].main_table(period, subdivision, region, manager)
-    if gfd.empty:
-        return {}, []
-    gfd = gfd.groupby(by=['Группа', 'Прогноз', 'RMSE'], as_index=False).max()
-
-    def round_forecast(x):
-        if x < 0:
-            return 0
-        elif 5 > x > 0:
-            return round(x, 3)
-        elif 10 > x >= 5:
-            return round(x, 2)
-        elif 100 > x >= 10:
-            return round(x, 1)
-        elif x >= 100:
-            return round(x, 0)
+    layer, value = 'В целом по компании', None
+    for key, _value in {'subdivision': subdivision, 'region': region, 'manager': manager}.items():
+        if _value is not None:
+            layer, value = keys(key), _value
+    # срез выбирается из свернутых таблиц прогноза всех срезов периода, общих для всех пользователей
+    rollup = redis_worker[db].forecast_rollup(period)
+    snapshot = program_worker.program_snapshot(period, layer)
+    slice_key = (db, period.year, period.month, layer, value)
+    table = slice_tables.get(slice_key)
+    if table is None or table['rollup'] is not rollup or table['snapshot'] is not snapshot:
+        gfd = rollup_slice(rollup, layer, value)
+        if gfd.empty:
+            data, columns = {}, []
         else:
-            return x
-
-    gfd['Прогноз'] = gfd['Прогноз'].apply(round_forecast)
-    gfd['RMSE'] = gfd['RMSE'].apply(round_forecast)
-
-    gfd['План'] = 0
-    gfd['Отклонение'] = 0
-
-    df_program = program_worker.get_program(period, subdivision, region, manager)
-
-    for i in range(len(gfd)):
-        group = gfd.at[i, 'Группа']
-        gfd.at[i, 'План'] = program_worker.plane(group, df_program)
-        gfd.at[i, 'Отклонение'] = program_worker.dev(group, df_program)
-
-    if replace_program:
-        gfd['План'] = gfd['Прогноз']
-        gfd['Отклонение'] = gfd['RMSE']
-
-    def columns_iterator():
-        for col in gfd.columns:
-            if col != 'Ед':
-                yield {"name": col, "id": col}
-
-    tbl_columns = [record for record in columns_iterator()]
+            gfd = merge_program(gfd, program_worker.get_program(period, subdivision, region, manager))
+            data, columns = gfd.to_dict('records'), table_columns(tuple(gfd.columns))
+        table = {'rollup': rollup, 'snapshot': snapshot, 'data': data, 'columns': columns}
+        slice_tables.set(slice_key, table)
+
+    data = table['data']
+    if replace_program and data:
+        data = [{**row, 'План': row['Прогноз'], 'Отклонение': row['RMSE']} for row in data]
+    return data, table['columns']
+
+
+@lru_cache(maxsize=16)
+def table_columns(columns: tuple) -> list:
+    """
+    Колонки DataTable для колонок таблицы планов: Группа, Прогноз и RMSE, План и Отклонение (редактируемые)
+    """
+    tbl_columns = [{"name": col, "id": col} for col in columns if col != 'Ед']
     tbl_columns[0]['name'] = ['', tbl_columns[0]['name']]
     for i in range(1, 3):
         tbl_columns[i]['name'] = [f'Прогноз', tbl_columns[i]['name']]
@@ -65,8 +72,7 @@ def fill_tbl(period=None, subdivision=None, region=None, manager=None, replace_p
 
     for i in range(1, 5):
         tbl_columns[i]['type'] = 'numeric'
-
-    return gfd.to_dict('records'), tbl_columns
+    return tbl_columns
 
 
 def send_program_to_1c(tbl_data: list, period, layer, subdivision=None, region=None, manager=None, **kwargs) -> str | None:
@@ -91,131 +97,156 @@ def send_program_to_1c(tbl_data: list, period, layer, subdivision=None, region=N
     return program_worker.set_program(layer, period, programs)
 
 
-layout = dbc.Container([
-    # menu
-    dbc.Row([
-        dbc.Col(
-            html.Div([
-                "Прогноз на",
-                dcc.Dropdown(id="prediction_date",
-                             options=date_options(), value=date_options()[0]['value'],
-                             clearable=False, persistence=True, persistence_type='session'),
-            ]),
-            # width={'size': 2, 'offset': 0}
-        ),
-
-        dbc.Col(
-            html.Div([
-                html.Div('Разрез планирования'),
-                dcc.Dropdown(id="forecast_layer", options=['В целом по компании', 'Подразделение', 'Регион',
-                                                           'Менеджер'], value='В целом по компании', clearable=False,
-                             persistence=True,
-                             persistence_type='session'),
-            ]),
-            # width={'size': 2, 'offset': 0}
-        ),
+def layer_kwargs(forecast_layer: str, layer) -> dict:
+    """
+    :return: значение разреза для RedisWorker: {'subdivision': ..., 'region': ..., 'manager': ...}
+    """
+    kwargs = {'subdivision': None, 'region': None, 'manager': None}
+    if keys(forecast_layer) is not None:
+        kwargs[keys(forecast_layer)] = layer
+    return kwargs
+
+
+def layout(**kwargs):
+    """
+    Макет строится при каждом открытии страницы без обращений к Redis и 1С,
+    таблица заполняется колбэком update_table, графики - prefetch_graphs
+    """
+    _date_options = date_options()
+    return dbc.Container([
+        # menu
+        dbc.Row([
+            dbc.Col(
+                html.Div([
+                    "Прогноз на",
+                    dcc.Dropdown(id="prediction_date",
+                                 options=_date_options, value=_date_options[0]['value'],
+                                 clearable=False, persistence=True, persistence_type='session'),
+                ]),
+                # width={'size': 2, 'offset': 0}
+            ),
 
-        dbc.Col(
-            html.Div([
-                html.Div(id='forecast_layer_label'),
-                dcc.Dropdown(id="layer", style={'display': 'none'}, searchable=True, clearable=False,
-                             persistence=True, persistence_type='session'),
-            ]),
-            # width={'size': 4, 'offset': 0}
-        ),
+            dbc.Col(
+                html.Div([
+                    html.Div('Разрез планирования'),
+                    dcc.Dropdown(id="forecast_layer", options=['В целом по компании', 'Подразделение', 'Регион',
+                                                               'Менеджер'], value='В целом по компании', clearable=False,
+                                 persistence=True,
+                                 persistence_type='session'),
+                ]),
+                # width={'size': 2, 'offset': 0}
+            ),
 
-        dbc.Col([
-            dcc.ConfirmDialogProvider(
-                children=html.Button('Прогноз в план', id='replace-btn', n_clicks=0,
-                                     className='btn btn-outline-primary mx-2'),
-                id='replace_confirmation_dialog',
-                message='Перенести прогноз в план? Это перезатрет ручные изменения!'
+            dbc.Col(
+                html.Div([
+                    html.Div(id='forecast_layer_label'),
+                    dcc.Dropdown(id="layer", style={'display': 'none'}, searchable=True, clearable=False,
+                                 persistence=True, persistence_type='session'),
+                ]),
+                # width={'size': 4, 'offset': 0}
             ),
-        ], align='end',
-            # width={'size': 2, 'offset': 0}
-        ),
 
-        dbc.Col([
-            dcc.ConfirmDialogProvider(
-                children=html.Button('Применить план', id='submit-btn', n_clicks=0,
-                                     className='btn btn-outline-success mx-2'),
-                id='send_confirmation_dialog',
-                message='Установить планы продаж в 1С?'
+            dbc.Col([
+                dcc.ConfirmDialogProvider(
+                    children=html.Button('Прогноз в план', id='replace-btn', n_clicks=0,
+                                         className='btn btn-outline-primary mx-2'),
+                    id='replace_confirmation_dialog',
+                    message='Перенести прогноз в план? Это перезатрет ручные изменения!'
+                ),
+            ], align='end',
+                # width={'size': 2, 'offset': 0}
             ),
-        ], align='end',
-            # width={'size': 2, 'offset': 0}
-        )
-    ]),
-
-    dbc.Row(dbc.Col(html.Br())),
-
-    dbc.Row([
-        # основная таблица
-        dbc.Col(
-            dash_table.DataTable(
-                *fill_tbl(),
-                id='tbl',
-                style_cell_conditional=[
-                    {
-                        'if': {'column_id': 'Группа'},
-                        'textAlign': 'left',
-                    }
-                ],
-                # style_data_conditional=[
-                #     {
-                #         'if': {
-                #             'column_id': 'План',
-                #             'filter_query': '{modified} == True',
-                #         },
-                #         'backgroundColor': 'dodgerblue',
-                #         'color': 'white'
-                #     }
-                # ],
-                style_header={
-                    'backgroundColor': 'white',
-                    'fontWeight': 'bold',
-                    'textAlign': 'center'
-                },
-                style_cell = {
-                    'font_size': '14px',
-                },
-                css=[
-                        {"selector": ".dash-spreadsheet tr th", "rule": "height: 15px;"},  # set height of header
-                        {"selector": ".dash-spreadsheet tr td", "rule": "height: 10px;"},  # set height of body rows
+
+            dbc.Col([
+                dcc.ConfirmDialogProvider(
+                    children=html.Button('Применить план', id='submit-btn', n_clicks=0,
+                                         className='btn btn-outline-success mx-2'),
+                    id='send_confirmation_dialog',
+                    message='Установить планы продаж в 1С?'
+                ),
+            ], align='end',
+                # width={'size': 2, 'offset': 0}
+            )
+        ]),
+
+        dbc.Row(dbc.Col(html.Br())),
+
+        # предупреждение: 1С недоступна, показаны последние загруженные планы
+        html.Div(id='plan_stale_marker'),
+        # период, разрез, значение разреза и база, для которых заполнена таблица
+        dcc.Store(id='tbl_slice'),
+
+        dbc.Row([
+            # основная таблица
+            dbc.Col(
+                dash_table.DataTable(
+                    data=[],
+                    columns=[],
+                    id='tbl',
+                    style_cell_conditional=[
+                        {
+                            'if': {'column_id': 'Группа'},
+                            'textAlign': 'left',
+                        }
                     ],
-                fill_width=False,
-                merge_duplicate_headers=True,
+                    # style_data_conditional=[
+                    #     {
+                    #         'if': {
+                    #             'column_id': 'План',
+                    #             'filter_query': '{modified} == True',
+                    #         },
+                    #         'backgroundColor': 'dodgerblue',
+                    #         'color': 'white'
+                    #     }
+                    # ],
+                    style_header={
+                        'backgroundColor': 'white',
+                        'fontWeight': 'bold',
+                        'textAlign': 'center'
+                    },
+                    style_cell = {
+                        'font_size': '14px',
+                    },
+                    css=[
+                            {"selector": ".dash-spreadsheet tr th", "rule": "height: 15px;"},  # set height of header
+                            {"selector": ".dash-spreadsheet tr td", "rule": "height: 10px;"},  # set height of body rows
+                        ],
+                    fill_width=False,
+                    merge_duplicate_headers=True,
+                ),
+                # width={'size': 5, 'offset': 0}
             ),
-            # width={'size': 5, 'offset': 0}
-        ),
 
-        # Информация о модели прогнозирования
-        dbc.Col([
-            html.Div('Модель прогнозирования: prophet'),
-            html.Div('Горизонт прогнозирования: 6 месяцев'),
-            html.Div('Удалять выбросы: Да'),
-            html.Div('Выбросами считаются точки, стоящие дальше, чем 1.5 * межквантильное расстояние от 25 и 75 персентилей.'),
-            html.Div('Черные точки - исторические данные. Красные - выбросы в данных. Синяя линия - прогноз. Голубая область - стандартрное отклонение прогноза.'),
-            html.Div('Пунктирные линии - теоретический максимум и минимум прогноза. Максимум берется, как +20% к максимуму истории (без учета выбросов)'),
-            dcc.Graph(id='main-graph',
-                      figure=redis_worker[0].main_graph()
-                      ),
-        ],
-            width={'size': 6, 'offset': 0}
-        )
-    ], justify='center'),
-    dbc.Modal(
-        [
-            dbc.ModalHeader("Установка плана в 1С"),
-            dbc.ModalBody(
-                id='send_modal_body'
-            ),
-            dbc.ModalFooter(
-                dbc.Button("Закрыть", id="close_send_modal", className="ml-auto")
-            ),
-        ], id="send_modal",
-    ),
-], fluid=True)
+            # Информация о модели прогнозирования
+            dbc.Col([
+                html.Div('Модель прогнозирования: prophet'),
+                html.Div('Горизонт прогнозирования: 6 месяцев'),
+                html.Div('Удалять выбросы: Да'),
+                html.Div('Выбросами считаются точки, стоящие дальше, чем 1.5 * межквантильное расстояние от 25 и 75 персентилей.'),
+                html.Div('Черные точки - исторические данные. Красные - выбросы в данных. Синяя линия - прогноз. Голубая область - стандартрное отклонение прогноза.'),
+                html.Div('Пунктирные линии - теоретический максимум и минимум прогноза. Максимум берется, как +20% к максимуму истории (без учета выбросов)'),
+                dcc.Graph(id='main-graph'),
+                # графики групп среза для переключения в браузере
+                dcc.Store(id='graphs_slice'),
+                dcc.Store(id='graphs_store'),
+                dcc.Store(id='graph_request'),
+                dcc.Store(id='graph_single'),
+            ],
+                width={'size': 6, 'offset': 0}
+            )
+        ], justify='center'),
+        dbc.Modal(
+            [
+                dbc.ModalHeader("Установка плана в 1С"),
+                dbc.ModalBody(
+                    id='send_modal_body'
+                ),
+                dbc.ModalFooter(
+                    dbc.Button("Закрыть", id="close_send_modal", className="ml-auto")
+                ),
+            ], id="send_modal",
+        ),
+    ], fluid=True)
 
 
 @callback(
@@ -224,97 +255,199 @@ layout = dbc.Container([
     Output('forecast_layer_label', 'children'),
     Input('forecast_layer', 'value'),
     Input('db', 'value'),
+    Input('layer', 'search_value'),
+    State('layer', 'value'),
 )
-def update_forecast_layers(forecast_layer, db):
+@timed(CALLBACK_SECONDS, 'update_forecast_layers')
+def update_forecast_layers(forecast_layer, db, search_value, layer):
     layer_label = forecast_layer
     style = {'display': 'block'}
     if forecast_layer == 'В целом по компании':
         layer_label = ''
         style = {'display': 'none'}
-    return redis_worker[db].options(forecast_layer), style, layer_label
+
+    # длинные списки фильтруются на сервере, в браузер отправляются первые OPTIONS_LIMIT значений
+    index = redis_worker[db].option_index(forecast_layer)
+    if index is None:
+        # значения не загрузились: пустой список сбросил бы выбранное значение
+        raise PreventUpdate
+    if ctx.triggered_id == 'layer' and len(index) <= OPTIONS_LIMIT:
+        # весь список уже в браузере, dcc.Dropdown фильтрует его по вводу сам
+        raise PreventUpdate
+    if len(index) <= OPTIONS_LIMIT:
+        options = index.values
+    elif search_value:
+        options = index.search(search_value, OPTIONS_LIMIT)
+    else:
+        options = index.values[:OPTIONS_LIMIT]
+    if layer is not None and layer not in options and layer in index:
+        # выбранное значение должно оставаться в списке, иначе Dash его сбросит
+        options = [layer, *options]
+    return options, style, layer_label
 
 
 @callback(
     Output('tbl', 'data'),
     Output('tbl', 'columns'),
-    Output("send_modal", "is_open"),
-    Output('send_modal_body', 'children'),
-    Output('submit-btn', 'disabled'),
+    Output('plan_stale_marker', 'children'),
+    Output('tbl_slice', 'data'),
     Input('prediction_date', 'value'),
     Input('forecast_layer', 'value'),
     Input('layer', 'value'),
-    Input("close_send_modal", "n_clicks"),
-    Input('send_confirmation_dialog', 'submit_n_clicks'),
     Input('replace_confirmation_dialog', 'submit_n_clicks'),
     Input('db', 'value'),
-    State('tbl', 'data'),
+    State('tbl_slice', 'data'),
 )
-def update_table(period, forecast_layer, layer, close_send_model_clicks, submit_n_clicks, replace_n_clicks, db, tbl_data):
-    subdivision = None
-    region = None
-    manager = None
-    if forecast_layer == 'Подразделение':
-        subdivision = layer
-    elif forecast_layer == 'Регион':
-        region = layer
-    elif forecast_layer == 'Менеджер':
-        manager = layer
+@timed(CALLBACK_SECONDS, 'update_table')
+def update_table(period, forecast_layer, layer, replace_n_clicks, db, tbl_slice):
+    """
+    Заполняет таблицу выбранного среза. Повторная установка тех же периода, разреза и базы (например, значения
+    из сессии) таблицу не перестраивает и ручные изменения плана не сбрасывает. Отправка плана и закрытие окна
+    отправки обрабатывает send_plan, таблица при этом не загружается заново.
+    """
     if period is None:
         raise PreventUpdate
-    kwargs = {'period': pd.to_datetime(period), "layer": forecast_layer, "subdivision": subdivision,
-              'region': region, 'manager': manager, 'db': db}
-    open_send_modal = False
-
-    modal_body = ''
-    replace_program = False
-    if ctx.triggered_id == 'send_confirmation_dialog':
-        if submit_n_clicks:
-            # подтвердили отправку плана в 1С
-            error = send_program_to_1c(tbl_data, **kwargs)
-            if error is None:
-                modal_body = 'Планы успешно установлены'
-            else:
-                modal_body = f'Ошибка: {error}'
-            open_send_modal = True
-    elif ctx.triggered_id == 'replace_confirmation_dialog':
-        if replace_n_clicks:
-            # подтвердили замену плана прогнозом
-            replace_program = True
-
-    send_btn_disabled = period is None or forecast_layer is None or (
-            forecast_layer != 'В целом по компании' and layer is None)
-    return *fill_tbl(replace_program=replace_program, **kwargs), open_send_modal, modal_body, send_btn_disabled
+    current_slice = [period, forecast_layer, layer, db]
+    # подтвердили замену плана прогнозом
+    replace_program = ctx.triggered_id == 'replace_confirmation_dialog' and bool(replace_n_clicks)
+    if current_slice == tbl_slice and not replace_program:
+        raise PreventUpdate
+
+    period = pd.to_datetime(period)
+    data, columns = fill_tbl(period, replace_program=replace_program, db=db, **layer_kwargs(forecast_layer, layer))
+    stale_marker = None
+    if program_worker.is_stale(period, forecast_layer):
+        stale_marker = dbc.Alert('1С недоступна: планы могут быть устаревшими, показаны последние загруженные данные',
+                                 color='warning')
+    return data, columns, stale_marker, current_slice
 
 
 @callback(
-    Output('main-graph', 'figure'),
-    Input('tbl', 'active_cell'),
+    Output('send_modal', 'is_open'),
+    Output('send_modal_body', 'children'),
+    Input('send_confirmation_dialog', 'submit_n_clicks'),
+    Input('close_send_modal', 'n_clicks'),
+    State('tbl', 'data'),
+    State('prediction_date', 'value'),
+    State('forecast_layer', 'value'),
+    State('layer', 'value'),
+    prevent_initial_call=True,
+)
+@timed(CALLBACK_SECONDS, 'send_plan')
+def send_plan(submit_n_clicks, close_n_clicks, tbl_data, period, forecast_layer, layer):
+    """
+    Отправляет план среза из таблицы в 1С. Закрытие окна результата не обращается ни к Redis, ни к 1С.
+    """
+    if ctx.triggered_id != 'send_confirmation_dialog':
+        return False, dash.no_update
+    if not submit_n_clicks or period is None or not tbl_data:
+        raise PreventUpdate
+    # подтвердили отправку плана в 1С
+    error = send_program_to_1c(tbl_data, pd.to_datetime(period), forecast_layer,
+                               **layer_kwargs(forecast_layer, layer))
+    return True, 'Планы успешно установлены' if error is None else f'Ошибка: {error}'
+
+
+# кнопка отправки доступна, когда выбран срез; состояние считается в браузере
+clientside_callback(
+    """
+    function(period, forecast_layer, layer) {
+        return period == null || forecast_layer == null || (forecast_layer !== 'В целом по компании' && layer == null);
+    }
+    """,
+    Output('submit-btn', 'disabled'),
+    Input('prediction_date', 'value'),
+    Input('forecast_layer', 'value'),
+    Input('layer', 'value'),
+)
+
+
+@callback(
+    Output('graphs_store', 'data'),
+    Input('graphs_slice', 'data'),
+)
+@timed(CALLBACK_SECONDS, 'prefetch_graphs')
+def prefetch_graphs(graphs_slice):
+    """
+    Загружает графики всех групп таблицы одним запросом к Redis, браузер переключает их без обращений к серверу.
+    Графики сверх settings.graph_prefetch_bytes загружаются по одному колбэком fetch_graph, как и все графики
+    среза, если Redis недоступен: хранилище остается от прежнего среза, и браузер его не использует.
+    """
+    if not graphs_slice:
+        raise PreventUpdate
+    db = graphs_slice['db']
+    figures = redis_worker[db].graphs(graphs_slice['groups'], max_bytes=settings.graph_prefetch_bytes,
+                                      **layer_kwargs(graphs_slice['layer'], graphs_slice['value']))
+    if figures is None:
+        raise PreventUpdate
+    return {'slice': graphs_slice['key'], 'figures': figures, 'default': redis_worker[db].main_graph(as_dict=True)}
+
+
+@callback(
+    Output('graph_single', 'data'),
+    Input('graph_request', 'data'),
+    State('graphs_slice', 'data'),
+)
+@timed(CALLBACK_SECONDS, 'fetch_graph')
+def fetch_graph(graph_request, graphs_slice):
+    if not graph_request or not graphs_slice or graph_request['slice'] != graphs_slice['key']:
+        raise PreventUpdate
+    figures = redis_worker[graphs_slice['db']].graphs(
+        [graph_request['group']], **layer_kwargs(graphs_slice['layer'], graphs_slice['value']))
+    if figures is None:
+        raise PreventUpdate
+    return {**graph_request, 'figure': figures[graph_request['group']]}
+
+
+# ключ среза и список групп таблицы; изменение плана в ячейке не меняет ключ, и графики не загружаются заново
+clientside_callback(
+    """
+    function(tbl_data, forecast_layer, layer, db, current) {
+        const groups = (tbl_data || []).map(row => row['Группа']);
+        const key = JSON.stringify([forecast_layer, layer, db, groups]);
+        if (current && current.key === key) {
+            return window.dash_clientside.no_update;
+        }
+        return {key: key, layer: forecast_layer, value: layer, db: db, groups: groups};
+    }
+    """,
+    Output('graphs_slice', 'data'),
+    Input('tbl', 'data'),
     Input('forecast_layer', 'value'),
     Input('layer', 'value'),
     Input('db', 'value'),
-    State('tbl', 'data')
+    State('graphs_slice', 'data'),
 )
-def update_graph(active_cell, forecast_layer, layer, db, table_data):
-    if active_cell and active_cell['column_id'] == 'Группа':
-        subdivision = None
-        region = None
-        manager = None
-        if forecast_layer == 'Подразделение':
-            subdivision = layer
-        elif forecast_layer == 'Регион':
-            region = layer
-        elif forecast_layer == 'Менеджер':
-            manager = layer
-
-        row = active_cell['row']
-        group = table_data[row][active_cell['column_id']]
-        kwargs = {
-            'group': group,
-            'subdivision': subdivision,
-            'region': region,
-            'manager': manager
+
+# график выбранной группы берется из загруженных заранее, отсутствующий запрашивается через graph_request
+clientside_callback(
+    """
+    function(active_cell, store, single, tbl_data, graphs_slice) {
+        const no_update = window.dash_clientside.no_update;
+        if (!active_cell) {
+            return [store ? store.default : no_update, no_update];
         }
-        main_graph = redis_worker[db].main_graph(**kwargs)
-        return main_graph
-    else:
-        raise PreventUpdate
+        // выбранная ячейка могла остаться от прежней, более длинной таблицы
+        if (active_cell.column_id !== 'Группа' || !tbl_data || active_cell.row >= tbl_data.length) {
+            return [no_update, no_update];
+        }
+        const group = tbl_data[active_cell.row]['Группа'];
+        const slice = graphs_slice ? graphs_slice.key : null;
+        // хранилище другого среза: графики текущего еще загружаются или Redis был недоступен
+        if (store && store.slice === slice && group in store.figures) {
+            return [store.figures[group], no_update];
+        }
+        if (single && single.group === group && single.slice === slice) {
+            return [single.figure, no_update];
+        }
+        return [no_update, {group: group, slice: slice}];
+    }
+    """,
+    Output('main-graph', 'figure'),
+    Output('graph_request', 'data'),
+    Input('tbl', 'active_cell'),
+    Input('graphs_store', 'data'),
+    Input('graph_single', 'data'),
+    State('tbl', 'data'),
+    State('graphs_slice', 'data'),
+)
@@ -0,0 +1,217 @@
+"""
+Выполнение плана продаж. Фактические продажи периода загружаются из 1С одним запросом, сворачиваются
+по всем разрезам в куб с индексом (разрез, значение разреза, группа) и соединяются с планами.
+Новые продажи дозагружаются с момента последней загруженной продажи и прибавляются к кубу,
+срез для страницы выбирается из куба по индексу без пересчета.
+"""
+from data_methods import ProgramWorker, program_worker, end_of_month, LAYERS
+from datetime import datetime, timedelta
+from settings import settings
+from threading import Lock, Thread
+import logging
+import pandas as pd
+import time
+
+# продажи без подразделения или региона относятся к основному подразделению, как в выгрузке истории для прогноза
+DEFAULT_SUBDIVISION = 'Краснодар, Тополиная, 27/1'
+DEFAULT_REGION = 'Направление Краснодар+15км - Динской район'
+
+LAYER_COLUMNS = {'В целом по компании': None, 'Подразделение': 'Подразделение', 'Регион': 'Регион',
+                 'Менеджер': 'Менеджер'}
+INDEX = ['Разрез', 'Значение', 'Группа']  # значение разреза "В целом по компании" - пустая строка
+
+
+def rollup_sales(sales: pd.DataFrame) -> pd.Series:
+    """
+    Сворачивает продажи сразу по всем разрезам одной группировкой
+    :param sales: dataframe с колонками Группа, Подразделение, Регион, Менеджер, Факт
+    :return: серия Факт с индексом (Разрез, Значение, Группа)
+    """
+    long = pd.concat([
+        pd.DataFrame({
+            'Разрез': layer,
+            'Значение': '' if column is None else sales[column].to_numpy(),
+            'Группа': sales['Группа'].to_numpy(),
+            'Факт': sales['Факт'].to_numpy(dtype=float),
+        }) for layer, column in LAYER_COLUMNS.items()
+    ], ignore_index=True)
+    return long.groupby(INDEX)['Факт'].sum()
+
+
+def plans_frame(snapshots: dict) -> pd.DataFrame:
+    """
+    :param snapshots: {разрез: снимок планов ProgramWorker.program_snapshot}
+    :return: dataframe с колонками План, Отклонение и индексом (Разрез, Значение, Группа)
+    """
+    frames = []
+    for layer, snapshot in snapshots.items():
+        for value, _df in (snapshot or {}).items():
+            if 'Группа' in _df.columns:
+                frames.append(_df.reindex(columns=['Группа', 'План', 'Отклонение'])
+                              .assign(Разрез=layer, Значение='' if value is None else value))
+    if not frames:
+        return pd.DataFrame(columns=[*INDEX, 'План', 'Отклонение']).set_index(INDEX)
+    return pd.concat(frames, ignore_index=True).drop_duplicates(subset=INDEX).set_index(INDEX)
+
+
+def fulfillment(facts: pd.Series, plans: pd.DataFrame) -> pd.DataFrame:
+    """
+    Соединяет продажи с планами и считает выполнение плана в процентах (для групп без плана - пусто)
+    :return: dataframe с колонками Факт, План, Отклонение, Выполнение и отсортированным индексом
+        (Разрез, Значение, Группа)
+    """
+    cube = pd.concat([facts, plans], axis=1)
+    cube[['Факт', 'План', 'Отклонение']] = cube[['Факт', 'План', 'Отклонение']].astype(float).fillna(0.)
+    cube['Выполнение'] = (cube['Факт'] / cube['План'] * 100).where(cube['План'] > 0).round(1)
+    cube.index.names = INDEX
+    return cube.sort_index()
+
+
+class _PeriodCube:
+    def __init__(self):
+        self.lock = Lock()
+        self.facts = None
+        self.last_sale = None  # время последней загруженной продажи, с него начинается дозагрузка
+        self.loaded = 0.
+        self.full_loaded = 0.
+        self.loaded_at = None
+        self.stale = False
+        self.snapshots = None
+        self.cube = None
+        self.cube_facts = None  # продажи, из которых построен cube
+        self.refreshing = None  # поток загрузки продаж
+
+
+class FulfillmentCube:
+    """
+    Кубы выполнения плана по периодам. Продажи дозагружаются не чаще, чем раз в refresh_interval секунд,
+    и полностью перечитываются раз в full_refresh_interval секунд: так учитываются перепроведенные задним
+    числом документы, которые дозагрузка по времени последней продажи не видит. Загрузки выполняются в фоне,
+    как и обновление снимков планов: до их завершения показывается куб из последних загруженных продаж.
+    """
+    logger = logging.getLogger('FulfillmentCube')
+
+    def __init__(self, program_worker: ProgramWorker, refresh_interval: float = 300,
+                 full_refresh_interval: float = 3600):
+        self.program_worker = program_worker
+        self.refresh_interval = refresh_interval
+        self.full_refresh_interval = full_refresh_interval
+        self._periods = {}
+        self._lock = Lock()
+
+    def table(self, period: datetime, layer: str, value=None) -> pd.DataFrame:
+        """
+        Выполнение плана среза
+        :param layer: имя разреза "В целом по компании", "Подразделение", "Регион", "Менеджер"
+        :param value: значение разреза, для "В целом по компании" - None
+        :return: dataframe с колонками Группа, Факт, План, Отклонение, Выполнение;
+            attrs['loaded_at'] - время загрузки продаж, attrs['stale'] - последняя загрузка из 1С не удалась
+        """
+        state = self._refresh(period)
+        try:
+            _df = state.cube.loc[(layer, value or '')].reset_index()
+        except KeyError:
+            _df = pd.DataFrame(columns=['Группа', 'Факт', 'План', 'Отклонение', 'Выполнение'])
+        _df.attrs.update(loaded_at=state.loaded_at, stale=state.stale)
+        return _df
+
+    def values(self, period: datetime, layer: str) -> list:
+        """
+        :return: отсортированные значения разреза, по которым есть продажи или планы
+        """
+        cube = self._refresh(period).cube
+        if layer not in cube.index.get_level_values(0):
+            return []
+        return [value for value in cube.loc[layer].index.get_level_values(0).unique() if value != '']
+
+    def _refresh(self, period: datetime) -> _PeriodCube:
+        with self._lock:
+            state = self._periods.setdefault((period.year, period.month), _PeriodCube())
+        with state.lock:
+            if state.facts is None:
+                # первая загрузка периода: показать пока нечего, поэтому продажи загружаются сразу
+                self._apply(state, period, True, self._sales(state, period, True))
+            else:
+                self._refresh_in_background(state, period)
+
+            snapshots = tuple(self.program_worker.program_snapshot(period, layer) for layer in LAYERS)
+            if state.cube is None or state.facts is not state.cube_facts or \
+                    any(snapshot is not old for snapshot, old in zip(snapshots, state.snapshots)):
+                state.snapshots = snapshots
+                state.cube_facts = state.facts
+                state.cube = fulfillment(state.facts, plans_frame(dict(zip(LAYERS, snapshots))))
+            return state
+
+    def _refresh_in_background(self, state: _PeriodCube, period: datetime) -> None:
+        """
+        Когда подошло время, загружает продажи в фоновом потоке, если они еще не загружаются. Пока идет запрос
+        к 1С, страница получает куб из последних загруженных продаж. Вызывается под state.lock.
+        """
+        now = time.monotonic()
+        if now - state.full_loaded >= self.full_refresh_interval:
+            full = True
+        elif now - state.loaded >= self.refresh_interval:
+            full = False
+        else:
+            return
+        if state.refreshing is not None and state.refreshing.is_alive():
+            return
+
+        def refresh():
+            sales = self._sales(state, period, full)
+            with state.lock:
+                self._apply(state, period, full, sales)
+
+        state.refreshing = Thread(target=refresh, name=f'sales-{period:%Y-%m}', daemon=True)
+        state.refreshing.start()
+
+    def _sales(self, state: _PeriodCube, period: datetime, full: bool) -> pd.DataFrame | None:
+        """
+        Загружает продажи периода полностью или только новые после state.last_sale
+        :return: None - 1С недоступна
+        """
+        first_day = period.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        start = first_day - timedelta(seconds=1) if full or state.last_sale is None else state.last_sale
+        end = end_of_month(period).replace(microsecond=0)
+        now = time.monotonic()
+        state.loaded = now
+        if full:
+            state.full_loaded = now
+        return self.program_worker.sales(start, end)
+
+    def _apply(self, state: _PeriodCube, period: datetime, full: bool, sales: pd.DataFrame | None) -> None:
+        """
+        Заменяет продажи куба загруженными полностью или прибавляет к ним новые. Вызывается под state.lock.
+        """
+        if sales is None:
+            self.logger.error(f'{period:%m.%Y}: продажи не загружены, показаны данные от {state.loaded_at}')
+            state.stale = True
+            if state.facts is None:
+                state.facts = rollup_sales(pd.DataFrame(columns=['Группа', 'Подразделение', 'Регион', 'Менеджер',
+                                                                 'Факт']))
+            return
+
+        state.stale = False
+        state.loaded_at = datetime.now()
+        if not sales.empty:
+            last_sale = sales['ПоследняяПродажа'].max()
+            state.last_sale = last_sale if state.last_sale is None or full else max(state.last_sale, last_sale)
+        elif full:
+            state.last_sale = None
+        delta = rollup_sales(_normalize(sales))
+        if full:
+            state.facts = delta
+        elif not delta.empty:
+            state.facts = state.facts.add(delta, fill_value=0.)
+
+
+def _normalize(sales: pd.DataFrame) -> pd.DataFrame:
+    sales = sales.copy()
+    for column, default in [('Подразделение', DEFAULT_SUBDIVISION), ('Регион', DEFAULT_REGION), ('Менеджер', '')]:
+        sales[column] = sales[column].fillna('').replace('', default)
+    sales['Группа'] = sales['Группа'].fillna('')
+    return sales
+
+
+fulfillment_cube = FulfillmentCube(program_worker, settings.sales_refresh_interval,
+                                   settings.sales_full_refresh_interval)
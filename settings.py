@@ -0,0 +1,105 @@
+"""
+Настройки приложения. Значения читаются из переменных окружения с префиксом LK_ (LK_REDIS_HOST, LK_SERVER, ...),
+параметры подключения к 1С по умолчанию берутся из модуля env.
+"""
+from dataclasses import dataclass, fields
+import os
+import tempfile
+
+try:
+    import env
+except ImportError:
+    env = None
+
+ENV_PREFIX = 'LK_'
+
+
+def _from_env_module(name: str, default=''):
+    return getattr(env, name, default)
+
+
+@dataclass(frozen=True)
+class Settings:
+    # Redis
+    redis_host: str = '192.168.19.18'
+    redis_max_connections: int = 20
+    redis_pool_timeout: float = 2
+    redis_connect_timeout: float = 2
+    redis_socket_timeout: float = 5
+    redis_health_check_interval: int = 30
+
+    # кэши RedisWorker
+    cache_ttl: float = 3600
+    graph_cache_bytes: int = 64 * 1024 * 1024
+    # объем графиков среза, заранее отправляемых в браузер. Ответ Dash не сжимается: 2 МБ - около 2 с на канале
+    # 10 Мбит/с, графики сверх объема загружаются по одному при выборе группы
+    graph_prefetch_bytes: int = 2 * 1024 * 1024
+
+    # облегчение графиков (figures.py)
+    figure_digits: int = 6  # значащих цифр в числах графика, 0 - без округления
+    figure_strip_template: bool = True  # удалять шаблон оформления plotly
+    figure_max_points: int = 0  # прореживать линии длиннее стольких точек, 0 - без прореживания
+    figure_max_bytes: int = 512 * 1024  # при большем размере JSON линии графика прореживаются, 0 - без ограничения
+
+    # 1С
+    server: str = _from_env_module('SERVER')
+    base: str = _from_env_module('BASE')
+    set_program_route: str = _from_env_module('SET_PROGRAM_ROUTE')
+    get_query_route: str = _from_env_module('GET_QUERY_ROUTE')
+    user: str = _from_env_module('USER')
+    password: str = _from_env_module('PASSWORD')
+    api_key: str = _from_env_module('API_KEY')
+    connect_timeout_1c: float = 3
+    read_timeout_1c: float = 60
+    compress_1c: bool = False  # сжимать тело запросов к 1С gzip
+    breaker_failures: int = 3  # ошибок подряд, после которых запросы к 1С приостанавливаются
+    breaker_recovery: float = 30  # секунд до пробного запроса к 1С после приостановки
+
+    # ProgramWorker
+    max_workers: int = 8
+    retries: int = 3
+    backoff: float = 0.5
+    snapshot_ttl: float = 60
+
+    # выполнение плана
+    sales_refresh_interval: float = 300  # секунд между дозагрузками новых продаж из 1С
+    sales_full_refresh_interval: float = 3600  # секунд между полными перезагрузками продаж периода
+
+    # метрики
+    metrics_trace: bool = False  # писать в журнал время участков каждого запроса Dash
+    metrics_dir: str = os.path.join(tempfile.gettempdir(), 'lk_sales_program_metrics')  # метрики процессов gunicorn
+
+    # фоновые задачи Dash
+    background_cache_dir: str = os.path.join(tempfile.gettempdir(), 'lk_sales_program_jobs')
+
+    # gunicorn
+    bind: str = '127.0.0.1:8002'
+    workers: int = 5
+    threads: int = 4
+    worker_timeout: int = 120
+    graceful_timeout: int = 30
+    max_requests: int = 1000  # после стольких запросов worker плавно перезапускается
+    max_requests_jitter: int = 100
+    warmup_on_start: bool = True
+    warmup_workers: int = 4  # параллельных загрузок при прогреве кэшей
+    warmup_interval: float = 60  # секунд между проверками публикации нового прогноза
+
+    @classmethod
+    def from_env(cls, environ=None) -> 'Settings':
+        """
+        :param environ: словарь переменных окружения, по умолчанию os.environ
+        """
+        environ = os.environ if environ is None else environ
+        values = {}
+        for field in fields(cls):
+            value = environ.get(ENV_PREFIX + field.name.upper())
+            if value is None:
+                continue
+            if field.type is bool:
+                values[field.name] = value.lower() in ('1', 'true', 'yes')
+            else:
+                values[field.name] = field.type(value)
+        return cls(**values)
+
+
+settings = Settings.from_env()
@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+ROLLUP_INDEX = ['Разрез', 'Значение']
+
+
+def round_forecast(values: pd.Series) -> pd.Series:
+    """
+    Округляет прогноз в зависимости от величины: < 0 - 0, до 5 - 3 знака, до 10 - 2 знака, до 100 - 1 знак,
+    от 100 - до целого. Результат совпадает со встроенной round() поэлементно.
+    :param values: серия с числами
+    :return: серия с округленными числами
+    """
+    x = values.to_numpy(dtype=float)
+    conditions = [x < 0, (x > 0) & (x < 5), (x >= 5) & (x < 10), (x >= 10) & (x < 100), x >= 100]
+    choices = [np.zeros_like(x), _round(x, 3), _round(x, 2), _round(x, 1), _round(x, 0)]
+    return pd.Series(np.select(conditions, choices, default=x), index=values.index, name=values.name)
+
+
+def _round(x: np.ndarray, ndigits: int) -> np.ndarray:
+    """
+    np.round округляет x * 10^ndigits, поэтому расходится со встроенной round() на числах, у которых
+    произведение попало ровно на половину. Такие числа округляются встроенной round().
+    """
+    scaled = x * 10 ** ndigits
+    result = np.rint(scaled) / 10 ** ndigits
+    ties = np.flatnonzero(scaled - np.floor(scaled) == 0.5)
+    if len(ties):
+        result[ties] = [round(value, ndigits) for value in x[ties].tolist()]
+    return result
+
+
+def forecast_table(gfd: pd.DataFrame) -> pd.DataFrame:
+    """
+    Сворачивает таблицу прогноза по группам и округляет прогноз и RMSE
+    :param gfd: таблица прогноза среза из Redis
+    """
+    by = ['Группа', 'Прогноз', 'RMSE']
+    if gfd[by].isna().any(axis=None) or gfd.duplicated(subset=by).any():
+        gfd = gfd.groupby(by=by, as_index=False).max()
+    else:
+        # без повторов группировка только сортирует строки, а медленный max по текстовым колонкам не нужен
+        gfd = gfd.sort_values(by=by, kind='stable', ignore_index=True)
+        gfd = gfd[by + [col for col in gfd.columns if col not in by]]
+    gfd['Прогноз'] = round_forecast(gfd['Прогноз'])
+    gfd['RMSE'] = round_forecast(gfd['RMSE'])
+    return gfd
+
+
+def forecast_rollup(tables: dict) -> pd.DataFrame:
+    """
+    Сворачивает и округляет таблицы прогноза всех срезов за один проход. Результат по каждому срезу совпадает
+    с forecast_table: срезы с повторами или пропусками группируются с max, остальные только сортируются.
+    :param tables: {(разрез, значение разреза): таблица прогноза из RedisWorker}, для "В целом по компании"
+        значение None
+    :return: dataframe с индексом (Разрез, Значение), значение "В целом по компании" - пустая строка
+    """
+    by = ['Группа', 'Прогноз', 'RMSE']
+    frames = [gfd.assign(Разрез=layer, Значение='' if value is None else value)
+              for (layer, value), gfd in tables.items() if not gfd.empty]
+    if not frames:
+        return pd.DataFrame(columns=[*ROLLUP_INDEX, *by]).set_index(ROLLUP_INDEX)
+    rollup = pd.concat(frames, ignore_index=True)
+    keys = [*ROLLUP_INDEX, *by]
+    dirty = rollup[by].isna().any(axis=1) | rollup.duplicated(subset=keys)
+    dirty = dirty.groupby([rollup['Разрез'], rollup['Значение']]).transform('any')
+    if dirty.any():
+        rollup = pd.concat([rollup[~dirty], rollup[dirty].groupby(by=keys, as_index=False).max()],
+                           ignore_index=True)
+    rollup = rollup.sort_values(by=keys, kind='stable', ignore_index=True)
+    rollup = rollup[keys + [col for col in rollup.columns if col not in keys]]
+    rollup['Прогноз'] = round_forecast(rollup['Прогноз'])
+    rollup['RMSE'] = round_forecast(rollup['RMSE'])
+    return rollup.set_index(ROLLUP_INDEX)
+
+
+def rollup_slice(rollup: pd.DataFrame, layer: str, value=None) -> pd.DataFrame:
+    """
+    Таблица среза из forecast_rollup, как после forecast_table. Для отсутствующего среза - пустой dataframe.
+    """
+    try:
+        # индекс отсортирован, поэтому срез находится по границам без просмотра строк
+        loc = rollup.index.get_loc((layer, '' if value is None else value))
+    except KeyError:
+        return pd.DataFrame()
+    if isinstance(loc, int):
+        loc = slice(loc, loc + 1)
+    return rollup.iloc[loc].reset_index(drop=True)
+
+
+def merge_program(gfd: pd.DataFrame, df_program: pd.DataFrame) -> pd.DataFrame:
+    """
+    Добавляет к таблице прогноза колонки План и Отклонение из планов 1С. Для групп без плана - 0.
+    :param gfd: таблица прогноза с колонкой Группа
+    :param df_program: dataframe с колонками Группа, План, Отклонение
+    """
+    if 'Группа' in df_program.columns:
+        df_program = df_program.drop_duplicates(subset='Группа').set_index('Группа')
+    for col in ['План', 'Отклонение']:
+        if col in df_program.columns:
+            values = gfd['Группа'].map(df_program[col]).fillna(0)
+            if pd.api.types.is_integer_dtype(df_program[col]):
+                values = values.astype(df_program[col].dtype)
+            gfd[col] = values
+        else:
+            gfd[col] = 0
+    return gfd
+
+
+def forecast_programs(gfd: pd.DataFrame, **layer_kwargs) -> list:
+    """
+    Формирует список планов для ProgramWorker.set_program, план и отклонение берутся из прогноза
+    :param gfd: таблица из forecast_table
+    :param layer_kwargs: значение разреза, например manager='Иванов Иван Иванович'
+    """
+    programs = pd.DataFrame({
+        'group': gfd['Группа'],
+        'forecast': gfd['Прогноз'],
+        'rmse': gfd['RMSE'],
+        'program': gfd['Прогноз'],
+        'deviation': gfd['RMSE'],
+    })
+    for key, value in layer_kwargs.items():
+        programs[key] = value
+    return programs.to_dict('records')
+
+
+def program_checksums(plans: pd.Series, deviations: pd.Series) -> pd.Series:
+    """
+    Контрольные суммы строк плана: строки с одинаковыми планом и отклонением совпадают независимо от типа чисел,
+    пустые значения считаются нулями, как в merge_program
+    :return: серия uint64 с индексом plans
+    """
+    values = pd.DataFrame({
+        'План': pd.to_numeric(plans, errors='coerce').astype(float).fillna(0.).round(6) + 0.,
+        'Отклонение': pd.to_numeric(deviations, errors='coerce').astype(float).fillna(0.).round(6) + 0.,
+    })
+    return pd.util.hash_pandas_object(values, index=False).set_axis(plans.index)
@@ -0,0 +1,38 @@
+"""
+Построчная сборка таблицы планов, как в fill_tbl до перехода на tables.py: эталон для тестов и бенчмарков
+"""
+import pandas as pd
+
+
+def legacy_round_forecast(x):
+    if x < 0:
+        return 0
+    elif 5 > x > 0:
+        return round(x, 3)
+    elif 10 > x >= 5:
+        return round(x, 2)
+    elif 100 > x >= 10:
+        return round(x, 1)
+    elif x >= 100:
+        return round(x, 0)
+    else:
+        return x
+
+
+def legacy_fill(gfd: pd.DataFrame, df_program: pd.DataFrame) -> pd.DataFrame:
+    def value(group, col):
+        try:
+            return df_program.at[df_program[df_program['Группа'] == group].index[0], col]
+        except (IndexError, KeyError):
+            return 0
+
+    gfd = gfd.groupby(by=['Группа', 'Прогноз', 'RMSE'], as_index=False).max()
+    gfd['Прогноз'] = gfd['Прогноз'].apply(legacy_round_forecast)
+    gfd['RMSE'] = gfd['RMSE'].apply(legacy_round_forecast)
+    gfd['План'] = 0
+    gfd['Отклонение'] = 0
+    for i in range(len(gfd)):
+        group = gfd.at[i, 'Группа']
+        gfd.at[i, 'План'] = value(group, 'План')
+        gfd.at[i, 'Отклонение'] = value(group, 'Отклонение')
+    return gfd
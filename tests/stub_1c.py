@@ -0,0 +1,69 @@
+"""
+Локальная заглушка HTTP сервисов 1С free_query и set_program для тестов и бенчмарков
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from threading import Thread
+import gzip
+import json
+import time
+
+BASE = 'base'
+QUERY_ROUTE = '/hs/storehouse/free_query'
+SET_PROGRAM_ROUTE = '/hs/sales_program/set_program'
+
+
+class Stub1C:
+    """
+    :param query_handler: функция query_handler(текст запроса) -> список строк результата
+        или строка, которая отдается как есть
+    :param set_program_status: HTTP код ответа set_program или функция set_program_status(тело запроса) -> код
+    :param delay: задержка ответа в секундах
+    :param port: порт сервера, по умолчанию - любой свободный
+    """
+
+    def __init__(self, query_handler=None, set_program_status: int = 200, delay: float = 0, port: int = 0):
+        self.query_handler = query_handler or (lambda query: [])
+        self.set_program_status = set_program_status
+        self.delay = delay
+        self.requests = []  # (route, заголовки, размер тела, разобранное тело)
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                raw_size = len(body)
+                if self.headers.get('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(body)
+                payload = json.loads(body)
+                stub.requests.append((self.path, dict(self.headers), raw_size, payload))
+                time.sleep(stub.delay)
+
+                if self.path == f'/{BASE}{QUERY_ROUTE}':
+                    data = stub.query_handler(payload['query'])
+                    status, response = 200, data if isinstance(data, str) else json.dumps({'data': data})
+                elif self.path == f'/{BASE}{SET_PROGRAM_ROUTE}':
+                    status = stub.set_program_status
+                    if callable(status):
+                        status = status(payload)
+                    response = '' if status == 200 else 'Ошибка записи плана'
+                else:
+                    status, response = 404, ''
+                response = response.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Length', str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.address = f'127.0.0.1:{self.server.server_port}'
+
+    def __enter__(self):
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
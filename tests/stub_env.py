@@ -0,0 +1,30 @@
+"""
+Заглушка модуля env (параметры подключения к 1С и пользователи), который не хранится в репозитории.
+Нужна, чтобы импортировать app и wsgi в подпроцессе на чистой копии проекта.
+"""
+import os
+
+ENV_SOURCE = '''\
+SERVER = '127.0.0.1:1'
+BASE = 'base'
+SET_PROGRAM_ROUTE = '/hs/sales_program/set_program'
+GET_QUERY_ROUTE = '/hs/storehouse/free_query'
+USER = 'user'
+PASSWORD = 'password'
+API_KEY = 'key'
+VALID_USERNAME_PASSWORD_PAIRS = {'user': 'password'}
+'''
+
+
+def stub_env_environ(directory: str, environ: dict = None) -> dict:
+    """
+    Записывает заглушку env.py в directory и добавляет его в конец PYTHONPATH: настоящий env.py в каталоге
+    проекта, если он есть, импортируется раньше заглушки
+    :param environ: переменные окружения подпроцесса, по умолчанию os.environ
+    :return: переменные окружения подпроцесса
+    """
+    with open(os.path.join(directory, 'env.py'), 'w', encoding='utf-8') as file:
+        file.write(ENV_SOURCE)
+    environ = dict(os.environ if environ is None else environ)
+    environ['PYTHONPATH'] = os.pathsep.join(filter(None, [environ.get('PYTHONPATH'), directory]))
+    return environ
@@ -0,0 +1,54 @@
+from cache import LRUCache
+import time
+
+
+def test_lru_eviction():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.hits == 3
+    assert cache.misses == 1
+
+
+def test_ttl():
+    cache = LRUCache(maxsize=2, ttl=0.05)
+    cache.set('a', 1)
+    assert cache.get('a') == 1
+    time.sleep(0.1)
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_clear():
+    cache = LRUCache()
+    cache.set('a', 1)
+    cache.clear()
+    assert cache.get('a') is None
+    assert cache.info() == {'hits': 0, 'misses': 1, 'size': 0, 'maxsize': 256, 'bytes': 0, 'maxbytes': None}
+
+
+def test_maxbytes_eviction():
+    cache = LRUCache(maxsize=10, maxbytes=100)
+    cache.set('a', 1, size=60)
+    cache.set('b', 2, size=30)
+    assert cache.get('a') == 1
+    cache.set('c', 3, size=40)
+    assert cache.get('b') is None
+    assert cache.currbytes == 100
+    cache.set('a', 4, size=10)
+    assert cache.currbytes == 50
+
+
+def test_replace():
+    cache = LRUCache(ttl=0.1, maxbytes=100)
+    cache.set('a', 1, size=10)
+    assert cache.replace('a', 2) and cache.get('a') == 2 and cache.sizeof('a') == 10
+    assert not cache.replace('b', 1) and cache.get('b') is None
+    time.sleep(0.1)
+    # время жизни не продлевается заменой
+    assert not cache.replace('a', 3) and cache.get('a') is None
@@ -0,0 +1,164 @@
+from client_1c import Client1C, CircuitBreaker
+from data_methods import ProgramWorker
+from datetime import datetime
+from tests.stub_1c import Stub1C, BASE, QUERY_ROUTE, SET_PROGRAM_ROUTE
+import pytest
+import requests
+from threading import Event
+import time
+
+
+def create_client(stub: Stub1C, **kwargs) -> Client1C:
+    return Client1C(stub.address, BASE, 'user', 'password', 'key', QUERY_ROUTE, SET_PROGRAM_ROUTE, **kwargs)
+
+
+def test_query():
+    with Stub1C(lambda query: [{'Группа': 'a', 'План': 1, 'Отклонение': 2}]) as stub:
+        response = create_client(stub).query('ВЫБРАТЬ 1')
+    assert response.json() == {'data': [{'Группа': 'a', 'План': 1, 'Отклонение': 2}]}
+    path, headers, raw_size, payload = stub.requests[0]
+    assert payload == {'api_key': 'key', 'query': 'ВЫБРАТЬ 1'}
+    assert 'Content-Encoding' not in headers
+
+
+def test_compact_and_compressed_body():
+    program = [{'group': f'Группа {i}', 'program': i} for i in range(200)]
+    with Stub1C() as stub:
+        assert create_client(stub).set_program({'program': program}).status_code == 200
+        assert create_client(stub, compress=True).set_program({'program': program}).status_code == 200
+    (_, _, plain_size, plain), (_, headers, compressed_size, compressed) = stub.requests
+    assert plain == compressed == {'program': program}
+    assert headers['Content-Encoding'] == 'gzip'
+    assert compressed_size < plain_size / 4
+
+
+def test_read_timeout():
+    with Stub1C(delay=0.5) as stub:
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            create_client(stub, read_timeout=0.1).query('ВЫБРАТЬ 1')
+
+
+def test_program_worker():
+    rows = [{'Значение': 'Иванов Иван', 'Группа': 'a', 'План': 1, 'Отклонение': 2}]
+    with Stub1C(lambda query: rows) as stub:
+        program_worker = ProgramWorker(client=create_client(stub))
+        df = program_worker.get_program(datetime(2022, 7, 1), manager='Иванов Иван')
+        assert df.to_dict('records') == [{'Группа': 'a', 'План': 1, 'Отклонение': 2}]
+        assert program_worker.set_program('Менеджер', datetime(2022, 7, 1), []) is None
+        stub.set_program_status = 500
+        assert program_worker.set_program('Менеджер', datetime(2022, 7, 1), []) == 'Ошибка записи плана'
+    assert stub.requests[1][3] == {'layer': 'Менеджер', 'period': '01.07.2022', 'program': []}
+
+
+def test_set_program_while_1c_down():
+    period = datetime(2022, 7, 1)
+    with Stub1C(set_program_status=503) as stub:
+        program_worker = ProgramWorker(client=create_client(stub, breaker=CircuitBreaker(1, recovery_timeout=60)))
+        assert program_worker.set_program('Менеджер', period, [], only_changed=False) == 'Ошибка записи плана'
+        # автомат разомкнут: запрос не отправляется, ошибка возвращается, а не выбрасывается
+        error = program_worker.set_program('Менеджер', period, [], only_changed=False)
+        assert error.startswith('CircuitOpenError: 1С недоступна') and len(stub.requests) == 1
+        address = stub.address
+    program_worker = ProgramWorker(client=Client1C(address, BASE, 'user', 'password', 'key', QUERY_ROUTE,
+                                                   SET_PROGRAM_ROUTE, connect_timeout=0.5))
+    assert program_worker.set_program('Менеджер', period, [], only_changed=False).startswith('ConnectionError')
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.2)
+    breaker.failure()
+    assert breaker.allow()
+    breaker.failure()
+    assert not breaker.allow() and breaker.retry_in() > 0
+    time.sleep(0.2)
+    assert breaker.allow()  # пробный запрос
+    assert not breaker.allow()
+    breaker.failure()
+    assert not breaker.allow()
+    time.sleep(0.2)
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.closed and breaker.allow()
+
+
+def test_stale_program_while_1c_down():
+    rows = [{'Значение': 'Иванов Иван', 'Группа': 'a', 'План': 1, 'Отклонение': 2}]
+    down = Event()
+
+    def query_handler(query):
+        if down.is_set():
+            raise RuntimeError('1С недоступна')  # заглушка разрывает соединение без ответа
+        return rows
+
+    def wait_for(condition):
+        deadline = time.monotonic() + 5
+        while not condition() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert condition()
+
+    period = datetime(2022, 7, 1)
+    with Stub1C(query_handler) as stub:
+        program_worker = ProgramWorker(snapshot_ttl=0.1,
+                                       client=create_client(stub, breaker=CircuitBreaker(1, recovery_timeout=0.3)))
+        program_worker.refresh_backoff = 0.1
+        df = program_worker.get_program(period, manager='Иванов Иван')
+        assert not df.attrs['stale']
+
+        down.set()
+        time.sleep(0.1)
+        df = program_worker.get_program(period, manager='Иванов Иван')
+        assert df.to_dict('records') == [{'Группа': 'a', 'План': 1, 'Отклонение': 2}]
+        wait_for(lambda: program_worker.is_stale(period, 'Менеджер'))
+        assert not program_worker.client.breaker.closed
+
+        start = time.monotonic()
+        df = program_worker.get_program(period, manager='Иванов Иван')
+        assert time.monotonic() - start < 0.1
+        assert df.attrs['stale'] and df.to_dict('records') == [{'Группа': 'a', 'План': 1, 'Отклонение': 2}]
+
+        rows = [{'Значение': 'Иванов Иван', 'Группа': 'a', 'План': 5, 'Отклонение': 2}]
+        down.clear()
+        wait_for(lambda: not program_worker.is_stale(period, 'Менеджер'))
+        df = program_worker.get_program(period, manager='Иванов Иван')
+        assert not df.attrs['stale'] and df['План'].tolist() == [5]
+
+
+def test_breaker_ignores_application_errors():
+    managers = [f'Менеджер {i}' for i in range(43)]
+    failing = set(managers[::15])
+
+    def set_program_status(payload):
+        return 500 if payload['program'][0]['manager'] in failing else 200
+
+    slices = [('Менеджер', manager, [{'group': 'a', 'forecast': 1, 'rmse': 1, 'program': 1, 'deviation': 1,
+                                      'manager': manager}]) for manager in managers]
+    with Stub1C(set_program_status=set_program_status) as stub:
+        program_worker = ProgramWorker(retries=2, backoff=0.01, client=create_client(stub))
+        summary = program_worker.set_programs(datetime(2022, 7, 1), slices, only_changed=False)
+        assert program_worker.client.breaker.closed
+        stub.set_program_status = 503
+        program_worker.set_programs(datetime(2022, 7, 1), slices[:1], only_changed=False)
+        assert not program_worker.client.breaker.closed
+    assert len(summary['sent']) == 40
+    assert summary['failed'] == {('Менеджер', manager): 'Ошибка записи плана' for manager in failing}
+
+
+def test_refresh_backoff():
+    attempts = []
+
+    def query_handler(query):
+        attempts.append(time.monotonic())
+        return 'Сеанс 1С завершен'  # ответ не JSON: автомат не размыкается
+
+    period = datetime(2022, 7, 1)
+    with Stub1C(query_handler) as stub:
+        program_worker = ProgramWorker(client=create_client(stub))
+        program_worker.refresh_backoff = 0.2
+        program_worker._last_snapshots[(period.year, period.month, 'Менеджер')] = {}
+        program_worker.program_snapshot(period, 'Менеджер')
+        deadline = time.monotonic() + 5
+        while len(attempts) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    # первая попытка сразу, следующие - через удваивающуюся паузу, а не все попытки подряд
+    assert len(attempts) >= 3
+    assert attempts[1] - attempts[0] >= 0.2 and attempts[2] - attempts[1] >= 0.4
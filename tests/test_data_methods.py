@@ -0,0 +1,115 @@
+from data_methods import OptionIndex, RedisWorker
+from settings import Settings
+from upgraded_redis import dumps, InstrumentedConnectionPool
+from redis.exceptions import ConnectionError as RedisConnectionError
+import json
+import pytest
+import time
+
+
+def test_option_index():
+    index = OptionIndex(['Кибиткин Анатолий Игоревич', 'Иванов Иван', '', None, 'Иванов Иван', 'Анатольев Пётр'])
+    assert index.values == ['Анатольев Пётр', 'Иванов Иван', 'Кибиткин Анатолий Игоревич']
+    assert 'Иванов Иван' in index
+    assert 'Петров' not in index
+    assert index.search('ана') == ['Анатольев Пётр', 'Кибиткин Анатолий Игоревич']
+    assert index.search('иванов и') == ['Иванов Иван']
+    assert index.search('', limit=1) == ['Анатольев Пётр']
+    assert index.search('zzz') == []
+
+
+def test_settings_from_env():
+    settings = Settings.from_env({'LK_REDIS_HOST': 'localhost', 'LK_REDIS_SOCKET_TIMEOUT': '0.5',
+                                  'LK_MAX_WORKERS': '2'})
+    assert settings.redis_host == 'localhost'
+    assert settings.redis_socket_timeout == 0.5
+    assert settings.max_workers == 2
+    assert settings.retries == Settings.retries
+
+
+def test_graphs():
+    fakeredis = pytest.importorskip('fakeredis')
+    import redis
+    pool = redis.ConnectionPool(connection_class=fakeredis.FakeConnection, server=fakeredis.FakeServer())
+    worker = RedisWorker(connection_pool=pool, binary_format=True)
+    figure = {'data': [{'type': 'scatter', 'x': list(range(100)), 'y': list(range(100))}], 'layout': {}}
+    for group in ['a', 'b', 'c']:
+        worker.set(f'prophet,{group},None,None,Иванов,graph', dumps({'data': json.dumps(figure)}))
+
+    figures = worker.graphs(['a', 'b', 'c', 'нет графика'], manager='Иванов')
+    assert figures == {'a': figure, 'b': figure, 'c': figure, 'нет графика': {'data': [], 'layout': {}}}
+    assert worker.main_graph('b', as_dict=True, manager='Иванов') is figures['b']
+
+    worker.graph_cache.clear()
+    size = len(json.dumps(figure))
+    assert list(worker.graphs(['a', 'b', 'c'], max_bytes=2 * size, manager='Иванов')) == ['a', 'b']
+    # ограничение применяется в порядке групп к закэшированным и загруженным графикам
+    assert list(worker.graphs(['c', 'a', 'b'], max_bytes=size, manager='Иванов')) == ['c']
+    assert list(worker.graphs(['a', 'c'], max_bytes=size, manager='Иванов')) == ['a']
+
+    # Redis недоступен: закэшированные графики отдаются, вместо незагруженных не подставляются пустые
+    worker.graph_cache.clear()
+    worker.graphs(['a', 'c'], manager='Иванов')
+    worker._unavailable_until = time.monotonic() + 60
+    assert worker.graphs(['a', 'c'], manager='Иванов') == {'a': figure, 'c': figure}
+    assert worker.graphs(['a', 'b'], manager='Иванов') is None
+
+
+def test_fail_fast():
+    fakeredis = pytest.importorskip('fakeredis')
+
+    class UnreachableConnection(fakeredis.FakeConnection):
+        connects = 0
+
+        def connect(self):
+            UnreachableConnection.connects += 1
+            raise RedisConnectionError('Error 111 connecting to redis. Connection refused.')
+
+    server = fakeredis.FakeServer()
+    pool = InstrumentedConnectionPool(connection_class=fakeredis.FakeConnection, server=server, max_connections=1,
+                                      timeout=0.05)
+    worker = RedisWorker(connection_pool=pool)
+    worker.set('key', b'value')
+
+    # пул исчерпан: команда не выполняется, но Redis не считается недоступным
+    connection = pool.get_connection('GET')
+    assert worker.get('key') is None
+    pool.release(connection)
+    assert worker.get('key') == b'value'
+    assert pool.info()['exhausted'] == 1
+
+    # Redis недоступен: retry_after секунд команды не обращаются к Redis
+    worker = RedisWorker(connection_pool=InstrumentedConnectionPool(connection_class=UnreachableConnection,
+                                                                    server=server, max_connections=1, timeout=0.05))
+    assert worker.get('key') is None
+    connects = UnreachableConnection.connects
+    assert worker.get('key') is None and worker.mget(['key']) is None
+    assert UnreachableConnection.connects == connects
+    worker._unavailable_until = 0.
+    assert worker.get('key') is None
+    assert UnreachableConnection.connects > connects
+
+
+def test_rollup_options_not_loaded():
+    fakeredis = pytest.importorskip('fakeredis')
+    import redis
+    from benchmarks.seed import SCALES, first_period, layer_values, seed_redis
+    from upgraded_redis import UpgradedRedis
+    scale = SCALES['small']
+    pool = redis.ConnectionPool(connection_class=fakeredis.FakeConnection, server=fakeredis.FakeServer())
+    seed_redis(UpgradedRedis(connection_pool=pool, binary_format=True), scale)
+    worker = RedisWorker(connection_pool=pool, binary_format=True)
+    manager = layer_values(scale)['manager'][0]
+
+    # список менеджеров не прочитан (например, пул соединений исчерпан): остальные срезы строятся,
+    # но свертка без менеджеров не кэшируется
+    get = worker.get
+    worker.get = lambda key, *args, **kwargs: None if key == 'manager' else get(key, *args, **kwargs)
+    assert worker.option_index('Менеджер') is None and worker.options('Менеджер') == []
+    assert worker.forecast_slice(first_period(), 'Менеджер', manager).empty
+    assert not worker.forecast_slice(first_period(), 'Регион', layer_values(scale)['region'][0]).empty
+
+    worker.get = get
+    assert len(worker.option_index('Менеджер')) == scale.managers
+    assert not worker.forecast_slice(first_period(), 'Менеджер', manager).empty
+    assert len(worker.rollup_cache) == 1
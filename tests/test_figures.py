@@ -0,0 +1,81 @@
+from figures import slim_figure, round_significant, lttb, downsample_lines, SlimOptions
+import json
+import numpy as np
+
+
+def line_figure(n: int) -> dict:
+    x = list(range(n))
+    y = (np.sin(np.linspace(0, 20, n)) * 1000 / 3).tolist()
+    y[n // 3] = 5000.
+    return {
+        'data': [
+            {'type': 'scatter', 'mode': 'lines', 'x': x, 'y': y},
+            {'type': 'scatter', 'mode': 'lines', 'x': x, 'y': [v + 100 for v in y], 'fill': 'tonexty'},
+            {'type': 'scatter', 'mode': 'markers', 'x': x, 'y': y},
+        ],
+        'layout': {'title': {'text': 'График'}, 'template': {'layout': {'font': {'size': 12}}}},
+    }
+
+
+def test_round_significant():
+    assert round_significant([1 / 3, 123456.789, 0., -0.000123456789], 4) == [0.3333, 123500., 0., -0.0001235]
+    assert round_significant([1, 2], 4) == [1, 2]
+    assert round_significant(['a', 1.5], 4) == ['a', 1.5]
+    assert round_significant([1.23456, float('nan')], 3)[0] == 1.23
+
+
+def test_slim_figure():
+    figure = line_figure(50)
+    slim, size = slim_figure(figure, SlimOptions(digits=3))
+    assert 'template' not in slim['layout'] and 'template' in figure['layout']
+    assert slim['data'][0]['y'][1] == float(f"{figure['data'][0]['y'][1]:.3g}")
+    assert size == len(json.dumps(slim)) < len(json.dumps(figure))
+
+    same, _ = slim_figure(figure, SlimOptions(digits=0, strip_template=False))
+    assert same == figure
+
+
+def test_lttb():
+    y = np.sin(np.linspace(0, 20, 1000))
+    y[333] = 10.
+    indices = lttb(y, 100)
+    assert len(indices) == 100 and indices[0] == 0 and indices[-1] == 999
+    assert 333 in indices
+    assert (np.diff(indices) > 0).all()
+    assert len(lttb(y[:50], 100)) == 50
+
+
+def test_downsample_lines():
+    figure = line_figure(1000)
+    traces = downsample_lines(figure['data'], 200)
+    assert traces[0]['x'] == traces[1]['x'] and len(traces[0]['x']) < 1000
+    assert max(traces[0]['y']) == 5000.
+    assert traces[2] is figure['data'][2]
+
+
+def test_max_bytes():
+    figure = line_figure(3000)
+    slim, size = slim_figure(figure, SlimOptions(max_bytes=60_000))
+    assert size <= 60_000
+    assert len(slim['data'][0]['x']) < 3000
+    assert len(slim['data'][2]['x']) == 3000
+    assert slim['data'][0]['x'][-1] == 2999
+
+
+def test_figure_bytes():
+    from data_methods import RedisWorker
+    from prometheus_client import REGISTRY
+    from upgraded_redis import dumps
+
+    def observed(stage: str) -> float:
+        return REGISTRY.get_sample_value('lk_figure_bytes_sum', {'graph': 'test_bytes', 'stage': stage}) or 0
+
+    figure = {'data': [{'type': 'scatter', 'name': 'История продаж', 'x': [1, 2], 'y': [3, 4]}], 'layout': {}}
+    stored = json.dumps(figure, ensure_ascii=False)
+    assert len(stored.encode('utf-8')) > len(stored)
+    worker = RedisWorker(slim_options=SlimOptions(digits=0, strip_template=False))
+    original, slim = observed('original'), observed('slim')
+    parsed, size = worker._parse_graph(dumps({'data': stored}), as_dict=True, graph='test_bytes')
+    # оба размера - JSON в байтах, как его отправляет Dash: график, который облегчать нечего, не растет
+    assert parsed == figure
+    assert observed('original') - original == observed('slim') - slim == size == len(json.dumps(figure).encode('utf-8'))
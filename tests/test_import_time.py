@@ -0,0 +1,38 @@
+from tests.stub_env import stub_env_environ
+import os
+import subprocess
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_BUDGET_SECONDS = {'data_methods': 1.5, 'wsgi': 4}
+LAZY_MODULES = ['plotly.express', 'plotly.graph_objects', 'pdb', 'argparse']
+
+
+def import_times(module: str) -> dict:
+    """
+    :return: {модуль: суммарное время импорта в секундах} по выводу python -X importtime
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        environ = stub_env_environ(directory, dict(os.environ, LK_REDIS_HOST='10.255.255.1',
+                                                   LK_SERVER='10.255.255.1'))
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=ROOT,
+                                env=environ, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr.splitlines()[-1:]
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative) / 1_000_000
+    return times
+
+
+@pytest.mark.parametrize('module', ['data_methods', 'wsgi'])
+def test_import_time(module):
+    times = import_times(module)
+    assert times[module] < IMPORT_BUDGET_SECONDS[module]
+    if module == 'data_methods':
+        for lazy_module in LAZY_MODULES:
+            assert lazy_module not in times
@@ -0,0 +1,40 @@
+from metrics import init_app, timed, CALLBACK_SECONDS
+import flask
+import logging
+
+
+def sample(name: str, **labels) -> float:
+    from prometheus_client import REGISTRY
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_timed():
+    @timed(CALLBACK_SECONDS, 'test_callback')
+    def callback(x):
+        return x * 2
+
+    count = sample('lk_callback_seconds_count', callback='test_callback')
+    assert callback(2) == 4
+    assert callback.__name__ == 'callback'
+    assert sample('lk_callback_seconds_count', callback='test_callback') == count + 1
+
+
+def test_dash_requests_and_route(caplog):
+    server = flask.Flask(__name__)
+
+    @server.route('/app/_dash-update-component', methods=['POST'])
+    def update():
+        with_timer = timed(CALLBACK_SECONDS, 'test_update')(lambda: {'response': 'x' * 1000})
+        return flask.jsonify(with_timer())
+
+    init_app(server, '/app/metrics', trace=True)
+    client = server.test_client()
+    with caplog.at_level(logging.INFO, logger='trace'):
+        client.post('/app/_dash-update-component', json={'output': 'tbl.data'})
+    assert sample('lk_dash_request_seconds_count', output='tbl.data') == 1
+    assert sample('lk_dash_response_bytes_sum', output='tbl.data') > 1000
+    assert 'tbl.data' in caplog.text and 'test_update' in caplog.text
+
+    response = client.get('/app/metrics')
+    assert response.status_code == 200
+    assert b'lk_dash_response_bytes_bucket{le="4096.0",output="tbl.data"} 1.0' in response.data
@@ -1,16 +1,38 @@
-from program_worker import ProgramWorker
+from client_1c import Client1C, CircuitBreaker
+from data_methods import ProgramWorker
 from datetime import datetime
+from tests.stub_1c import Stub1C, BASE, QUERY_ROUTE, SET_PROGRAM_ROUTE
 import pandas as pd
 import pytest
-import pdb
 import logging
 
 logger = logging.getLogger(__name__)
 
+VALUES = {
+    'ПоПодразделениям': 'Краснодар, Тополиная, 27/1',
+    'ПоРегионам': 'Направление Краснодар+15км - Динской район',
+    'ПоМенеджерам': 'Кибиткин Анатолий Игоревич',
+}
+
+
+def query_handler(query: str) -> list:
+    """
+    Планы по двум группам: значение разреза определяется по регистру сведений в тексте запроса,
+    колонка Значение есть только в запросах всех планов разреза
+    """
+    rows = [{'Группа': 'О-01.01. Доска', 'План': 10, 'Отклонение': 1},
+            {'Группа': 'О-01.02. Брус', 'План': 20, 'Отклонение': 2}]
+    for register, value in VALUES.items():
+        if register in query and 'КАК Значение' in query:
+            return [{'Значение': value, **row} for row in rows]
+    return rows
+
 
 @pytest.fixture(scope='session')
 def test_program_worker():
-    return ProgramWorker()
+    with Stub1C(query_handler) as stub:
+        client = Client1C(stub.address, BASE, 'user', 'password', 'key', QUERY_ROUTE, SET_PROGRAM_ROUTE)
+        yield ProgramWorker(client=client)
 
 
 def test_get_program(test_program_worker):
@@ -38,3 +60,238 @@ def test_get_program(test_program_worker):
     assert 'Группа' in df_manager.columns
     assert 'План' in df_manager.columns
     assert 'Отклонение' in df_manager.columns
+
+
+def test_program_delta():
+    date = datetime(2022, 7, 1)
+    manager = VALUES['ПоМенеджерам']
+    program = [
+        {'group': 'О-01.01. Доска', 'forecast': 12, 'rmse': 1, 'program': 10., 'deviation': 1, 'manager': manager},
+        {'group': 'О-01.02. Брус', 'forecast': 20, 'rmse': 2, 'program': 25, 'deviation': 2, 'manager': manager},
+        {'group': 'О-01.03. Фанера', 'forecast': 0, 'rmse': 0, 'program': 0, 'deviation': 0, 'manager': manager},
+        {'group': 'О-01.04. Щит', 'forecast': 5, 'rmse': 1, 'program': 5, 'deviation': 1, 'manager': manager},
+    ]
+    with Stub1C(query_handler) as stub:
+        worker = ProgramWorker(client=Client1C(stub.address, BASE, 'user', 'password', 'key', QUERY_ROUTE,
+                                               SET_PROGRAM_ROUTE))
+        # прогноз и RMSE, которые еще не устанавливались, неизвестны: отправляются все строки
+        assert worker.program_delta('Менеджер', date, program) == program
+        # планы для сравнения загружаются только по менеджеру таблицы, а не по всему разрезу
+        query = stub.requests[-1][3]['query']
+        assert f'.Наименование = "{manager}"' in query and 'КАК Значение' not in query
+        assert worker.set_program('Менеджер', date, program) is None
+        assert worker.program_delta('Менеджер', date, program) == [program[1], program[3]]
+
+        # план и отклонение совпадают с 1С, но прогноз или RMSE изменились
+        forecasts = [{**program[0], 'forecast': 13}, {**program[2], 'rmse': 1}, program[0]]
+        assert worker.program_delta('Менеджер', date, forecasts) == forecasts[:2]
+        assert worker.set_program('Менеджер', date, forecasts[:2]) is None
+        posted = [payload for path, headers, size, payload in stub.requests if path.endswith(SET_PROGRAM_ROUTE)]
+        assert posted[-1]['program'] == forecasts[:2]
+        assert worker.program_delta('Менеджер', date, forecasts) == [program[0]]
+        assert worker.set_program('Менеджер', date, program) is None
+
+        # срез без изменений не отправляется
+        summary = worker.set_programs(date, [('Менеджер', manager, program[:1]), ('Менеджер', manager, program)])
+        assert summary['skipped'] == [('Менеджер', manager)] and len(summary['sent']) == 1
+        sent = len([path for path, *_ in stub.requests if path.endswith(SET_PROGRAM_ROUTE)])
+        assert worker.set_program('Менеджер', date, program[:1]) is None
+        assert len([path for path, *_ in stub.requests if path.endswith(SET_PROGRAM_ROUTE)]) == sent
+        assert worker.set_programs(date, [('Менеджер', manager, program)], only_changed=False)['sent']
+        assert len([path for path, *_ in stub.requests if path.endswith(SET_PROGRAM_ROUTE)]) == sent + 1
+
+
+def test_program_delta_fresh_snapshot():
+    date = datetime(2022, 7, 1)
+    manager = VALUES['ПоМенеджерам']
+    plans = {'О-01.01. Доска': 10}  # планы в 1С, изменяются запросами set_program
+
+    def plans_handler(query: str) -> list:
+        value = {'Значение': manager} if 'КАК Значение' in query else {}
+        return [{**value, 'Группа': group, 'План': plan, 'Отклонение': 1} for group, plan in plans.items()]
+
+    def set_program_status(payload):
+        plans.update({row['group']: row['program'] for row in payload['program']})
+        return 200
+
+    def program(plan) -> list:
+        return [{'group': 'О-01.01. Доска', 'forecast': 12, 'rmse': 1, 'program': plan, 'deviation': 1,
+                 'manager': manager}]
+
+    with Stub1C(plans_handler, set_program_status) as stub:
+        def program_worker():
+            return ProgramWorker(client=Client1C(stub.address, BASE, 'user', 'password', 'key', QUERY_ROUTE,
+                                                 SET_PROGRAM_ROUTE))
+
+        # без Redis процесс A не знает, что процесс B изменил план: в его снимке по-прежнему 10
+        worker_a, worker_b = program_worker(), program_worker()
+        assert worker_a.get_program(date, manager=manager)['План'].tolist() == [10]
+        assert worker_b.set_program('Менеджер', date, program(20)) is None
+        assert plans['О-01.01. Доска'] == 20
+
+        # план 10 сравнивается с планами, загруженными из 1С при записи, и отправляется
+        assert worker_a.set_program('Менеджер', date, program(10)) is None
+        assert plans['О-01.01. Доска'] == 10
+        summary = worker_b.set_programs(date, [('Менеджер', manager, program(20))])
+        assert summary['sent'] == [('Менеджер', manager)] and plans['О-01.01. Доска'] == 20
+
+        # 1С недоступна для чтения планов: срез отправляется целиком
+        stub.query_handler = lambda query: 'не JSON'
+        assert worker_a.program_delta('Менеджер', date, program(20)) == program(20)
+
+
+def bulk_slices(managers: list) -> list:
+    return [('Менеджер', manager, [{'group': 'О-01.01. Доска', 'forecast': 12, 'rmse': 1, 'program': 12,
+                                    'deviation': 1, 'manager': manager}]) for manager in managers]
+
+
+def test_set_programs_retries():
+    date = datetime(2022, 7, 1)
+    managers = [f'Менеджер {i}' for i in range(6)]
+    attempts = {}
+
+    def set_program_status(payload):
+        manager = payload['program'][0]['manager']
+        attempts[manager] = attempts.get(manager, 0) + 1
+        if manager == managers[2]:
+            return 500  # срез не устанавливается ни с одной попытки
+        return 500 if attempts[manager] <= 2 else 200  # два временных сбоя, затем успех
+
+    progress = []
+    with Stub1C(set_program_status=set_program_status) as stub:
+        client = Client1C(stub.address, BASE, 'user', 'password', 'key', QUERY_ROUTE, SET_PROGRAM_ROUTE,
+                          breaker=CircuitBreaker(failure_threshold=100))
+        worker = ProgramWorker(max_workers=3, retries=3, backoff=0.01, client=client)
+        summary = worker.set_programs(date, bulk_slices(managers), lambda done, total: progress.append((done, total)),
+                                      only_changed=False)
+
+    assert sorted(summary['sent']) == sorted(('Менеджер', manager) for manager in managers if manager != managers[2])
+    assert summary['failed'] == {('Менеджер', managers[2]): 'Ошибка записи плана'}
+    assert attempts[managers[2]] == 4
+    assert all(attempts[manager] == 3 for manager in managers if manager != managers[2])
+    assert progress == [(done, len(managers)) for done in range(1, len(managers) + 1)]
+
+
+def test_set_programs_client_error():
+    date = datetime(2022, 7, 1)
+    with Stub1C(set_program_status=400) as stub:
+        client = Client1C(stub.address, BASE, 'user', 'password', 'key', QUERY_ROUTE, SET_PROGRAM_ROUTE)
+        worker = ProgramWorker(retries=3, backoff=0.01, client=client)
+        summary = worker.set_programs(date, bulk_slices(['Менеджер 0']), only_changed=False)
+        # ошибка в данных плана не повторяется
+        assert len(stub.requests) == 1
+    assert summary['failed'] == {('Менеджер', 'Менеджер 0'): 'Ошибка записи плана'} and not summary['sent']
+
+
+def test_shared_snapshot_version():
+    fakeredis = pytest.importorskip('fakeredis')
+    import redis
+    from data_methods import RedisWorker
+    pool = redis.ConnectionPool(connection_class=fakeredis.FakeConnection, server=fakeredis.FakeServer())
+    versions = RedisWorker(connection_pool=pool)
+    date = datetime(2022, 7, 1)
+    manager = VALUES['ПоМенеджерам']
+    with Stub1C(query_handler) as stub:
+        def program_worker():
+            return ProgramWorker(client=Client1C(stub.address, BASE, 'user', 'password', 'key', QUERY_ROUTE,
+                                                 SET_PROGRAM_ROUTE), versions=lambda: versions)
+
+        def queries():
+            return len([path for path, *_ in stub.requests if path.endswith(QUERY_ROUTE)])
+
+        worker_a, worker_b = program_worker(), program_worker()
+        worker_a.program_snapshot(date, 'Менеджер')
+        worker_a.program_snapshot(date, 'Менеджер')
+        assert queries() == 1
+
+        # план установлен другим процессом: снимок процесса A загружается заново, а не через snapshot_ttl
+        program = [{'group': 'О-01.01. Доска', 'forecast': 12, 'rmse': 1, 'program': 12, 'deviation': 1,
+                    'manager': manager}]
+        assert worker_b.set_program('Менеджер', date, program, only_changed=False) is None
+        loaded = queries()
+        worker_a.program_snapshot(date, 'Менеджер')
+        assert queries() == loaded + 1
+        worker_a.program_snapshot(date, 'Менеджер')
+        assert queries() == loaded + 1
+        # версии других разрезов не меняются
+        worker_a.program_snapshot(date, 'Регион')
+        worker_a.program_snapshot(date, 'Регион')
+        assert queries() == loaded + 2
+
+
+def test_after_fork():
+    date = datetime(2022, 7, 1)
+    with Stub1C(query_handler) as stub:
+        worker = ProgramWorker(client=Client1C(stub.address, BASE, 'user', 'password', 'key', QUERY_ROUTE,
+                                               SET_PROGRAM_ROUTE))
+        snapshot = worker.program_snapshot(date, 'Менеджер')
+        client = worker.client
+        worker.after_fork()
+        # у процесса свои соединения и автомат отключения, загруженные снимки сохраняются
+        assert worker.client is not client and worker.client.session is not client.session
+        assert worker.client.breaker is not client.breaker
+        assert worker.program_snapshot(date, 'Менеджер') is snapshot
+        assert len(stub.requests) == 1
+
+
+def test_slice_query_quotes():
+    date = datetime(2022, 7, 1)
+    region = 'ООО "Регион"'
+    with Stub1C(lambda query: []) as stub:
+        worker = ProgramWorker(client=Client1C(stub.address, BASE, 'user', 'password', 'key', QUERY_ROUTE,
+                                               SET_PROGRAM_ROUTE))
+        program = [{'group': 'a', 'forecast': 1, 'rmse': 1, 'program': 1, 'deviation': 1, 'region': region}]
+        assert worker.program_delta('Регион', date, program) == program
+    # кавычки значения разреза удваиваются и не завершают строковый литерал запроса 1С
+    query = stub.requests[-1][3]['query']
+    assert '.Наименование = "ООО ""Регион"""' in query and 'ДАТАВРЕМЯ(2022, 7, 1, 0, 0, 0)' in query
+
+
+def test_snapshot_after_send():
+    fakeredis = pytest.importorskip('fakeredis')
+    import redis
+    from data_methods import RedisWorker
+    pool = redis.ConnectionPool(connection_class=fakeredis.FakeConnection, server=fakeredis.FakeServer())
+    versions = RedisWorker(connection_pool=pool)
+    date = datetime(2022, 7, 1)
+    manager = VALUES['ПоМенеджерам']
+    program = [{'group': 'О-01.01. Доска', 'forecast': 12, 'rmse': 1, 'program': 15, 'deviation': 1,
+                'manager': manager},
+               {'group': 'О-01.03. Фанера', 'forecast': 3, 'rmse': 1, 'program': 3, 'deviation': 1,
+                'manager': manager}]
+    with Stub1C(query_handler) as stub:
+        def program_worker():
+            return ProgramWorker(client=Client1C(stub.address, BASE, 'user', 'password', 'key', QUERY_ROUTE,
+                                                 SET_PROGRAM_ROUTE), versions=lambda: versions)
+
+        def queries():
+            return [payload['query'] for path, headers, size, payload in stub.requests if path.endswith(QUERY_ROUTE)]
+
+        worker_a, worker_b = program_worker(), program_worker()
+        worker_a.get_program(date, manager=manager)
+        worker_b.get_program(date, manager=manager)
+        loaded = len(queries())
+        assert worker_a.set_program('Менеджер', date, program) is None
+        # перед отправкой загружаются планы одного менеджера, снимок разреза после нее не загружается заново
+        assert len(queries()) == loaded + 1 and 'КАК Значение' not in queries()[-1]
+        df = worker_a.get_program(date, manager=manager)
+        assert df.to_dict('records') == [{'Группа': 'О-01.01. Доска', 'План': 15, 'Отклонение': 1},
+                                         {'Группа': 'О-01.02. Брус', 'План': 20, 'Отклонение': 2},
+                                         {'Группа': 'О-01.03. Фанера', 'План': 3, 'Отклонение': 1}]
+        assert len(queries()) == loaded + 1
+        # другой процесс загружает снимок разреза заново
+        worker_b.get_program(date, manager=manager)
+        assert len(queries()) == loaded + 2 and 'КАК Значение' in queries()[-1]
+
+        # планы разреза изменены другим процессом после загрузки снимка: снимок не обновляется, а сбрасывается
+        worker_a.get_program(date, manager=manager)
+        assert worker_b.set_program('Менеджер', date, program, only_changed=False) is None
+        assert worker_a.set_program('Менеджер', date, program, only_changed=False) is None
+        loaded = len(queries())
+        assert worker_a.get_program(date, manager=manager)['План'].tolist() == [10, 20]
+        assert len(queries()) == loaded + 1
+
+        # прогнозы, установленные процессом A, известны процессу B через Redis
+        unchanged = [{**program[0], 'program': 10}]
+        assert worker_b.program_delta('Менеджер', date, unchanged) == []
+        assert ProgramWorker(client=worker_b.client).program_delta('Менеджер', date, unchanged) == unchanged
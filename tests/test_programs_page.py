@@ -0,0 +1,141 @@
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+from dash.exceptions import PreventUpdate
+from tests.stub_1c import QUERY_ROUTE, SET_PROGRAM_ROUTE
+import pytest
+
+
+@pytest.fixture(scope='module')
+def environment():
+    pytest.importorskip('fakeredis')
+    from benchmarks.seed import SCALES, local_environment
+    with local_environment(SCALES['small']) as (worker, stub):
+        yield worker, stub
+
+
+@pytest.fixture(scope='module')
+def programs(environment):
+    # страница регистрируется в dash.page_registry, поэтому импортируется после создания приложения Dash
+    import dash
+    dash.Dash('app', use_pages=True)
+    from pages import programs
+    return programs
+
+
+@pytest.fixture
+def calls(environment, monkeypatch):
+    """
+    :return: функция, возвращающая число команд Redis и запросов к 1С, выполненных с начала теста
+    """
+    worker, stub = environment
+    commands = []
+    execute_command = worker.execute_command
+
+    def counted(*args, **kwargs):
+        commands.append(args[0])
+        return execute_command(*args, **kwargs)
+
+    monkeypatch.setattr(worker, 'execute_command', counted)
+    requests = len(stub.requests)
+    return lambda: (len(commands), len(stub.requests) - requests)
+
+
+def call(callback, triggered: str, *args):
+    """
+    Вызывает колбэк, как Dash при изменении свойства triggered
+    """
+    token = context_value.set(AttributeDict(triggered_inputs=[{'prop_id': triggered, 'value': None}]))
+    try:
+        return callback.__wrapped__(*args)
+    finally:
+        context_value.reset(token)
+
+
+def slice_args(manager: str, db: int = 0) -> list:
+    from benchmarks.seed import first_period
+    return [first_period().strftime('%Y-%m-%d'), 'Менеджер', manager, None, db]
+
+
+def managers() -> list:
+    from benchmarks.seed import SCALES, layer_values
+    return layer_values(SCALES['small'])['manager']
+
+
+def test_slice_unchanged(programs, calls):
+    args = slice_args(managers()[0])
+    data, columns, stale_marker, tbl_slice = call(programs.update_table, 'layer.value', *args, None)
+    assert data and tbl_slice == args[:3] + args[4:]
+    used = calls()
+    # то же значение разреза из сессии: таблица с ручными изменениями плана остается, Redis и 1С не запрашиваются
+    with pytest.raises(PreventUpdate):
+        call(programs.update_table, 'layer.value', *args, tbl_slice)
+    assert calls() == used
+
+
+def test_slice_changed(programs, environment):
+    from benchmarks.seed import first_period
+    worker, stub = environment
+    first, second = managers()[:2]
+    *_, tbl_slice = call(programs.update_table, 'layer.value', *slice_args(first), None)
+    data, columns, stale_marker, tbl_slice = call(programs.update_table, 'layer.value', *slice_args(second),
+                                                  tbl_slice)
+    expected = worker.forecast_slice(first_period(), 'Менеджер', second)
+    assert [row['Группа'] for row in data] == expected['Группа'].tolist()
+    assert tbl_slice[2] == second and stale_marker is None
+
+
+def test_db_changed(programs):
+    fakeredis = pytest.importorskip('fakeredis')
+    import redis
+    from benchmarks.seed import SCALES, seed_redis
+    from data_methods import RedisWorker, redis_worker
+    from upgraded_redis import UpgradedRedis
+    pool = redis.ConnectionPool(connection_class=fakeredis.FakeConnection, server=fakeredis.FakeServer())
+    seed_redis(UpgradedRedis(connection_pool=pool, binary_format=True), SCALES['small'], seed=1)
+    redis_worker._workers[1] = RedisWorker(connection_pool=pool)
+    try:
+        args = slice_args(managers()[0])
+        data, columns, stale_marker, tbl_slice = call(programs.update_table, 'layer.value', *args, None)
+        other = call(programs.update_table, 'db.value', *slice_args(managers()[0], db=1), tbl_slice)
+    finally:
+        redis_worker._workers[1] = None
+    assert other[3][3] == 1
+    # прогноз другой версии: таблица строится заново, а не берется из таблиц среза базы 0
+    assert [row['Прогноз'] for row in other[0]] != [row['Прогноз'] for row in data]
+
+
+def test_after_send_plan(programs, environment, calls):
+    worker, stub = environment
+    manager, other = managers()[2:4]
+    args = slice_args(manager)
+    data, columns, stale_marker, tbl_slice = call(programs.update_table, 'layer.value', *args, None)
+    edited = [{**row, 'План': row['План'] + 1} for row in data]
+
+    queries = calls()[1]
+    is_open, body = call(programs.send_plan, 'send_confirmation_dialog.submit_n_clicks', 1, None, edited, args[0],
+                         'Менеджер', manager)
+    assert is_open and body == 'Планы успешно установлены'
+    # перед отправкой из 1С загружаются планы одного менеджера
+    assert calls()[1] == queries + 2
+    query = [payload for path, headers, size, payload in stub.requests if path.endswith(QUERY_ROUTE)][-1]['query']
+    assert f'"{manager}"' in query and 'КАК Значение' not in query
+    posted = [payload for path, headers, size, payload in stub.requests if path.endswith(SET_PROGRAM_ROUTE)]
+    assert [row['program'] for row in posted[-1]['program']] == [row['План'] for row in edited]
+
+    # отправка не перестраивает таблицу: тот же срез не загружается заново
+    used = calls()
+    with pytest.raises(PreventUpdate):
+        call(programs.update_table, 'layer.value', *args, tbl_slice)
+    assert calls() == used
+    assert call(programs.send_plan, 'close_send_modal.n_clicks', 1, 1, edited, args[0], 'Менеджер',
+                manager) == (False, programs.dash.no_update)
+    assert calls() == used
+
+    # снимок планов разреза обновлен отправленными планами без загрузки всего разреза из 1С,
+    # таблица среза после возврата к нему строится из нового снимка
+    queries = calls()[1]
+    *_, tbl_slice = call(programs.update_table, 'layer.value', *slice_args(other), tbl_slice)
+    reloaded, *_ = call(programs.update_table, 'layer.value', *args, tbl_slice)
+    assert calls()[1] == queries
+    assert reloaded is not data and [row['Группа'] for row in reloaded] == [row['Группа'] for row in data]
+    assert [row['План'] for row in reloaded] == [row['План'] for row in edited]
@@ -0,0 +1,142 @@
+from datetime import datetime
+from sales import FulfillmentCube, rollup_sales, LAYER_COLUMNS
+import numpy as np
+import pandas as pd
+import pytest
+import threading
+import time
+
+PERIOD = datetime(2022, 7, 1)
+
+
+def sales_frame(n: int, seed: int = 0, start: datetime = datetime(2022, 7, 1, 9)) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Группа': rng.choice(['О-01.01. Доска', 'О-01.02. Брус', 'О-02.01. Фанера'], n),
+        'Менеджер': rng.choice(['Иванов', 'Петров', 'Сидоров'], n),
+        'Подразделение': rng.choice(['Краснодар', 'Сочи'], n),
+        'Регион': rng.choice(['Север', 'Юг'], n),
+        'Факт': rng.integers(1, 100, n).astype(float),
+        'ПоследняяПродажа': [start + pd.Timedelta(minutes=i) for i in range(n)],
+    })
+
+
+def naive_rollup(sales: pd.DataFrame, layer: str, value=None) -> pd.Series:
+    column = LAYER_COLUMNS[layer]
+    if column is not None:
+        sales = sales[sales[column] == value]
+    return sales.groupby('Группа')['Факт'].sum()
+
+
+def test_rollup_sales():
+    sales = sales_frame(200)
+    facts = rollup_sales(sales)
+    assert facts.loc[('В целом по компании', '')].equals(naive_rollup(sales, 'В целом по компании'))
+    for layer, column in LAYER_COLUMNS.items():
+        if column is None:
+            continue
+        for value in sales[column].unique():
+            assert facts.loc[(layer, value)].equals(naive_rollup(sales, layer, value))
+
+    incremental = rollup_sales(sales[:120]).add(rollup_sales(sales[120:]), fill_value=0.)
+    pd.testing.assert_series_equal(incremental.sort_index(), facts.sort_index())
+
+
+class FakeProgramWorker:
+    def __init__(self, sales: pd.DataFrame):
+        self.all_sales = sales
+        self.fail = False
+        self.release = None  # threading.Event: загрузка продаж ждет его, как медленная 1С
+        self.calls = []
+        self.snapshot = {None: pd.DataFrame({'Группа': ['О-01.01. Доска'], 'План': [100.], 'Отклонение': [10.]})}
+
+    def sales(self, start: datetime, end: datetime):
+        self.calls.append(start)
+        if self.release is not None:
+            self.release.wait(5)
+        if self.fail:
+            return None
+        moments = self.all_sales['ПоследняяПродажа']
+        return self.all_sales[(moments > start) & (moments <= end)]
+
+    def program_snapshot(self, period, layer):
+        return self.snapshot if layer == 'В целом по компании' else {}
+
+
+@pytest.fixture
+def worker():
+    return FakeProgramWorker(sales_frame(50))
+
+
+def wait_refresh(cube: FulfillmentCube) -> None:
+    for state in cube._periods.values():
+        if state.refreshing is not None:
+            state.refreshing.join(5)
+
+
+def test_fulfillment_table(worker):
+    cube = FulfillmentCube(worker, refresh_interval=0, full_refresh_interval=3600)
+    _df = cube.table(PERIOD, 'В целом по компании').set_index('Группа')
+    expected = naive_rollup(worker.all_sales, 'В целом по компании')
+    assert _df['Факт'].equals(expected.astype(float).rename('Факт'))
+    assert _df.loc['О-01.01. Доска', 'План'] == 100
+    assert _df.loc['О-01.01. Доска', 'Выполнение'] == round(expected['О-01.01. Доска'], 1)
+    assert pd.isna(_df.loc['О-01.02. Брус', 'Выполнение'])
+    assert not _df.attrs['stale']
+
+    assert cube.values(PERIOD, 'Подразделение') == ['Краснодар', 'Сочи']
+    _df = cube.table(PERIOD, 'Менеджер', 'Петров').set_index('Группа')
+    assert _df['Факт'].equals(naive_rollup(worker.all_sales, 'Менеджер', 'Петров').astype(float).rename('Факт'))
+    assert cube.table(PERIOD, 'Менеджер', 'Нет такого').empty
+
+
+def test_incremental_sales(worker):
+    new_sales = sales_frame(30, seed=1, start=datetime(2022, 7, 10))
+    all_sales = worker.all_sales
+    worker.all_sales = all_sales[:0]
+    cube = FulfillmentCube(worker, refresh_interval=0, full_refresh_interval=3600)
+    assert cube.table(PERIOD, 'В целом по компании')['Факт'].sum() == 0
+
+    worker.all_sales = all_sales
+    cube.table(PERIOD, 'В целом по компании')
+    wait_refresh(cube)
+    worker.all_sales = pd.concat([all_sales, new_sales], ignore_index=True)
+    cube.table(PERIOD, 'В целом по компании')
+    wait_refresh(cube)
+    _df = cube.table(PERIOD, 'Регион', 'Юг').set_index('Группа')
+    wait_refresh(cube)
+    assert worker.calls[2] == all_sales['ПоследняяПродажа'].max()
+    expected = naive_rollup(worker.all_sales, 'Регион', 'Юг').astype(float).rename('Факт')
+    pd.testing.assert_series_equal(_df['Факт'], expected)
+
+
+def test_stale_sales(worker):
+    cube = FulfillmentCube(worker, refresh_interval=0, full_refresh_interval=3600)
+    total = cube.table(PERIOD, 'В целом по компании')['Факт'].sum()
+    worker.fail = True
+    cube.table(PERIOD, 'В целом по компании')
+    wait_refresh(cube)
+    _df = cube.table(PERIOD, 'В целом по компании')
+    wait_refresh(cube)
+    assert _df.attrs['stale']
+    assert _df['Факт'].sum() == total
+    assert _df.attrs['loaded_at'] is not None
+
+
+def test_background_refresh(worker):
+    cube = FulfillmentCube(worker, refresh_interval=0, full_refresh_interval=3600)
+    total = cube.table(PERIOD, 'В целом по компании')['Факт'].sum()
+    worker.all_sales = pd.concat([worker.all_sales, sales_frame(30, seed=1, start=datetime(2022, 7, 10))],
+                                 ignore_index=True)
+    worker.release = threading.Event()
+    try:
+        # пока 1С отвечает, страница получает куб из последних загруженных продаж и не ждет запрос
+        started = time.monotonic()
+        assert cube.table(PERIOD, 'В целом по компании')['Факт'].sum() == total
+        assert cube.values(PERIOD, 'Подразделение') == ['Краснодар', 'Сочи']
+        assert time.monotonic() - started < 1
+    finally:
+        worker.release.set()
+    wait_refresh(cube)
+    assert cube.table(PERIOD, 'В целом по компании')['Факт'].sum() == worker.all_sales['Факт'].sum()
+    wait_refresh(cube)
@@ -0,0 +1,79 @@
+from tables import round_forecast, forecast_table, merge_program, forecast_programs, forecast_rollup, rollup_slice
+import numpy as np
+import pandas as pd
+from tests.legacy_tables import legacy_round_forecast, legacy_fill
+import pytest
+
+
+@pytest.fixture(scope='module')
+def forecast():
+    rng = np.random.default_rng(0)
+    values = np.concatenate([
+        rng.normal(50, 80, 2000),
+        np.round(rng.random(2000) * 200, 4),  # числа, попадающие ровно на половину при округлении
+        [-1., 0., 5., 10., 100., 0.0005, 2.675, np.nan],
+    ])
+    return pd.DataFrame({
+        'Группа': [f'Группа {i}' for i in range(len(values))],
+        'Прогноз': values,
+        'RMSE': np.abs(values[::-1]),
+        'Ед': 'м3',
+    })
+
+
+def test_round_forecast(forecast):
+    expected = forecast['Прогноз'].apply(legacy_round_forecast)
+    pd.testing.assert_series_equal(round_forecast(forecast['Прогноз']), expected,
+                                   check_dtype=False, check_exact=True)
+
+
+def test_fill_matches_legacy(forecast):
+    df_program = pd.DataFrame({
+        'Группа': forecast['Группа'].iloc[::3].tolist() + ['Группа 0'],
+        'План': np.arange(len(forecast['Группа'].iloc[::3]) + 1, dtype=float),
+        'Отклонение': 1.5,
+    })
+    expected = legacy_fill(forecast, df_program)
+    result = merge_program(forecast_table(forecast), df_program)
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_exact=True)
+
+
+def test_fill_with_duplicates(forecast):
+    gfd = pd.concat([forecast.dropna(), forecast.dropna().iloc[:10].assign(Ед='руб')], ignore_index=True)
+    for _gfd in [forecast.dropna().sample(frac=1, random_state=0), gfd]:
+        expected = legacy_fill(_gfd, pd.DataFrame())
+        result = merge_program(forecast_table(_gfd), pd.DataFrame())
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_exact=True)
+
+
+def test_fill_without_program(forecast):
+    expected = legacy_fill(forecast, pd.DataFrame())
+    result = merge_program(forecast_table(forecast), pd.DataFrame())
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_exact=True)
+
+
+def test_forecast_programs():
+    gfd = pd.DataFrame({'Группа': ['a'], 'Прогноз': [1.5], 'RMSE': [0.5]})
+    assert forecast_programs(gfd, manager='m') == [
+        {'group': 'a', 'forecast': 1.5, 'rmse': 0.5, 'program': 1.5, 'deviation': 0.5, 'manager': 'm'}
+    ]
+
+
+def test_forecast_rollup(forecast):
+    shuffled = forecast.dropna().sample(frac=1, random_state=0)
+    duplicates = pd.concat([forecast.dropna(), forecast.dropna().iloc[:10].assign(Ед='руб')], ignore_index=True)
+    tables = {
+        ('В целом по компании', None): forecast,
+        ('Подразделение', 'Краснодар'): shuffled,
+        ('Подразделение', 'Сочи'): shuffled.iloc[:0],
+        ('Менеджер', 'Иванов'): duplicates,
+        ('Менеджер', 'Петров'): shuffled.iloc[:100],
+    }
+    rollup = forecast_rollup(tables)
+    for (layer, value), gfd in tables.items():
+        if gfd.empty:
+            assert rollup_slice(rollup, layer, value).empty
+        else:
+            pd.testing.assert_frame_equal(rollup_slice(rollup, layer, value), forecast_table(gfd), check_exact=True)
+    assert rollup_slice(rollup, 'Регион', 'Юг').empty
+    assert forecast_rollup({}).empty
@@ -0,0 +1,56 @@
+from upgraded_redis import dumps, loads, MSGPACK_ZSTD
+import datetime
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def table():
+    return {
+        'Группа': {0: 'О-01.01. Фанера ФК', 1: 'О-01.05. OSB'},
+        'Прогноз': {0: 12.5, 1: None},
+        'Период': {0: datetime.datetime(2022, 7, 31), 1: datetime.date(2022, 8, 31)},
+    }
+
+
+def test_binary_roundtrip(table):
+    raw = dumps(table)
+    assert raw[:1] == MSGPACK_ZSTD
+    assert loads(raw) == {
+        'Группа': table['Группа'],
+        'Прогноз': table['Прогноз'],
+        'Период': {0: '2022-07-31T00:00:00', 1: '2022-08-31'},
+    }
+
+
+def test_json_compatibility(table):
+    raw = dumps(table, binary=False)
+    assert raw.startswith(b'{')
+    assert loads(raw)['Группа'] == {'0': 'О-01.01. Фанера ФК', '1': 'О-01.05. OSB'}
+    assert loads(raw.decode('utf-8'))['Прогноз'] == {'0': 12.5, '1': None}
+
+
+def test_numpy_values():
+    assert loads(dumps({'data': np.arange(3), 'value': np.float64(1.5)})) == {'data': [0, 1, 2], 'value': 1.5}
+
+
+def test_broken_values():
+    with pytest.raises(ValueError):
+        loads(MSGPACK_ZSTD + b'broken')
+    with pytest.raises(TypeError):
+        loads(None)
+
+
+def test_pool_exhausted():
+    fakeredis = pytest.importorskip('fakeredis')
+    from upgraded_redis import InstrumentedConnectionPool, PoolExhaustedError
+    pool = InstrumentedConnectionPool(connection_class=fakeredis.FakeConnection, server=fakeredis.FakeServer(),
+                                      max_connections=1, timeout=0.05)
+    connection = pool.get_connection('GET')
+    with pytest.raises(PoolExhaustedError):
+        pool.get_connection('GET')
+    pool.release(connection)
+    pool.release(pool.get_connection('GET'))
+    info = pool.info()
+    assert (info['acquired'], info['failed'], info['exhausted'], info['in_use']) == (2, 1, 1, 0)
+    assert info['max_wait_seconds'] >= 0.05
@@ -0,0 +1,55 @@
+from dateutil.relativedelta import relativedelta
+import pytest
+import warmup
+
+
+def test_warm_and_watch(monkeypatch):
+    pytest.importorskip('fakeredis')
+    from benchmarks.seed import SCALES, first_period, local_environment
+    scale = SCALES['small']
+    periods = [{'value': first_period() + relativedelta(months=i)} for i in range(scale.periods)]
+    monkeypatch.setattr(warmup, 'date_options', lambda: periods)
+
+    with local_environment(scale) as (worker, stub):
+        warmup.warm_caches(dbs=[0], max_workers=2)
+        state = warmup.progress()
+        assert state['ready']
+        assert state['dbs'][0]['hot'] and state['dbs'][0]['done'] == state['dbs'][0]['total']
+        assert len(worker.rollup_cache) == scale.periods
+        assert len(worker.options_cache) == 3
+        assert len(worker.graph_cache) > scale.groups / 2
+        assert warmup.check_new_forecasts(dbs=[0]) == []
+
+        worker.mset({'actual_date': '2022-07-31', 'models_count': 5, 'total_models_count': 10})
+        assert warmup.check_new_forecasts(dbs=[0]) == []  # сборка моделей еще идет
+        worker.set('models_count', 10)
+        assert warmup.check_new_forecasts(dbs=[0]) == [0]
+        assert warmup.progress()['dbs'][0]['actual_date'] == '2022-07-31'
+        assert len(worker.rollup_cache) == scale.periods
+
+
+def test_rewarm_after_build(monkeypatch):
+    pytest.importorskip('fakeredis')
+    from benchmarks.seed import SCALES, first_period, local_environment, forecast_table, group_names
+    from upgraded_redis import dumps
+    import numpy as np
+    scale = SCALES['small']
+    period = first_period()
+    monkeypatch.setattr(warmup, 'date_options', lambda: [{'value': period}])
+
+    with local_environment(scale) as (worker, stub):
+        warmup.warm_caches(dbs=[0], max_workers=2)
+        table_key = f'{period:%d.%m.%Y},None,None,None'
+        complete = worker.get(table_key)
+
+        # сборка началась: actual_date уже новый, таблицы записаны не все
+        partial = forecast_table(group_names(scale.groups)[:10], np.random.default_rng(1))
+        worker.mset({'actual_date': '2022-07-31', 'models_count': 5, 'total_models_count': 10,
+                     table_key: dumps(partial, worker.binary_format)})
+        worker._actual_date_checked = 0.
+        assert len(worker.forecast_slice(period, 'В целом по компании')) == 10
+
+        # сборка завершена с тем же actual_date: закэшированный во время сборки прогноз не остается
+        worker.mset({'models_count': 10, table_key: complete})
+        assert warmup.check_new_forecasts(dbs=[0]) == [0]
+        assert len(worker.forecast_slice(period, 'В целом по компании')) == scale.groups
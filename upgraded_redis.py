@@ -1,7 +1,16 @@
 import redis
+from redis.exceptions import ConnectionError as RedisConnectionError
+from threading import Lock
+import time
 import json
 from json import JSONEncoder
 import datetime
+import msgpack
+import zstandard
+
+# Формат хранения значений в Redis определяется по первому байту:
+# JSON (старый формат) начинается с печатного символа, двоичный формат - с байта версии.
+MSGPACK_ZSTD = b'\x01'  # версия 1: msgpack, сжатый zstd
 
 
 # subclass JSONEncoder
@@ -12,10 +21,110 @@ class DateTimeEncoder(JSONEncoder):
             return obj.isoformat()
 
 
+def _msgpack_default(obj):
+    if isinstance(obj, (datetime.date, datetime.datetime)):
+        return obj.isoformat()
+    if hasattr(obj, 'tolist'):
+        # numpy массивы и скаляры
+        return obj.tolist()
+    raise TypeError(f'Object of type {type(obj).__name__} is not msgpack serializable')
+
+
+def dumps(_dict, binary: bool = True) -> bytes:
+    """
+    :param binary: True - двоичный формат msgpack + zstd, False - JSON
+    """
+    if binary:
+        return MSGPACK_ZSTD + zstandard.compress(msgpack.packb(_dict, default=_msgpack_default))
+    return json.dumps(_dict, ensure_ascii=False, cls=DateTimeEncoder).encode('utf-8')
+
+
+def loads(raw: bytes):
+    """
+    Декодирует значение, записанное dumps, формат определяется автоматически
+    :raises TypeError: если raw is None
+    :raises ValueError: если значение повреждено
+    """
+    if isinstance(raw, bytes) and raw[:1] == MSGPACK_ZSTD:
+        try:
+            return msgpack.unpackb(zstandard.decompress(raw[1:]), strict_map_key=False)
+        except (zstandard.ZstdError, msgpack.UnpackException) as ex:
+            raise ValueError(ex)
+    return json.loads(raw)
+
+
+class PoolExhaustedError(RedisConnectionError):
+    """
+    Свободное соединение не получено за timeout секунд: пул исчерпан, но Redis может быть доступен
+    """
+
+
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """
+    Ограниченный пул соединений: при исчерпании пула запрос ждет свободное соединение не дольше timeout секунд,
+    затем получает PoolExhaustedError. Собирает метрики загрузки пула и времени получения соединения.
+    """
+    # текст ConnectionError, которым BlockingConnectionPool сообщает об истечении ожидания свободного соединения
+    exhausted_message = 'No connection available.'
+
+    def __init__(self, *args, **kwargs):
+        self._stats_lock = Lock()
+        self.acquired = 0
+        self.failed = 0
+        self.exhausted = 0
+        self.wait_seconds = 0.
+        self.max_wait_seconds = 0.
+        super().__init__(*args, **kwargs)
+
+    def get_connection(self, *args, **kwargs):
+        start = time.monotonic()
+        try:
+            connection = super().get_connection(*args, **kwargs)
+        except RedisConnectionError as ex:
+            exhausted = str(ex) == self.exhausted_message
+            with self._stats_lock:
+                self.failed += 1
+                self.exhausted += exhausted
+            if exhausted:
+                raise PoolExhaustedError(f'{ex} ({self.max_connections} соединений заняты)') from ex
+            raise
+        finally:
+            waited = time.monotonic() - start
+            with self._stats_lock:
+                self.wait_seconds += waited
+                self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        with self._stats_lock:
+            self.acquired += 1
+        return connection
+
+    def info(self) -> dict:
+        """
+        :return: in_use - занятые соединения, max_connections - размер пула, acquired - выдано соединений,
+            failed - ошибок получения соединения (пул исчерпан или Redis недоступен), exhausted - из них пул исчерпан,
+            wait_seconds / max_wait_seconds - суммарное и максимальное время получения соединения
+        """
+        return {
+            'in_use': self.max_connections - self.pool.qsize(),
+            'max_connections': self.max_connections,
+            'acquired': self.acquired,
+            'failed': self.failed,
+            'exhausted': self.exhausted,
+            'wait_seconds': self.wait_seconds,
+            'max_wait_seconds': self.max_wait_seconds,
+        }
+
+
 class UpgradedRedis(redis.Redis):
+    def __init__(self, *args, binary_format: bool = False, **kwargs):
+        """
+        :param binary_format: записывать словари в двоичном формате msgpack + zstd вместо JSON.
+            Чтение поддерживает оба формата независимо от параметра.
+        """
+        super().__init__(*args, **kwargs)
+        self.binary_format = binary_format
+
     def set_dict(self, key: str, _dict: dict, **kwargs) -> bool:
-        json_string = json.dumps(_dict, ensure_ascii=False, cls=DateTimeEncoder).encode('utf-8')
-        return self.set(key, json_string, **kwargs)
+        return self.set(key, dumps(_dict, self.binary_format), **kwargs)
 
     def get_dict(self, key: str) -> dict:
-        return json.loads(self.get(key))
+        return loads(self.get(key))
@@ -0,0 +1,186 @@
+"""
+Прогрев кэшей: таблицы прогноза всех срезов, списки значений разрезов, графики и снимки планов загружаются заранее,
+чтобы первый пользователь не ждал холодного чтения из Redis и 1С.
+При запуске прогреваются все базы версий прогноза, после запуска watch следит за ключом actual_date каждой базы
+и прогревает базу заново, когда ночная сборка публикует новый прогноз.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from data_methods import redis_worker, program_worker, date_options, keys, LAYERS
+from datetime import datetime
+from settings import settings
+from threading import Lock, Thread
+import logging
+import time
+
+logger = logging.getLogger('warmup')
+
+_lock = Lock()
+# ready - первый прогрев при запуске завершен (проверка готовности /ready);
+# dbs - ход прогрева каждой базы, hot - кэши базы прогреты для ее текущего actual_date
+state = {
+    'ready': False,
+    'done': 0,
+    'total': 0,
+    'started': None,
+    'finished': None,
+    'dbs': {},
+}
+
+
+def _progress(db: int, done: int = 0, total: int = 0) -> None:
+    with _lock:
+        state['done'] += done
+        state['total'] += total
+        state['dbs'][db]['done'] += done
+        state['dbs'][db]['total'] += total
+
+
+def progress() -> dict:
+    """
+    :return: копия состояния прогрева, которую можно отдавать в ответе, пока прогрев продолжается
+    """
+    with _lock:
+        return {**state, 'dbs': {db: dict(db_state) for db, db_state in state['dbs'].items()}}
+
+
+def _actual_date(db: int) -> str | None:
+    raw = redis_worker[db].get('actual_date')
+    return raw.decode('utf-8') if isinstance(raw, bytes) else raw
+
+
+def _build_complete(db: int) -> bool:
+    """
+    :return: False - сборка прогноза еще идет (models_count < total_models_count), True - завершена или неизвестно
+    """
+    try:
+        count, total = (int(value) for value in redis_worker[db].mget(['models_count', 'total_models_count']))
+    except (TypeError, ValueError):
+        return True
+    return count >= total
+
+
+def warm_db(db: int, max_workers: int = 4) -> None:
+    """
+    Загружает в кэш RedisWorker базы db списки значений разрезов, таблицы прогноза всех срезов на 6 периодов
+    и графики групп в целом по компании. Загрузки выполняются параллельно, не больше max_workers одновременно.
+    """
+    worker = redis_worker[db]
+    # actual_date перечитывается сразу, а не при следующей плановой проверке, которая стерла бы прогретые данные.
+    # Кэши сбрасываются в любом случае: actual_date меняется в начале сборки, и запросы во время сборки
+    # закэшировали неполный прогноз для того же actual_date
+    worker._check_actual_date(force=True)
+    worker.clear_caches()
+    actual_date = _actual_date(db)
+    with _lock:
+        state['dbs'][db] = {'actual_date': actual_date, 'hot': False, 'done': 0, 'total': 0,
+                            'started': datetime.now().isoformat(), 'finished': None, 'error': None}
+
+    periods = [option['value'] for option in date_options()]
+    option_layers = [layer for layer in LAYERS if keys(layer) is not None]
+    _progress(db, total=len(option_layers) + len(periods) + 1)
+
+    def task(function, *args):
+        function(*args)
+        _progress(db, done=1)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'warmup-{db}') as executor:
+        # списки значений разрезов нужны для свертки таблиц, поэтому загружаются первыми
+        for future in [executor.submit(task, worker.option_index, layer) for layer in option_layers]:
+            future.result()
+        for future in [executor.submit(task, worker.forecast_rollup, period) for period in periods]:
+            future.result()
+
+    groups = {}
+    for period in periods:
+        groups.update(dict.fromkeys(worker.forecast_slice(period, 'В целом по компании').get('Группа', [])))
+    worker.main_graph(as_dict=True)
+    worker.graphs(list(groups))
+    _progress(db, done=1)
+    with _lock:
+        state['dbs'][db].update(hot=True, finished=datetime.now().isoformat())
+    logger.info(f'db {db}: кэши прогреты для прогноза от {actual_date}')
+
+
+def warm_programs(max_workers: int = 4) -> None:
+    """
+    Загружает снимки планов 1С на 6 периодов по всем разрезам. Снимки общие для всех баз версий прогноза.
+    """
+    periods = [option['value'] for option in date_options()]
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='warmup-1c') as executor:
+        list(executor.map(lambda args: program_worker.program_snapshot(*args),
+                          [(period, layer) for period in periods for layer in LAYERS]))
+
+
+def warm_caches(dbs=None, max_workers: int = None) -> None:
+    """
+    Прогревает кэши всех баз версий прогноза и снимки планов. Ошибки Redis и 1С не прерывают запуск приложения.
+    """
+    dbs = range(len(redis_worker)) if dbs is None else dbs
+    max_workers = settings.warmup_workers if max_workers is None else max_workers
+    with _lock:
+        state.update(ready=False, done=0, total=0, started=datetime.now().isoformat(), finished=None, dbs={})
+    for db in dbs:
+        _warm_db_safe(db, max_workers)
+    if dbs:
+        try:
+            warm_programs(max_workers)
+        except Exception as ex:
+            logger.error(f'1С: {ex}')
+    with _lock:
+        state.update(ready=True, finished=datetime.now().isoformat())
+    logger.info(f'Кэши прогреты: {state}')
+
+
+def _warm_db_safe(db: int, max_workers: int) -> None:
+    try:
+        warm_db(db, max_workers)
+    except Exception as ex:
+        logger.error(f'db {db}: {ex}')
+        with _lock:
+            if db in state['dbs']:
+                state['dbs'][db]['error'] = str(ex)
+
+
+def check_new_forecasts(max_workers: int = 4, dbs=None) -> list:
+    """
+    Прогревает базы, в которых опубликован новый прогноз (actual_date отличается от прогретого)
+    и завершена сборка моделей
+    :param dbs: проверяемые базы, по умолчанию - все
+    :return: прогретые базы
+    """
+    warmed_dbs = []
+    for db in range(len(redis_worker)) if dbs is None else dbs:
+        try:
+            actual_date = _actual_date(db)
+        except Exception as ex:
+            logger.error(f'db {db}: {ex}')
+            continue
+        with _lock:
+            warmed = state['dbs'].get(db, {}).get('actual_date')
+        if actual_date is not None and actual_date != warmed and _build_complete(db):
+            logger.info(f'db {db}: опубликован прогноз от {actual_date}, прогрев кэшей')
+            _warm_db_safe(db, max_workers)
+            warmed_dbs.append(db)
+    return warmed_dbs
+
+
+def watch(interval: float = None, max_workers: int = None) -> None:
+    """
+    Раз в interval секунд проверяет публикацию нового прогноза в базах (check_new_forecasts).
+    Выполняется бесконечно, запускается в фоновом потоке (start_watcher).
+    """
+    interval = settings.warmup_interval if interval is None else interval
+    max_workers = settings.warmup_workers if max_workers is None else max_workers
+    while True:
+        time.sleep(interval)
+        check_new_forecasts(max_workers)
+
+
+def start_watcher() -> Thread:
+    """
+    Запускает watch в фоновом потоке. Кэши у каждого процесса свои, поэтому под gunicorn поток запускается
+    в каждом worker'е после fork.
+    """
+    thread = Thread(target=watch, name='warmup-watch', daemon=True)
+    thread.start()
+    return thread
@@ -1,6 +1,16 @@
 from app import app
+from threading import Thread
+import warmup
 
 server = app.server
 
+
+def warm_and_watch():
+    warmup.warm_caches()
+    warmup.watch()
+
+
 if __name__ == '__main__':
+    # в режиме разработки кэши прогреваются в фоне, в production - в gunicorn.conf.py до запуска worker'ов
+    Thread(target=warm_and_watch, daemon=True).start()
     server.run(debug=False, host='127.0.0.1', port=8002)